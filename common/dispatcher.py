@@ -0,0 +1,187 @@
+import collections
+import concurrent.futures
+import contextlib
+import threading
+import time
+from typing import Any, ContextManager, Deque, Dict, Iterator, Tuple, Union
+
+from common import metrics, records, router
+
+# A packet waiting to be handled: (route, data or parsed record, time it was queued).
+_Job = Tuple[router.Route, Union[bytes, records.Record], float]
+
+
+class ReadWriteLock(object):
+    """A lock which can be held by many readers, or a single writer.
+
+    Writers are preferred: once a writer is waiting, new readers wait too, so
+    a steady stream of readers can't starve the writers.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextlib.contextmanager
+    def read(self) -> Iterator[None]:
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def write(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+class Dispatcher(object):
+    """Runs packet handlers on a bounded pool of worker threads.
+
+    This keeps slow handlers (e.g. ones which make large database queries)
+    from blocking the thread which reads from the sockets. Each session's
+    packets are still handled one at a time, in the order they were received,
+    but packets from different sessions are handled concurrently.
+
+    How a handler is run depends on its declared HandlerKind:
+        NO_DB: run straight away.
+        READ_ONLY: run concurrently with other READ_ONLY handlers.
+        MUTATING: run on its own, with no other database handlers running.
+
+    The following metrics are recorded:
+        dispatcher.queue_depth: The number of packets waiting to be handled.
+        dispatcher.wait_time: How long (in seconds) each packet waited in the queue.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending_per_session: int = 256):
+        """Create a new dispatcher.
+
+        Args:
+            max_workers: The number of handler threads to run.
+            max_pending_per_session: The number of packets a single session can
+                                     have waiting before it is disconnected.
+        """
+        self.max_workers = max_workers
+        self.max_pending_per_session = max_pending_per_session
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix='dispatcher')
+
+        # The queued packets for each session which has work waiting or running.
+        # A session is only ever being drained by one worker at a time.
+        self._lock = threading.Lock()
+        self._queues: Dict[Any, Deque[_Job]] = {}
+        self._pending = 0
+
+        # Notified whenever the last queued packet has been handled.
+        self._idle = threading.Condition(self._lock)
+
+        # Held by every handler which uses the database.
+        self._db_lock = ReadWriteLock()
+
+    def __len__(self) -> int:
+        """Return the number of packets waiting to be handled."""
+        return self._pending
+
+    def submit(self, session: Any, route: router.Route, data: Union[bytes, records.Record]) -> bool:
+        """Queue a packet to be handled.
+
+        Args:
+            session: The session which received the packet.
+            route: The route to handle the packet with.
+            data: The raw contents of the packet (or the record it has already
+                  been parsed into). This must not be a view into the receive
+                  buffer, as it will be read on another thread.
+
+        Returns:
+            False if the session has too many packets waiting already, in which
+            case the packet is not queued.
+        """
+        with self._lock:
+            queue = self._queues.get(session)
+            idle = queue is None
+            if idle:
+                queue = self._queues[session] = collections.deque()
+            elif len(queue) >= self.max_pending_per_session:
+                return False
+
+            queue.append((route, data, time.monotonic()))
+            self._pending += 1
+            metrics.gauge('dispatcher.queue_depth').set(self._pending)
+
+        if idle:
+            self._executor.submit(self._run, session)
+
+        return True
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads.
+
+        Args:
+            wait: If True, wait for all queued packets to be handled first.
+        """
+        if wait:
+            with self._idle:
+                while self._queues:
+                    self._idle.wait()
+
+        self._executor.shutdown(wait=wait)
+
+    def _guard(self, kind: router.HandlerKind) -> ContextManager:
+        """Get the lock to hold while running a handler of the given kind."""
+        if kind == router.HandlerKind.NO_DB:
+            return contextlib.nullcontext()
+        if kind == router.HandlerKind.READ_ONLY:
+            return self._db_lock.read()
+        return self._db_lock.write()
+
+    def _run(self, session: Any):
+        """Handle the next packet for a session.
+
+        Only a single packet is handled before the session goes to the back of
+        the executor's queue, so that a busy session can't starve the others.
+        """
+        with self._lock:
+            route, data, queued_at = self._queues[session].popleft()
+            self._pending -= 1
+            metrics.gauge('dispatcher.queue_depth').set(self._pending)
+
+        metrics.distribution('dispatcher.wait_time').record(time.monotonic() - queued_at)
+
+        try:
+            with self._guard(route.kind):
+                session.run_handler(route, data)
+        except Exception:
+            session.log.exception(f'error while handling {route.name}')
+            session.writer.abort()
+
+        session.flush()
+
+        with self._lock:
+            if self._queues[session]:
+                self._executor.submit(self._run, session)
+            else:
+                del self._queues[session]
+                if not self._queues:
+                    self._idle.notify_all()
@@ -0,0 +1,129 @@
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+# The initial size of a receive buffer. The buffer will grow if a single packet
+# is larger than this.
+INITIAL_BUFFER_SIZE = 16 * 1024
+
+# The minimum amount of free space to offer to each recv_into() call.
+MIN_RECV_SIZE = 4 * 1024
+
+# A function which reads a packet header from the start of a buffer. It should
+# return None if the buffer doesn't yet contain a full header, or a tuple of
+# (op_code, header_len, data_len) if it does.
+HeaderReader = Callable[[memoryview], Optional[Tuple[Any, int, int]]]
+
+
+class Framer(object):
+    """A receive buffer which splits a stream of bytes into packets.
+
+    Data is received directly into a growable bytearray (using recv_into), so a
+    single call can pick up many pipelined packets. Packets which have been
+    split across multiple reads are held onto until they are complete.
+
+    Complete packets are returned as memoryview slices of the buffer, so they
+    are not copied. These slices are only valid until the next time data is
+    received into the buffer.
+    """
+
+    def __init__(self, read_header: HeaderReader, initial_size: int = INITIAL_BUFFER_SIZE):
+        """Create a new framer.
+
+        Args:
+            read_header: The function to use to read packet headers. It will be
+                         called exactly once for each packet (as soon as the
+                         full header is available), so it is allowed to update
+                         state such as header decryption counters.
+            initial_size: The initial size of the receive buffer.
+        """
+        self.read_header = read_header
+
+        self._buffer = bytearray(initial_size)
+        self._start = 0  # the first byte which hasn't been framed yet
+        self._end = 0  # the end of the received data
+
+        # The (op_code, data_len) of a header which has already been read,
+        # but whose data hasn't been completely received yet.
+        self._header: Optional[Tuple[Any, int]] = None
+
+    def __len__(self) -> int:
+        """Return the number of bytes which have been received but not framed."""
+        return self._end - self._start
+
+    def get_buffer(self, min_size: int = MIN_RECV_SIZE) -> memoryview:
+        """Get a writable view of the free space at the end of the buffer.
+
+        Data written into this view must then be committed using commit(). If
+        there isn't enough free space, already framed data will be discarded
+        and/or the buffer will be grown.
+
+        Args:
+            min_size: The minimum amount of free space required.
+
+        Returns:
+            A writable memoryview into the buffer.
+        """
+        pending = self._end - self._start
+        if len(self._buffer) - self._end < min_size:
+            if pending + min_size > len(self._buffer):
+                # Grow the buffer. This always creates a new bytearray so any
+                # previously returned frames don't prevent the resize.
+                new_buffer = bytearray(max(len(self._buffer) * 2, pending + min_size))
+                new_buffer[:pending] = self._buffer[self._start:self._end]
+                self._buffer = new_buffer
+            else:
+                # Move the unframed data back to the start of the buffer.
+                self._buffer[:pending] = self._buffer[self._start:self._end]
+
+            self._start = 0
+            self._end = pending
+
+        return memoryview(self._buffer)[self._end:]
+
+    def commit(self, n: int):
+        """Mark `n` bytes written to the last get_buffer() view as received."""
+        self._end += n
+
+    def feed(self, data: bytes):
+        """Copy some received data into the buffer."""
+        self.get_buffer(len(data))[:len(data)] = data
+        self.commit(len(data))
+
+    def recv_into(self, sock: Any) -> int:
+        """Receive as much data as is available from `sock` in a single call.
+
+        Args:
+            sock: The socket to receive data from.
+
+        Returns:
+            The number of bytes received. 0 means the socket was closed.
+        """
+        n = sock.recv_into(self.get_buffer())
+        self.commit(n)
+        return n
+
+    def frames(self) -> Iterator[Tuple[Any, memoryview]]:
+        """Iterate through each complete packet in the buffer.
+
+        Yields:
+            A tuple of (op_code, data) for each packet, where data is a view
+            into the receive buffer.
+        """
+        view = memoryview(self._buffer)
+        while True:
+            if self._header is None:
+                header = self.read_header(view[self._start:self._end])
+                if header is None:
+                    return
+
+                op_code, header_len, data_len = header
+                self._start += header_len
+                self._header = (op_code, data_len)
+
+            op_code, data_len = self._header
+            if self._end - self._start < data_len:
+                return
+
+            data = view[self._start:self._start + data_len]
+            self._start += data_len
+            self._header = None
+            yield op_code, data
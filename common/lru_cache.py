@@ -0,0 +1,128 @@
+"""A size-bounded cache which evicts the least recently used entries.
+
+Caches are used to keep encoded responses around, so the same packet isn't
+rebuilt for every client which asks for it. Each cache records its hit rate:
+
+    <name>.hits: Lookups which found an entry.
+    <name>.misses: Lookups which had to build the entry.
+    <name>.evictions: Entries dropped to make room for new ones.
+    <name>.invalidations: Entries dropped because they were out of date.
+    <name>.size: The number of entries in the cache.
+"""
+import collections
+import threading
+from typing import Callable, Generic, Hashable, Optional, Text, TypeVar
+
+from common import metrics
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+    """A thread-safe, size-bounded mapping of key --> value."""
+
+    def __init__(self, name: Text, max_size: int):
+        """Create a new cache.
+
+        Args:
+            name: The name of the cache, used as a prefix for its metrics.
+            max_size: The maximum number of entries to keep.
+        """
+        self.name = name
+        self.max_size = max_size
+
+        self._entries: 'collections.OrderedDict[K, V]' = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # Incremented on every invalidation, so entries built from data which
+        # was invalidated part way through aren't stored.
+        self._generation = 0
+
+        self._hits = metrics.counter(f'{name}.hits')
+        self._misses = metrics.counter(f'{name}.misses')
+        self._evictions = metrics.counter(f'{name}.evictions')
+        self._invalidations = metrics.counter(f'{name}.invalidations')
+        self._size = metrics.gauge(f'{name}.size')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def hit_rate(self) -> float:
+        """The fraction of lookups (over the lifetime of the process) which were hits."""
+        lookups = self._hits.value + self._misses.value
+        return self._hits.value / lookups if lookups else 0.0
+
+    def get(self, key: K) -> Optional[V]:
+        """Get an entry, or None if it isn't cached."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self._misses.inc()
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits.inc()
+            return value
+
+    def get_or_build(self, key: K, build: Callable[[], V]) -> V:
+        """Get an entry, building (and caching) it if it isn't cached.
+
+        Args:
+            key: The key of the entry.
+            build: Called (without holding the lock) to build the entry.
+
+        Returns:
+            The cached or newly built entry.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits.inc()
+                return value
+
+            self._misses.inc()
+            generation = self._generation
+
+        value = build()
+        with self._lock:
+            if generation == self._generation:
+                self._store(key, value)
+
+        return value
+
+    def put(self, key: K, value: V):
+        """Add (or replace) an entry."""
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, *keys: K):
+        """Drop entries which are out of date (it doesn't matter if they aren't cached)."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._invalidations.inc()
+
+            self._size.set(len(self._entries))
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._invalidations.inc(len(self._entries))
+            self._entries.clear()
+            self._size.set(0)
+
+    def _store(self, key: K, value: V):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions.inc()
+
+        self._size.set(len(self._entries))
@@ -0,0 +1,105 @@
+"""Lightweight, in-process metrics.
+
+Metrics are created on first use and live for the lifetime of the process:
+
+    metrics.counter('session.flushes').inc()
+    metrics.distribution('session.frames_per_flush').record(3)
+
+All metrics can be read back at once using snapshot().
+"""
+import threading
+from typing import Any, Dict, Text, Union
+
+
+class Counter(object):
+    """A number which only ever goes up."""
+
+    def __init__(self, name: Text):
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Gauge(object):
+    """A number which can be set to any value."""
+
+    def __init__(self, name: Text):
+        self.name = name
+        self.value: Union[int, float] = 0
+
+    def set(self, value: Union[int, float]):
+        self.value = value
+
+    def snapshot(self) -> Union[int, float]:
+        return self.value
+
+
+class Distribution(object):
+    """Summary statistics (count, total, min, max) for a series of values."""
+
+    def __init__(self, name: Text):
+        self.name = name
+        self.count = 0
+        self.total: Union[int, float] = 0
+        self.min: Union[int, float, None] = None
+        self.max: Union[int, float, None] = None
+        self._lock = threading.Lock()
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def record(self, value: Union[int, float]):
+        with self._lock:
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def snapshot(self) -> Dict[Text, Any]:
+        return dict(count=self.count, total=self.total, min=self.min, max=self.max, mean=self.mean)
+
+
+_METRICS: Dict[Text, Any] = {}
+_METRICS_LOCK = threading.Lock()
+
+
+def _get(name: Text, metric_type: type) -> Any:
+    with _METRICS_LOCK:
+        metric = _METRICS.get(name)
+        if metric is None:
+            metric = _METRICS[name] = metric_type(name)
+        elif not isinstance(metric, metric_type):
+            raise TypeError(f'metric {name} is a {type(metric).__name__}, not a {metric_type.__name__}')
+        return metric
+
+
+def counter(name: Text) -> Counter:
+    """Get (or create) the counter with the given name."""
+    return _get(name, Counter)
+
+
+def gauge(name: Text) -> Gauge:
+    """Get (or create) the gauge with the given name."""
+    return _get(name, Gauge)
+
+
+def distribution(name: Text) -> Distribution:
+    """Get (or create) the distribution with the given name."""
+    return _get(name, Distribution)
+
+
+def snapshot() -> Dict[Text, Any]:
+    """Get the current value of every metric, keyed by name."""
+    with _METRICS_LOCK:
+        metrics = list(_METRICS.values())
+    return {metric.name: metric.snapshot() for metric in metrics}
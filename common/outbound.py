@@ -0,0 +1,317 @@
+import asyncio
+import socket
+import threading
+from typing import Any, List, Optional, Tuple
+
+from common import metrics
+
+# The maximum number of buffers to pass to a single sendmsg() call. Most
+# platforms limit this (IOV_MAX) to 1024.
+MAX_BUFFERS_PER_SEND = 1024
+
+
+class OutboundQueueFull(Exception):
+    """Raised when a packet can't be queued because the client isn't keeping up."""
+
+
+class OutboundBuffer(object):
+    """A bounded queue of outgoing packets, which are written in batches.
+
+    Packets are appended (as separate header and data buffers, so they are
+    never concatenated) by any thread, and then written all at once by the
+    session's writer using flush().
+
+    The queue has two sets of limits:
+        - Above the high-water marks, droppable (low-value) packets are
+          discarded instead of being queued.
+        - Above the maximums, no more packets can be queued at all and
+          OutboundQueueFull is raised. The client should be disconnected.
+    """
+
+    def __init__(
+        self,
+        high_water_bytes: Optional[int] = None,
+        high_water_packets: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        max_packets: Optional[int] = None,
+    ):
+        """Create a new buffer. A limit of None means unlimited.
+
+        Args:
+            high_water_bytes: Queue size (in bytes) above which droppable packets are dropped.
+            high_water_packets: Queue size (in packets) above which droppable packets are dropped.
+            max_bytes: Queue size (in bytes) above which no packets can be queued.
+            max_packets: Queue size (in packets) above which no packets can be queued.
+        """
+        self.high_water_bytes = high_water_bytes
+        self.high_water_packets = high_water_packets
+        self.max_bytes = max_bytes
+        self.max_packets = max_packets
+
+        # Protects the queue. Callers may hold this while generating headers to
+        # make sure packets are queued in the same order as their headers.
+        self.lock = threading.RLock()
+
+        self._buffers: List[bytes] = []
+        self._frames = 0
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        """Return the number of packets waiting to be flushed."""
+        return self._frames
+
+    @property
+    def num_bytes(self) -> int:
+        """Return the number of bytes waiting to be flushed."""
+        return self._bytes
+
+    def _exceeds(self, num_bytes: int, num_packets: int, max_bytes: Optional[int], max_packets: Optional[int]) -> bool:
+        return ((max_bytes is not None and self._bytes + num_bytes > max_bytes) or
+                (max_packets is not None and self._frames + num_packets > max_packets))
+
+    def admit(self, num_bytes: int, droppable: bool = False, num_packets: int = 1) -> bool:
+        """Check whether a packet can be queued.
+
+        This should be called (under `lock`) before generating the packet's
+        header, so that headers are never generated for dropped packets.
+
+        When admitting a batch of packets before any of them are appended,
+        `num_bytes` and `num_packets` should include the earlier packets in the
+        batch which were already admitted.
+
+        Args:
+            num_bytes: The size of the packet.
+            droppable: Whether the packet can be dropped if the client is behind.
+            num_packets: The number of packets `num_bytes` covers.
+
+        Returns:
+            True if the packet can be queued, False if it should be dropped.
+
+        Raises:
+            OutboundQueueFull: if the packet can't be dropped, and the queue is full.
+        """
+        if self._exceeds(num_bytes, num_packets, self.max_bytes, self.max_packets):
+            if droppable:
+                metrics.counter('outbound.dropped').inc()
+                return False
+            raise OutboundQueueFull(f'outbound queue full ({self._frames} packets, {self._bytes} bytes)')
+
+        if droppable and self._exceeds(num_bytes, num_packets, self.high_water_bytes, self.high_water_packets):
+            metrics.counter('outbound.dropped').inc()
+            return False
+
+        return True
+
+    def append(self, header: bytes, data: bytes):
+        """Add a packet to the buffer.
+
+        Args:
+            header: The header of the packet.
+            data: The contents of the packet.
+        """
+        with self.lock:
+            self._buffers.append(header)
+            self._buffers.append(data)
+            self._frames += 1
+            self._bytes += len(header) + len(data)
+
+    def take(self) -> Tuple[List[bytes], int]:
+        """Remove everything from the buffer.
+
+        Returns:
+            A tuple of (buffers, number of packets).
+        """
+        with self.lock:
+            buffers, frames = self._buffers, self._frames
+            self._buffers = []
+            self._frames = 0
+            self._bytes = 0
+            return buffers, frames
+
+    def flush(self, request: Any) -> int:
+        """Write all buffered packets to `request` and empty the buffer.
+
+        The buffer is not locked while writing, so other threads can continue
+        to queue packets.
+
+        Args:
+            request: The socket (or socket-like object) to write to.
+
+        Returns:
+            The number of packets which were written.
+        """
+        buffers, frames = self.take()
+        if not frames:
+            return 0
+
+        num_bytes = send_buffers(request, buffers)
+
+        metrics.counter('outbound.flushes').inc()
+        metrics.distribution('outbound.frames_per_flush').record(frames)
+        metrics.distribution('outbound.bytes_per_flush').record(num_bytes)
+        return frames
+
+
+class ThreadWriter(object):
+    """Drains an OutboundBuffer into a blocking socket on a dedicated thread.
+
+    Queueing packets never blocks on the socket. If the client's TCP window is
+    full, only this thread waits, while the queue continues to fill up (until
+    it hits its limits).
+    """
+
+    def __init__(self, sock: Any, buffer: OutboundBuffer):
+        self.sock = sock
+        self.buffer = buffer
+
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the writer thread."""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """Tell the writer there is data to send. This never blocks."""
+        with self._cond:
+            self._cond.notify()
+
+    def stop(self):
+        """Send any remaining data, then stop the writer thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def abort(self):
+        """Discard any queued data and close the connection."""
+        self.buffer.take()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not len(self.buffer):
+                    self._cond.wait()
+
+                if not len(self.buffer):
+                    return
+
+            try:
+                self.buffer.flush(self.sock)
+            except OSError:
+                self.buffer.take()
+                return
+
+
+class TransportWriter(object):
+    """Drains an OutboundBuffer into an asyncio transport.
+
+    All writes happen on the event loop thread. Wakeups from other threads are
+    handed over to the loop, and writes are held back while the transport has
+    asked for writing to be paused.
+    """
+
+    def __init__(self, request: Any, buffer: OutboundBuffer, loop: asyncio.AbstractEventLoop):
+        """Create a new writer.
+
+        Args:
+            request: The TransportRequest to write to.
+            buffer: The buffer to drain.
+            loop: The event loop which owns the transport.
+        """
+        self.request = request
+        self.buffer = buffer
+        self.loop = loop
+
+        self._loop_thread = threading.get_ident()
+        self._scheduled = False
+        self._paused = False
+        self._closed = False
+
+    def start(self):
+        pass
+
+    def wake(self):
+        """Tell the writer there is data to send. This never blocks."""
+        if threading.get_ident() == self._loop_thread:
+            self._write()
+        elif not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self._write)
+
+    def pause(self):
+        """Stop writing until resume() is called (i.e. the transport is full)."""
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+        self._write()
+
+    def stop(self):
+        self._closed = True
+
+    def abort(self):
+        """Discard any queued data and close the connection."""
+        self._closed = True
+        self.buffer.take()
+        if threading.get_ident() == self._loop_thread:
+            self.request.transport.abort()
+        else:
+            self.loop.call_soon_threadsafe(self.request.transport.abort)
+
+    def _write(self):
+        self._scheduled = False
+        if self._paused or self._closed:
+            return
+
+        self.buffer.flush(self.request)
+
+
+def send_buffers(request: Any, buffers: List[bytes]) -> int:
+    """Write a list of buffers to a socket, using as few calls as possible.
+
+    If the socket supports sendmsg() (i.e. scatter/gather I/O), the buffers are
+    written directly without joining them. Otherwise, they are joined and
+    written with a single sendall().
+
+    Args:
+        request: The socket (or socket-like object) to write to.
+        buffers: The buffers to write, in order.
+
+    Returns:
+        The total number of bytes written.
+    """
+    total = sum(len(b) for b in buffers)
+    if not hasattr(request, 'sendmsg'):
+        request.sendall(b''.join(buffers))
+        return total
+
+    pending = [memoryview(b) for b in buffers if len(b)]
+    while pending:
+        sent = request.sendmsg(pending[:MAX_BUFFERS_PER_SEND])
+
+        # Drop everything which was completely sent, and trim the buffer
+        # which was only partially sent (if any).
+        i = 0
+        while i < len(pending) and sent >= len(pending[i]):
+            sent -= len(pending[i])
+            i += 1
+
+        pending = pending[i:]
+        if sent:
+            pending[0] = pending[0][sent:]
+
+    return total
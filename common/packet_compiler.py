@@ -0,0 +1,230 @@
+"""Compiles packet formats with construct, caching the generated code on disk.
+
+construct can compile a Struct into Python source which parses much faster
+than its interpreter. Generating and compiling that source takes a while, so
+the compiled bytecode is cached on disk, keyed by a hash of the source.
+
+Formats which are just a fixed layout of integers skip construct entirely, and
+are parsed straight into records (see common.records).
+
+Parts of a format which construct can't compile (e.g. custom Adapters) are
+still run through the interpreter from within the compiled code, and formats
+which fail to compile entirely are left as they are.
+
+Note that construct only compiles parsing: building a compiled struct still
+goes through the interpreter.
+"""
+import hashlib
+import logging
+import marshal
+import os
+import re
+import sys
+import timeit
+import types
+from typing import Any, Dict, List, NamedTuple, Optional, Text, Tuple
+
+import construct
+from construct.core import CodeGen
+
+from common import records
+
+# Bump this whenever the way code is generated changes, to invalidate old caches.
+CACHE_VERSION = 1
+
+# The same preamble construct.Construct.compile uses.
+_PREAMBLE = """
+    from construct import *
+    from construct.lib import *
+    from io import BytesIO
+    import struct
+    import collections
+    import itertools
+
+    def read_bytes(io, count):
+        if not count >= 0: raise StreamError
+        data = io.read(count)
+        if not len(data) == count: raise StreamError
+        return data
+    def restream(data, func):
+        return func(BytesIO(data))
+    def reuse(obj, func):
+        return func(obj)
+
+    linkedinstances = {}
+    linkedparsers = {}
+
+    len_ = len
+    sum_ = sum
+    min_ = min
+    max_ = max
+    abs_ = abs
+"""
+
+# References to parts of the format which are run by the interpreter. These
+# are keyed by id(), which changes every run, so are renumbered before hashing.
+_LINK_RE = re.compile(r'linked(?:instances|parsers)\[(\d+)\]')
+
+
+class CompileResult(NamedTuple):
+    """The outcome of compiling a single packet format."""
+    name: Text
+    compiled: bool
+    interpreted_parts: int = 0
+    from_cache: bool = False
+    error: Optional[Text] = None
+    fixed_layout: bool = False
+
+
+class PacketCompiler(object):
+    """Compiles packet formats, keeping track of the results."""
+
+    def __init__(self, cache_dir: Optional[Text] = None):
+        """Create a new compiler.
+
+        Args:
+            cache_dir: The directory to cache compiled code in. If None, nothing
+                       is cached.
+        """
+        self.cache_dir = cache_dir
+        self.results: List[CompileResult] = []
+        self.log = logging.getLogger('PACKET_COMPILER')
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def compile(self, name: Text, fmt: construct.Construct) -> construct.Construct:
+        """Compile a single packet format.
+
+        Args:
+            name: The name of the format, used in the results.
+            fmt: The format to compile.
+
+        Returns:
+            The compiled format, or `fmt` itself if it could not be compiled.
+        """
+        layout = records.FixedLayout.FromStruct(name.title().replace('_', ''), fmt)
+        if layout:
+            self.results.append(CompileResult(name, compiled=True, fixed_layout=True))
+            return layout
+
+        try:
+            compiled, result = self._compile(name, fmt)
+        except Exception as e:
+            compiled, result = fmt, CompileResult(name, compiled=False, error=f'{type(e).__name__}: {e}')
+
+        self.results.append(result)
+        return compiled
+
+    def compile_all(self, packet_formats: Dict[Any, construct.Construct]) -> Dict[Any, construct.Construct]:
+        """Compile every format in a mapping of op_code --> format.
+
+        Returns:
+            A new mapping, with each format replaced by its compiled version.
+        """
+        compiled = {op: self.compile(getattr(op, 'name', str(op)), fmt) for op, fmt in packet_formats.items()}
+
+        num_compiled = sum(1 for r in self.results if r.compiled)
+        num_cached = sum(1 for r in self.results if r.from_cache)
+        num_fixed = sum(1 for r in self.results if r.fixed_layout)
+        self.log.info(f'compiled {num_compiled}/{len(self.results)} packet formats '
+                      f'({num_fixed} fixed layout, {num_cached} from cache)')
+        for result in self.results:
+            if not result.compiled:
+                self.log.warning(f'{result.name} will be interpreted: {result.error}')
+
+        return compiled
+
+    def _compile(self, name: Text, fmt: construct.Construct) -> Tuple[construct.Construct, CompileResult]:
+        code = CodeGen()
+        code.append(_PREAMBLE)
+        parse_expression = fmt._compileparse(code)
+        if parse_expression.startswith('linkedparsers['):
+            return fmt, CompileResult(name, compiled=False, error='the top level format cannot be compiled')
+
+        code.append("""
+            def parseall(io, this):
+                return %s
+            compiled = Compiled(None, None, parseall)
+        """ % (parse_expression,))
+
+        # Renumber the interpreted parts in the order they appear.
+        links: Dict[int, int] = {}
+        source = _LINK_RE.sub(
+            lambda m: m.group(0).replace(m.group(1), str(links.setdefault(int(m.group(1)), len(links)))),
+            code.toString(),
+        )
+
+        bytecode, from_cache = self._load_or_compile(source)
+        module = types.ModuleType(f'compiled_{name}')
+        exec(bytecode, module.__dict__)
+        module.linkedinstances = {i: code.linkedinstances[link] for link, i in links.items()}
+        module.linkedparsers = {i: code.linkedparsers[link] for link, i in links.items()}
+
+        compiled = module.compiled
+        compiled.source = source
+        compiled.module = module
+        compiled.defersubcon = fmt
+        return compiled, CompileResult(name, compiled=True, interpreted_parts=len(links), from_cache=from_cache)
+
+    def _load_or_compile(self, source: Text) -> Tuple[types.CodeType, bool]:
+        """Get the bytecode for some source, from the cache if possible."""
+        key = hashlib.sha1(f'{CACHE_VERSION}:{construct.version_string}:{sys.version}:{source}'.encode()).hexdigest()
+        path = os.path.join(self.cache_dir, f'{key}.code') if self.cache_dir else None
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    return marshal.load(f), True
+            except (EOFError, ValueError, TypeError):
+                self.log.warning(f'ignoring corrupt cache file {path}')
+
+        bytecode = compile(source, '<compiled packet>', 'exec')
+        if path:
+            # Write to a temporary file first, so other processes never see a partial file.
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                marshal.dump(bytecode, f)
+            os.replace(tmp_path, path)
+
+        return bytecode, False
+
+
+def CompileAll(packet_formats: Dict[Any, construct.Construct],
+               cache_dir: Optional[Text] = None) -> Dict[Any, construct.Construct]:
+    """Compile every format in a mapping of op_code --> format.
+
+    Args:
+        packet_formats: The formats to compile.
+        cache_dir: The directory to cache compiled code in. If None, nothing
+                   is cached.
+
+    Returns:
+        A new mapping, with each format replaced by its compiled version (or
+        the original format, if it could not be compiled).
+    """
+    return PacketCompiler(cache_dir).compile_all(packet_formats)
+
+
+def MeasureSpeedup(fmt: construct.Construct, compiled: construct.Construct, sample: bytes,
+                   number: int = 2000) -> Tuple[float, float]:
+    """Measure how much faster a compiled format is than the original.
+
+    Args:
+        fmt: The original format.
+        compiled: The compiled format.
+        sample: A packet to parse (and then build again).
+        number: How many times to parse/build the packet.
+
+    Returns:
+        The (parse, build) speedups.
+    """
+    parsed = fmt.parse(sample)
+    if compiled.parse(sample) != parsed:
+        raise ValueError('compiled format parsed the sample differently')
+
+    parse = timeit.timeit(lambda: fmt.parse(sample), number=number) / \
+        timeit.timeit(lambda: compiled.parse(sample), number=number)
+    build = timeit.timeit(lambda: fmt.build(parsed), number=number) / \
+        timeit.timeit(lambda: compiled.build(parsed), number=number)
+    return parse, build
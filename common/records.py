@@ -0,0 +1,141 @@
+"""Zero-copy parsing of fixed-layout packets.
+
+Most client packets are just a handful of fixed-size integers. Parsing these
+with construct copies the data into a stream and builds a dict-like Container,
+which is slow. Instead, a FixedLayout decodes the fields with a single
+`struct.unpack_from` straight out of the receive buffer, into a lightweight
+record class with `__slots__`.
+
+A FixedLayout can only be made from a construct Struct whose fields are all
+named, fixed-size integers or floats. Anything else keeps using construct.
+"""
+import collections.abc
+import struct
+from typing import Any, Callable, Dict, List, Optional, Sequence, Text, Tuple
+
+import construct
+
+
+class Record(object):
+    """Base class for the records produced by a FixedLayout.
+
+    Fields can be accessed as attributes (or items, like a construct Container).
+    A record is equal to a Container (or dict) with the same fields.
+    """
+
+    __slots__: Tuple[Text, ...] = ()
+
+    def __init__(self, *values: Any):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, name: Text) -> Any:
+        return getattr(self, name)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Record):
+            return type(self) is type(other) and self._asdict() == other._asdict()
+        if isinstance(other, collections.abc.Mapping):
+            return self._asdict() == {k: v for k, v in other.items() if not k.startswith('_')}
+        return NotImplemented
+
+    def __repr__(self) -> Text:
+        fields = ', '.join(f'{name}={value!r}' for name, value in self._asdict().items())
+        return f'{type(self).__name__}({fields})'
+
+    def _asdict(self) -> Dict[Text, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _field_format(subcon: construct.Construct) -> Optional[Tuple[Text, Optional[Callable]]]:
+    """Get the struct format of a single field, and how to convert the unpacked value.
+
+    Returns:
+        A tuple of (format, converter), or None if the field isn't supported.
+    """
+    # Default only affects building.
+    while isinstance(subcon, construct.Default):
+        subcon = subcon.subcon
+
+    if isinstance(subcon, construct.FormatField):
+        if subcon.fmtstr[0] != '<':
+            return None
+        return subcon.fmtstr[1:], None
+
+    if isinstance(subcon, construct.BytesInteger):
+        if callable(subcon.length) or callable(subcon.swapped) or callable(subcon.signed):
+            return None
+
+        byteorder = 'little' if subcon.swapped else 'big'
+        signed = subcon.signed
+        return f'{subcon.length}s', lambda b: int.from_bytes(b, byteorder, signed=signed)
+
+    return None
+
+
+class FixedLayout(object):
+    """A packet format with a fixed layout, which parses into a Record.
+
+    Building is left to the original construct Struct.
+    """
+
+    def __init__(self, name: Text, fmt: construct.Struct, fields: Sequence[Tuple[Text, Text, Optional[Callable]]]):
+        self.name = name
+        self.subcon = fmt
+        self.record_type = type(name, (Record,), {'__slots__': tuple(field for field, _, _ in fields)})
+
+        self._struct = struct.Struct('<' + ''.join(fmtchar for _, fmtchar, _ in fields))
+        self._converters: List[Tuple[int, Callable]] = [(i, convert)
+                                                        for i, (_, _, convert) in enumerate(fields)
+                                                        if convert]
+
+    @classmethod
+    def FromStruct(cls, name: Text, fmt: construct.Construct) -> Optional['FixedLayout']:
+        """Make a FixedLayout from a construct Struct.
+
+        Args:
+            name: The name of the record type to generate.
+            fmt: The Struct to generate it from.
+
+        Returns:
+            The FixedLayout, or None if the Struct doesn't have a fixed layout.
+        """
+        if not isinstance(fmt, construct.Struct):
+            return None
+
+        fields = []
+        for subcon in fmt.subcons:
+            if not isinstance(subcon, construct.Renamed) or not subcon.name:
+                return None
+
+            field_format = _field_format(subcon.subcon)
+            if field_format is None:
+                return None
+
+            fields.append((subcon.name, *field_format))
+
+        return cls(name, fmt, fields)
+
+    def sizeof(self) -> int:
+        return self._struct.size
+
+    def parse(self, data: Any) -> Record:
+        """Parse a packet without copying it.
+
+        Args:
+            data: The packet. This can be any buffer (e.g. a memoryview into the
+                  receive buffer); it is no longer needed once this returns.
+
+        Returns:
+            The parsed record.
+        """
+        values = self._struct.unpack_from(data)
+        if self._converters:
+            values = list(values)
+            for i, convert in self._converters:
+                values[i] = convert(values[i])
+
+        return self.record_type(*values)
+
+    def build(self, obj: Any, **contextkw: Any) -> bytes:
+        return self.subcon.build(obj, **contextkw)
@@ -1,5 +1,17 @@
 import enum
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Text
+
+
+class HandlerKind(enum.Enum):
+    """How a handler uses the database, which decides how it can be run.
+
+    NO_DB handlers don't touch the database at all, so don't need a db_session
+    and can always run concurrently. READ_ONLY handlers can run concurrently
+    with each other. MUTATING handlers are run one at a time.
+    """
+    NO_DB = 'no_db'
+    READ_ONLY = 'read_only'
+    MUTATING = 'mutating'
 
 
 class Router(object):
@@ -14,15 +26,26 @@ class Router(object):
     ... or to register other things:
     
         Router.Register(key, ...)
+
+    Handlers can also declare how they use the database:
+
+        @Router(key, kind=HandlerKind.READ_ONLY)
+        def key_handler(...):
+            ...
+
+    Handlers which don't declare a kind are assumed to be MUTATING.
     """
     ROUTES: Dict[Any, Any] = {}
 
-    def __init__(self, key: enum.IntEnum):
+    def __init__(self, key: enum.IntEnum, kind: Optional[HandlerKind] = None):
         self._key = key
+        self._kind = kind
 
     def __call__(self, fn: Callable):
         if self._key in self.ROUTES:
             raise RuntimeError(f'Tried to register 2 handlers for op {self._key.name}')
+        if self._kind is not None:
+            fn.handler_kind = self._kind
         self.ROUTES[self._key] = fn
         return fn
 
@@ -32,3 +55,48 @@ class Router(object):
             raise RuntimeError(f'Tried to register 2 packets for op {k.name}')
         cls.ROUTES[k] = v
         return v
+
+
+class Route(NamedTuple):
+    """Everything needed to dispatch a single op_code."""
+    op: int
+    name: Text
+    packet_format: Optional[Any]
+    handler: Optional[Callable]
+    kind: HandlerKind = HandlerKind.MUTATING
+
+
+class DispatchTable(object):
+    """A flat lookup table from raw op_code integer --> Route.
+
+    This is compiled once from the ClientPacket and Handler routes when a
+    server starts, so that dispatching a packet is a single list index: no
+    enum is constructed and no dict is searched.
+    """
+
+    def __init__(self, packet_formats: Dict[Any, Any], handlers: Dict[Any, Callable]):
+        """Compile a new table.
+
+        Args:
+            packet_formats: A mapping from op_code --> Struct.
+            handlers: A mapping from op_code --> handler function.
+        """
+        ops = set(packet_formats) | set(handlers)
+        self._routes: List[Optional[Route]] = [None] * (max(ops) + 1 if ops else 0)
+        for op in ops:
+            self._routes[op] = Route(
+                op=int(op),
+                name=getattr(op, 'name', str(op)),
+                packet_format=packet_formats.get(op, None),
+                handler=handlers.get(op, None),
+                kind=getattr(handlers.get(op, None), 'handler_kind', HandlerKind.MUTATING),
+            )
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def get(self, op: int) -> Optional[Route]:
+        """Get the route for a raw op_code, or None if it is unknown."""
+        if 0 <= op < len(self._routes):
+            return self._routes[op]
+        return None
@@ -1,10 +1,13 @@
+import asyncio
 import logging
 import socketserver
-from typing import Any, Callable, Dict, Text, Type
+from typing import Any, Callable, Dict, Optional, Text, Tuple, Type
 
 import coloredlogs
 import construct
 
+from common import dispatcher, router, session
+
 
 class Server(socketserver.TCPServer):
     """Implementation of a TCPServer which can handle packets."""
@@ -15,6 +18,7 @@ class Server(socketserver.TCPServer):
         handlers: Dict[Any, Callable],
         log: logging.LoggerAdapter,
         *args,
+        dispatcher: Optional[dispatcher.Dispatcher] = None,
         **kwargs,
     ):
         """Create a new server.
@@ -26,15 +30,148 @@ class Server(socketserver.TCPServer):
                       should take as input the packet + the session object.
             log: A log to write debugging data to.
             *args: Additional arguments to pass to the parent.
+            dispatcher: The pool to run handlers on. If None, handlers are run
+                        on the thread which reads the packets.
             **kwargs: Additional arguments to pass to the parent.
         """
         super(Server, self).__init__(*args, **kwargs)
 
         self.packet_formats = packet_formats
         self.handlers = handlers
+        self.routes = router.DispatchTable(packet_formats, handlers)
+        self.dispatcher = dispatcher
         self.log = log
 
 
+class _SessionProtocol(asyncio.BufferedProtocol):
+    """Protocol which connects an asyncio transport to a Session.
+
+    Received data is read straight into the session's framer, and each
+    complete packet is then handled on the event loop.
+    """
+
+    def __init__(self, server: 'AsyncServer'):
+        self.server = server
+        self.session: Optional[session.Session] = None
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        self.session = self.server.RequestHandlerClass.attach(
+            session.TransportRequest(transport),
+            transport.get_extra_info('peername'),
+            self.server,
+        )
+        self.session.writer.start()
+        self.session.on_connect()
+        self.session.flush()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.session.framer.get_buffer()
+
+    def buffer_updated(self, nbytes: int):
+        self.session.framer.commit(nbytes)
+        try:
+            self.session.process_frames()
+        except Exception:
+            self.server.log.exception(f'error while handling {self.session.client_address}')
+            self.session.request.close()
+
+    def pause_writing(self):
+        self.session.writer.pause()
+
+    def resume_writing(self):
+        self.session.writer.resume()
+
+    def connection_lost(self, exc: Optional[Exception]):
+        self.session.log.warning('client disconnect')
+        self.session.writer.stop()
+        self.session.finish()
+
+
+class AsyncServer(object):
+    """Implementation of an asyncio server which can handle packets.
+
+    Unlike Server, which serves one connection at a time, this multiplexes
+    every connected session on a single event loop. It exposes the same
+    members as Server so that sessions can run on either.
+    """
+
+    def __init__(
+        self,
+        packet_formats: Dict[Any, construct.Struct],
+        handlers: Dict[Any, Callable],
+        log: logging.LoggerAdapter,
+        server_address: Tuple[Text, int],
+        RequestHandlerClass: Type[session.Session],
+        dispatcher: Optional[dispatcher.Dispatcher] = None,
+    ):
+        """Create a new server.
+
+        Args:
+            packet_formats: A mapping from op_code --> Struct which can be used to
+                            read packets in that format.
+            handlers: A mapping from op_code --> handler function. The handler function
+                      should take as input the packet + the session object.
+            log: A log to write debugging data to.
+            server_address: The (host, port) to listen on.
+            RequestHandlerClass: The session type to create for each connection.
+            dispatcher: The pool to run handlers on. If None, handlers are run
+                        on the event loop.
+        """
+        self.packet_formats = packet_formats
+        self.handlers = handlers
+        self.routes = router.DispatchTable(packet_formats, handlers)
+        self.dispatcher = dispatcher
+        self.log = log
+        self.server_address = server_address
+        self.RequestHandlerClass = RequestHandlerClass
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def __enter__(self) -> 'AsyncServer':
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self._server = await self.loop.create_server(
+            lambda: _SessionProtocol(self),
+            host=self.server_address[0],
+            port=self.server_address[1],
+            reuse_address=True,
+        )
+
+        # If we were asked for any free port, record the one we were given.
+        self.server_address = self._server.sockets[0].getsockname()[:2]
+
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass
+
+    def serve_forever(self):
+        """Run the event loop until shutdown() is called.
+
+        This will take control of the current thread.
+        """
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Stop the server. This can be called from any thread."""
+        if self.loop and self._server:
+            self.loop.call_soon_threadsafe(self._server.close)
+
+
+# Mapping of engine name --> server type.
+ENGINES: Dict[Text, Type] = {
+    'socket': Server,
+    'asyncio': AsyncServer,
+}
+
+
 def run(
     name: Text,
     host: Text,
@@ -42,8 +179,10 @@ def run(
     session_type: Type,
     packet_formats: Dict[Any, construct.Struct],
     handlers: Dict[Any, Callable],
+    engine: Text = 'socket',
+    workers: int = 0,
 ):
-    """Run a threaded socket server.
+    """Run a socket server.
 
     This will take control of the current thread.
 
@@ -54,17 +193,32 @@ def run(
         session_type: The session request handler type to use.
         packet_formats: A mapping from OpCode --> Struct.
         handlers: A mapping from OpCode --> handler function.
+        engine: The type of server to run (one of ENGINES). 'socket' serves a
+                single connection at a time, 'asyncio' multiplexes all of them
+                on one event loop.
+        workers: The number of threads to run handlers on. If 0, handlers are
+                 run on the thread which reads the packets.
     """
+    if engine not in ENGINES:
+        raise ValueError(f'unknown server engine {engine}')
+
     logger = logging.Logger(name=name)
     log_adapter = logging.LoggerAdapter(logger=logger, extra={})
     coloredlogs.install(level='DEBUG', logger=logger)
 
+    handler_pool = dispatcher.Dispatcher(max_workers=workers) if workers else None
+
     Server.allow_reuse_address = True
-    with Server(packet_formats=packet_formats,
-                handlers=handlers,
-                log=log_adapter,
-                server_address=(host, port),
-                RequestHandlerClass=session_type) as server:
-        server.log.info(  # type: ignore
-            f'Serving {name} server @ {host}:{port}...')
-        server.serve_forever()
+    try:
+        with ENGINES[engine](packet_formats=packet_formats,
+                             handlers=handlers,
+                             log=log_adapter,
+                             server_address=(host, port),
+                             RequestHandlerClass=session_type,
+                             dispatcher=handler_pool) as server:
+            server.log.info(  # type: ignore
+                f'Serving {name} server @ {host}:{port} ({engine}, {workers} workers)...')
+            server.serve_forever()
+    finally:
+        if handler_pool:
+            handler_pool.shutdown()
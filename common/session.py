@@ -1,5 +1,40 @@
+import asyncio
+import inspect
+import logging
 import socketserver
-from typing import Any, Tuple
+from typing import Any, FrozenSet, List, Optional, Sequence, Tuple, Union
+
+from common import framer, metrics, outbound, records, router
+
+
+class TransportRequest(object):
+    """Adapter which allows a Session to write to an asyncio transport.
+
+    This provides the subset of the socket interface which sessions use to
+    send data, so that they can run on either the socket or asyncio engine.
+    It must only be used from the event loop thread; sessions use a
+    TransportWriter to hand writes over from other threads.
+    """
+
+    def __init__(self, transport: asyncio.Transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+
+    def sendall(self, data: bytes):
+        """Queue some data to be written to the transport."""
+        self.transport.write(data)
+
+    def sendmsg(self, buffers: List[bytes]) -> int:
+        """Queue a list of buffers to be written to the transport.
+
+        Returns:
+            The number of bytes queued (always all of them).
+        """
+        self.transport.writelines(buffers)
+        return sum(len(b) for b in buffers)
+
+    def close(self):
+        self.transport.close()
 
 
 class Session(socketserver.BaseRequestHandler):
@@ -10,76 +45,261 @@ class Session(socketserver.BaseRequestHandler):
     handler functions.
     """
 
+    # Limits on the outbound queue. Above the high-water marks, droppable
+    # packets are discarded. Above the maximums, the client is disconnected.
+    OUTBOUND_HIGH_WATER_BYTES: Optional[int] = 256 * 1024
+    OUTBOUND_HIGH_WATER_PACKETS: Optional[int] = 1024
+    OUTBOUND_MAX_BYTES: Optional[int] = 1024 * 1024
+    OUTBOUND_MAX_PACKETS: Optional[int] = 4096
+
+    # Op codes whose handlers always run on the thread which reads packets,
+    # even if there is a dispatcher. The next packet header isn't read until
+    # they have finished, so they can change how headers are read.
+    INLINE_OPS: FrozenSet[Any] = frozenset()
+
+    @classmethod
+    def attach(cls, request: Any, client_address: Any, server: Any) -> 'Session':
+        """Create a session without running the blocking handle() loop.
+
+        This is used by servers which drive the session themselves (e.g. the
+        asyncio server, which feeds data into the session's framer).
+
+        Args:
+            request: The request object (e.g. a TransportRequest) for the session.
+            client_address: The address of the connected client.
+            server: The server which accepted the connection.
+
+        Returns:
+            The new session, with setup() already called.
+        """
+        session = cls.__new__(cls)
+        session.request = request
+        session.client_address = client_address
+        session.server = server
+        session.setup()
+        return session
+
     def setup(self):
         """Setup the session with some common infrastructure.
 
         This will add the following members:
             log: A logger which is specific to this session.
+            framer: The receive buffer, which splits data into packets.
+            outbound: The bounded send queue, which holds packets until flush().
+            writer: The writer which drains the send queue to the client.
+            dispatcher: The server's handler pool (None to run handlers inline).
         """
         super(Session, self).setup()
 
         self.log = self.server.log
+        self.framer = framer.Framer(self.read_header)
+        self.outbound = outbound.OutboundBuffer(
+            high_water_bytes=self.OUTBOUND_HIGH_WATER_BYTES,
+            high_water_packets=self.OUTBOUND_HIGH_WATER_PACKETS,
+            max_bytes=self.OUTBOUND_MAX_BYTES,
+            max_packets=self.OUTBOUND_MAX_PACKETS,
+        )
+
+        if isinstance(self.request, TransportRequest):
+            self.writer = outbound.TransportWriter(self.request, self.outbound, self.request.loop)
+        else:
+            self.writer = outbound.ThreadWriter(self.request, self.outbound)
+
+        self.dispatcher = getattr(self.server, 'dispatcher', None)
+
+        # Set once the client has been disconnected for not keeping up.
+        self.evicted = False
+
+        # Checked once, so that packets aren't formatted for a disabled log.
+        self.log_packets = self.log.isEnabledFor(logging.DEBUG)
 
-    def send_packet(self, op: Any, data: bytes):
-        """Send a data packet.
+    def send_packet(self, op: Any, data: bytes, droppable: bool = False):
+        """Queue a data packet to be sent.
 
-        This will first generate the response header, prepend it to the packet
-        and then send it back to the client.
+        This will generate the response header and add both it and the packet
+        to the outbound queue. Nothing is sent to the client until flush() is
+        called. This never blocks, so it is safe to call from any thread.
+
+        If the client isn't keeping up with the packets being sent, droppable
+        packets will be discarded, and if the queue fills up completely the
+        client will be disconnected.
 
         Args:
             op: The op_code for this packet.
             data: The raw contents of the packet.
+            droppable: True if this is a low-value packet which can be skipped.
+        """
+        self.send_packets([(op, data)], droppable=droppable)
+
+    def send_packets(self, packets: Sequence[Tuple[Any, bytes]], droppable: bool = False):
+        """Queue a batch of data packets to be sent, in order.
+
+        This behaves like calling send_packet() for each packet, except that
+        the headers for the whole batch are generated with a single call to
+        write_headers().
+
+        Args:
+            packets: A list of (op_code, data) tuples to send.
+            droppable: True if these are low-value packets which can be skipped.
+        """
+        if self.evicted or not packets:
+            return
+
+        with self.outbound.lock:
+            admitted = []
+            num_bytes = 0
+            for op, data in packets:
+                try:
+                    if not self.outbound.admit(
+                            num_bytes + len(data), droppable=droppable, num_packets=len(admitted) + 1):
+                        continue
+                except outbound.OutboundQueueFull as e:
+                    self.evict(str(e))
+                    return
+
+                admitted.append((op, data))
+                num_bytes += len(data)
+
+            if not admitted:
+                return
+
+            for (op, data), header in zip(admitted, self.write_headers(admitted)):
+                if self.log_packets:
+                    self.log.debug(f'--> {op.name}')
+                self.outbound.append(header, data)
+
+    def flush(self):
+        """Have the writer send all queued packets to the client in a single write.
+
+        This never blocks; the write happens on the writer.
+        """
+        self.writer.wake()
+
+    def evict(self, reason: str):
+        """Disconnect a client which isn't keeping up.
+
+        Args:
+            reason: Why the client is being disconnected.
         """
-        self.log.debug(f'--> {op.name}')
-        header = self.write_header(op, data)
-        self.request.sendall(header + data)
+        if self.evicted:
+            return
 
-    def read_header(self) -> Tuple[int, int]:
-        """Read the header from the request stream.
+        self.evicted = True
+        self.log.warning(f'evicting client: {reason}')
+        metrics.counter('session.evictions').inc()
+        self.writer.abort()
+
+    def read_header(self, buffer: memoryview) -> Optional[Tuple[Any, int, int]]:
+        """Read the header from the start of the receive buffer.
+
+        This is called exactly once per packet, as soon as enough data is
+        available, so it is safe for it to update any header state.
+
+        Args:
+            buffer: All received data which hasn't been processed yet.
 
         Returns:
-            A tuple of (op_code, data_len).
+            None if `buffer` doesn't contain a full header yet, otherwise a
+            tuple of (op_code, header_len, data_len). The op_code should be
+            the raw integer, not an enum.
         """
         raise NotImplementedError()
 
-    def handle(self):
-        """Handle the long-lived connection.
+    def on_connect(self):
+        """Called once when the client connects, before any packets are read."""
+
+    def handle_packet(self, op: int, data: memoryview):
+        """Dispatch a single packet to its handler and send back the responses.
+
+        Packets with unknown or unhandled op_codes are counted and skipped.
 
-        Will receive packets one at a time (using read_header()) and respond
-        to them based on the handlers in self.server.handlers.
+        Args:
+            op: The raw op_code of the packet.
+            data: The raw contents of the packet.
         """
-        while True:
-            op_code, data_len = self.read_header()
-            if op_code is None:
-                self.log.warning('client disconnect')
+        route = self.server.routes.get(op)
+        if route is None or route.packet_format is None:
+            metrics.counter('session.unknown_opcodes').inc()
+            self.log.warning(f'unknown packet format for {route.name if route else hex(op)}')
+            return
+
+        if route.handler is None:
+            metrics.counter('session.unhandled_opcodes').inc()
+            self.log.warning(f'unhandled opcode {route.name}')
+            return
+
+        if self.log_packets:
+            self.log.debug(f'<-- {route.name}')
+
+        # Fixed-layout packets are decoded straight out of the receive buffer.
+        # Anything else has to be copied before it is handed to the dispatcher,
+        # as the buffer is reused once this returns.
+        if isinstance(route.packet_format, records.FixedLayout):
+            data = route.packet_format.parse(data)
+        elif self.dispatcher is not None:
+            data = bytes(data)
+
+        # Without a dispatcher, handlers run on the thread which reads packets.
+        if self.dispatcher is None or op in self.INLINE_OPS:
+            self.run_handler(route, data)
+        elif not self.dispatcher.submit(self, route, data):
+            self.evict('too many packets waiting to be handled')
+
+    def run_handler(self, route: router.Route, data: Union[bytes, records.Record]):
+        """Parse a packet, run its handler and queue the responses.
+
+        Handlers can either return a list of (op_code, data) responses, which
+        are queued together, or be generators which yield them one at a time.
+        Each response from a generator is sent as soon as it is yielded, so
+        the client can start processing it while the rest are being built.
+
+        Args:
+            route: The route of the packet.
+            data: The raw contents of the packet, or the already parsed record
+                  for fixed-layout packets.
+        """
+        pkt = data if isinstance(data, records.Record) else route.packet_format.parse(data)
+        responses = route.handler(pkt, self)
+        if not inspect.isgenerator(responses):
+            self.send_packets(responses)
+            return
+
+        for op, response in responses:
+            # Stop building responses for a client which has gone away.
+            if self.evicted:
+                responses.close()
                 return
 
-            self.log.debug(f'<-- {op_code.name}')
-            if data_len > 0:
-                data = self.request.recv(data_len)
-                if data == b'' or op_code is None:
-                    self.log.warning('client disconnect')
-                    return
-            else:
-                data = b''
+            self.send_packet(op, response)
+            self.flush()
 
-            if len(data) != data_len:
-                self.log.warning(f'short read, wanted {data_len}, got {len(data)}')
-                continue
+    def process_frames(self):
+        """Handle every complete packet which has been received.
 
-            pkt_format = self.server.packet_formats.get(op_code, None)
-            if not pkt_format:
-                self.log.warning(f'unknown packet format for {op_code.name}')
-                continue
+        The responses to all of the packets are sent together once they have
+        all been handled.
+        """
+        for op, data in self.framer.frames():
+            self.handle_packet(op, data)
 
-            handler = self.server.handlers.get(op_code, None)
-            if not handler:
-                self.log.warning(f'unhandled opcode {op_code.name}')
-                continue
+        self.flush()
 
-            responses = handler(pkt_format.parse(data), self)
-            for op, response in responses:
-                self.send_packet(op, response)
+    def handle(self):
+        """Handle the long-lived connection.
+
+        Will receive as much data as is available in each call, and respond to
+        each complete packet based on the handlers in self.server.routes.
+        """
+        self.writer.start()
+        try:
+            self.on_connect()
+            self.flush()
+            while self.framer.recv_into(self.request) > 0:
+                self.process_frames()
+
+            self.log.warning('client disconnect')
+        finally:
+            self.writer.stop()
 
     def write_header(self, op: Any, data: bytes) -> bytes:
         """Write the response header for the given data block.
@@ -92,3 +312,17 @@ class Session(socketserver.BaseRequestHandler):
             The header to be prepended to the data bytes.
         """
         raise NotImplementedError()
+
+    def write_headers(self, packets: Sequence[Tuple[Any, bytes]]) -> List[bytes]:
+        """Write the response headers for a batch of packets.
+
+        By default this just calls write_header() for each packet. Sessions
+        whose headers are expensive to generate one at a time can override it.
+
+        Args:
+            packets: A list of (op_code, data) tuples, in the order they will be sent.
+
+        Returns:
+            The headers for each packet, in the same order.
+        """
+        return [self.write_header(op, data) for op, data in packets]
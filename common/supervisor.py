@@ -0,0 +1,174 @@
+"""Runs servers in separate processes, restarting them if they crash.
+
+Each child process periodically reports how much CPU time it has used, so the
+supervisor can log (and export as metrics) the CPU usage of every server.
+"""
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence, Text, Tuple
+
+from common import metrics
+
+# How often (in seconds) the supervisor checks on its children.
+POLL_INTERVAL = 1.0
+
+
+class Child(NamedTuple):
+    """A process to run. `target` must be picklable (i.e. a module-level function)."""
+    name: Text
+    target: Callable
+    args: Tuple = ()
+
+
+class CpuReport(NamedTuple):
+    """Sent by each child to report the CPU time it has used so far."""
+    name: Text
+    pid: int
+    cpu_time: float
+    wall_time: float
+
+
+def _child_main(child: Child, reports: Any, report_interval: float):
+    """Entry point for each child process."""
+
+    def _report():
+        while True:
+            reports.put(CpuReport(child.name, os.getpid(), time.process_time(), time.time()))
+            time.sleep(report_interval)
+
+    threading.Thread(target=_report, daemon=True).start()
+    child.target(*child.args)
+
+
+class Supervisor(object):
+    """Starts a set of child processes, and keeps them running.
+
+    A child which exits with a non-zero exit code (or is killed) is restarted
+    after `restart_delay` seconds. A child which exits cleanly is not.
+    """
+
+    def __init__(
+        self,
+        children: Sequence[Child],
+        report_interval: float = 10.0,
+        restart_delay: float = 1.0,
+        context: Optional[Any] = None,
+    ):
+        """Create a new supervisor.
+
+        Args:
+            children: The processes to run.
+            report_interval: How often (in seconds) each child reports its CPU usage.
+            restart_delay: How long (in seconds) to wait before restarting a crashed child.
+            context: The multiprocessing context to use. Defaults to 'spawn', so
+                     that children never inherit the parent's database connection.
+        """
+        self.children = {child.name: child for child in children}
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.log = logging.getLogger('SUPERVISOR')
+
+        # The most recent CPU usage of each child, as a percentage of one core.
+        self.cpu_percent: Dict[Text, float] = {}
+
+        self._context = context or multiprocessing.get_context('spawn')
+        self._reports = self._context.Queue()
+        self._processes: Dict[Text, Any] = {}
+        self._restart_at: Dict[Text, float] = {}
+        self._last_report: Dict[Text, CpuReport] = {}
+
+    def start(self):
+        """Start every child process."""
+        for name in self.children:
+            self._start(name)
+
+    def stop(self):
+        """Terminate every child process."""
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+
+        for process in self._processes.values():
+            process.join()
+
+    def run(self):
+        """Run the children until interrupted. This will take control of the current thread."""
+        self.start()
+        try:
+            while True:
+                self.poll(POLL_INTERVAL)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def pid(self, name: Text) -> Optional[int]:
+        """Get the current process ID of a child."""
+        process = self._processes.get(name)
+        return process.pid if process else None
+
+    def poll(self, timeout: float):
+        """Collect CPU reports for up to `timeout` seconds, then restart any crashed children.
+
+        Args:
+            timeout: The maximum time to wait for reports.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                report = self._reports.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+
+            self._record(report)
+
+        self._check_children()
+
+    def _start(self, name: Text):
+        process = self._context.Process(
+            target=_child_main,
+            args=(self.children[name], self._reports, self.report_interval),
+            name=name,
+            daemon=True,
+        )
+        process.start()
+
+        self.log.info(f'started {name} (pid {process.pid})')
+        self._processes[name] = process
+
+    def _record(self, report: CpuReport):
+        last = self._last_report.get(report.name)
+        self._last_report[report.name] = report
+
+        # Only compare reports from the same process (i.e. not across a restart).
+        if not last or last.pid != report.pid or report.wall_time <= last.wall_time:
+            return
+
+        percent = 100 * (report.cpu_time - last.cpu_time) / (report.wall_time - last.wall_time)
+        self.cpu_percent[report.name] = percent
+        metrics.gauge(f'supervisor.cpu_percent.{report.name}').set(percent)
+        self.log.info(f'{report.name} (pid {report.pid}): {percent:.1f}% CPU')
+
+    def _check_children(self):
+        now = time.monotonic()
+        for name, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+
+            if name in self._restart_at:
+                if now >= self._restart_at[name]:
+                    del self._restart_at[name]
+                    self._start(name)
+                continue
+
+            if process.exitcode == 0:
+                continue
+
+            self.log.error(f'{name} (pid {process.pid}) exited with code {process.exitcode}, '
+                           f'restarting in {self.restart_delay}s')
+            metrics.counter(f'supervisor.restarts.{name}').inc()
+            self._restart_at[name] = now + self.restart_delay
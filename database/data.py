@@ -9,6 +9,25 @@ from typing import IO, Dict, List, Optional, Set, Text, Type, Union
 from pony import orm
 
 
+def find_data_file(cls_name: Text, module: Text) -> Optional[Text]:
+    """Find the data file a class is loaded from.
+
+    Args:
+        cls_name: The name of the class.
+        module: The module the class is in (either "constants" or "game")
+
+    Returns:
+        The path to the data file, or None if there isn't one.
+    """
+    base_path = getattr(sys, '_MEIPASS', '.')
+    base_file = f'{base_path}/database/{module}/data/{cls_name}'
+    for data_file in (f'{base_file}.json.gz', f'{base_file}.json'):
+        if os.path.exists(data_file):
+            return data_file
+
+    return None
+
+
 def _load(db: orm.Database, cls_name: Text, cls: Type, module: Text):
     """Load the given class' data file.
 
@@ -18,14 +37,8 @@ def _load(db: orm.Database, cls_name: Text, cls: Type, module: Text):
         cls: The type of the class to load.
         module: The module the class is in (either "constants" or "game")
     """
-    base_path = getattr(sys, '_MEIPASS', '.')
-    base_file = f'{base_path}/database/{module}/data/{cls_name}'
-    data_file = None
-    if os.path.exists(f'{base_file}.json.gz'):
-        data_file = f'{base_file}.json.gz'
-    elif os.path.exists(f'{base_file}.json'):
-        data_file = f'{base_file}.json'
-    else:
+    data_file = find_data_file(cls_name, module)
+    if not data_file:
         logging.warning(f'Could not find data file for class {cls_name}')
         return
 
@@ -1,5 +1,6 @@
+import functools
 import math
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
 
 from pony import orm
 
@@ -7,6 +8,34 @@ from database import enums, game
 from database.db import db
 from world_server import system
 
+# The number of GUID objects (and their packed forms) to keep around.
+GUID_CACHE_SIZE = 65536
+
+# Constants used to find the non-zero bytes of a GUID without looping over them.
+_LOW_BITS = 0x7F7F7F7F7F7F7F7F
+_HIGH_BITS = 0x8080808080808080
+_GATHER_BITS = 0x0102040810204080
+
+
+def PackedGUIDMask(guid: int) -> int:
+    """Get the mask of a packed GUID, which has bit i set if byte i is non-zero."""
+    # Set the top bit of each non-zero byte, then gather the top bits into the top byte.
+    non_zero = (((guid & _LOW_BITS) + _LOW_BITS) | guid) & _HIGH_BITS
+    return (((non_zero >> 7) * _GATHER_BITS) >> 56) & 0xFF
+
+
+def PackGUID(guid: int) -> bytes:
+    """Pack a GUID: a mask byte, followed by the non-zero bytes of the GUID."""
+    return bytes((PackedGUIDMask(guid),)) + guid.to_bytes(8, 'little').replace(b'\x00', b'')
+
+
+def PackGUIDs(guids: Iterable[int]) -> bytes:
+    """Pack a list of GUIDs, one after the other.
+
+    GUID objects reuse their cached packed form, so only plain ints are packed.
+    """
+    return b''.join([guid.packed if type(guid) is GUID else PackGUID(guid) for guid in guids])
+
 
 class GUID(int):
     """Wrapper class around int which can be used to encode GUID fields.
@@ -24,6 +53,15 @@ class GUID(int):
     def high(self) -> int:
         return self >> 32
 
+    @functools.cached_property
+    def packed(self) -> bytes:
+        """The packed form of this GUID (see PackGUID)."""
+        return PackGUID(self)
+
+
+# Interned GUIDs, so the packed form is only computed once per GUID.
+_MakeGUID = functools.lru_cache(maxsize=GUID_CACHE_SIZE)(GUID)
+
 
 class GameObject(db.Entity):
     # This has to be a minimum of 10 because some smaller numbers seem to
@@ -36,7 +74,11 @@ class GameObject(db.Entity):
 
     @property
     def guid(self) -> GUID:
-        return GUID((self.high_guid() << 32) | self.id)
+        # The GUID never changes, so it is computed once and kept on the object.
+        guid = getattr(self, '_guid', None)
+        if guid is None:
+            guid = self._guid = _MakeGUID((self.high_guid() << 32) | self.id)
+        return guid
 
     def position(self) -> Tuple[float, float, float]:
         """Get the current position of the object.
@@ -49,6 +91,10 @@ class GameObject(db.Entity):
         """
         raise NotImplementedError('GameObjects must have a position')
 
+    def map_id(self) -> int:
+        """Get the map the object is on (which is where its position is)."""
+        raise NotImplementedError('GameObjects must be on a map')
+
     def distance_to(self, other: 'GameObject') -> float:
         """Calculate the distance between this and another game object.
 
@@ -4,6 +4,12 @@ from typing import Dict, Optional
 from pony import orm
 
 from database.db import db
+from world_server import system
+
+
+def _invalidate_query_cache(guild: 'Guild'):
+    from world_server.systems import query_cache
+    system.Register.Get(system.System.ID.QUERY_CACHE).invalidate(query_cache.CachedQuery.GUILD, guild.id)
 
 
 class GuildMembership(db.Entity):
@@ -22,6 +28,16 @@ class GuildRank(db.Entity):
 
     member_with_rank = orm.Set('GuildMembership')
 
+    # The rank names are part of the GUILD_QUERY response.
+    def after_insert(self):
+        _invalidate_query_cache(self.guild)
+
+    def after_update(self):
+        _invalidate_query_cache(self.guild)
+
+    def before_delete(self):
+        _invalidate_query_cache(self.guild)
+
 
 class Guild(db.Entity):
     id = orm.PrimaryKey(int, auto=True)
@@ -34,6 +50,12 @@ class Guild(db.Entity):
     border_color = orm.Required(int)
     background_color = orm.Required(int)
 
+    def after_update(self):
+        _invalidate_query_cache(self)
+
+    def before_delete(self):
+        _invalidate_query_cache(self)
+
     def get_ranks(self) -> Dict[int, Optional[GuildRank]]:
         rank_map = {i: None for i in range(10)}
         for rank in self.ranks:
@@ -92,6 +92,13 @@ class Item(game_object.GameObject):
             return self.in_container.container.position()
         raise RuntimeError(f'item {self.id} ({self.base_item.name}) does not have an owner!')
 
+    def map_id(self) -> int:
+        if self.in_inventory:
+            return self.in_inventory.player.map_id()
+        if self.in_container:
+            return self.in_container.container.map_id()
+        raise RuntimeError(f'item {self.id} ({self.base_item.name}) does not have an owner!')
+
     def enchantment_map(self) -> Dict[enums.EnchantmentSlot, enchantment.Enchantment]:
         return {ench.slot: ench.enchantment for ench in self.enchantments}
 
@@ -4,6 +4,7 @@ from typing import Any, Dict
 from pony import orm
 
 from database import enums
+from world_server import system
 
 from . import unit
 
@@ -12,6 +13,24 @@ class Pet(unit.Unit):
     name_timestamp = orm.Required(datetime.datetime, default=lambda: datetime.datetime.now())
     talent_points = orm.Required(int, default=0)
 
+    def after_insert(self):
+        super(Pet, self).after_insert()
+
+        # A pet which didn't exist may have been queried.
+        self._invalidate_query_cache()
+
+    def before_update(self):
+        # Renames are rare, and rebuilding the response is cheap.
+        self._invalidate_query_cache()
+
+    def before_delete(self):
+        super(Pet, self).before_delete()
+        self._invalidate_query_cache()
+
+    def _invalidate_query_cache(self):
+        from world_server.systems import query_cache
+        system.Register.Get(system.System.ID.QUERY_CACHE).invalidate(query_cache.CachedQuery.PET_NAME, self.id)
+
     def bytes_1(self) -> int:
         return super(Pet, self).bytes_1() | self.talent_points << 8
 
@@ -7,6 +7,7 @@ from pony import orm
 
 from database import constants, enums, game
 from database.db import db
+from world_server import op_code, system
 
 from . import container, game_object, unit
 from .account import Account
@@ -69,6 +70,16 @@ class PlayerSpell(db.Entity):
 
     orm.PrimaryKey(player, spell)
 
+    def after_insert(self):
+        self._invalidate_login_cache()
+
+    def before_delete(self):
+        self._invalidate_login_cache()
+
+    def _invalidate_login_cache(self):
+        # Learning or forgetting a spell changes the INITIAL_SPELLS sent at login.
+        system.Register.Get(system.System.ID.LOGIN_CACHE).invalidate(self.player.id, op_code.Server.INITIAL_SPELLS)
+
 
 class PlayerActionButton(db.Entity):
     player = orm.Required('Player')
@@ -119,7 +130,6 @@ class Player(unit.Unit):
 
     # Player location information.
     zone = orm.Required(int)
-    map = orm.Required(int)
     quests = orm.Set('Quest')
 
     # Game-object specific information.
@@ -161,6 +171,18 @@ class Player(unit.Unit):
     created_items = orm.Set('Item')
     dual_arbiter = orm.Optional('Player', reverse='dual_arbiter')
 
+    def before_update(self):
+        # Renames are rare, and rebuilding the response is cheap.
+        self._invalidate_query_cache()
+
+    def before_delete(self):
+        super(Player, self).before_delete()
+        self._invalidate_query_cache()
+
+    def _invalidate_query_cache(self):
+        from world_server.systems import query_cache
+        system.Register.Get(system.System.ID.QUERY_CACHE).invalidate(query_cache.CachedQuery.NAME, self.guid)
+
     def swap_items(self, src_slot, dst_slot) -> Optional[enums.InventoryChangeError]:
         s = enums.InventorySlots
 
@@ -186,6 +208,18 @@ class Player(unit.Unit):
 
         return enums.InventoryChangeError.OK
 
+    def carried_items(self) -> List[Item]:
+        """Get every item the player is carrying, including the contents of their bags."""
+        items = []
+        pending = [slot.item for slot in self.inventory if slot.item]
+        while pending:
+            item = pending.pop()
+            items.append(item)
+            if isinstance(item, container.Container):
+                pending.extend(slot.item for slot in item.slots if slot.item)
+
+        return items
+
     def _inv_slice(self, start: int, end: int) -> Dict[int, PlayerInventorySlot]:
         return {pi.slot - start: pi for pi in self.inventory if pi.slot >= start and pi.slot < end}
 
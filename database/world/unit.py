@@ -3,6 +3,7 @@ from typing import Any, Dict, Optional, Tuple
 from pony import orm
 
 from database import constants, enums, game
+from world_server import system
 
 from . import game_object
 
@@ -101,6 +102,7 @@ class Unit(game_object.GameObject):
     channeling_spell = orm.Optional('Spell', reverse='unit_channeling_backlink')
 
     # Unit location information.
+    map = orm.Required(int, default=0)
     x = orm.Required(float)
     y = orm.Required(float)
     z = orm.Required(float)
@@ -117,6 +119,23 @@ class Unit(game_object.GameObject):
         """
         return self.x, self.y, self.z
 
+    def map_id(self) -> int:
+        """Get the map the unit is on.
+
+        Summoned (or created) units, such as pets, are always on the same map
+        as whoever summoned them.
+        """
+        owner = self.summoner or self.created_by
+        if owner:
+            return owner.map_id()
+        return self.map
+
+    def after_insert(self):
+        system.Register.Get(system.System.ID.UPDATER).track(self)
+
+    def before_delete(self):
+        system.Register.Get(system.System.ID.UPDATER).untrack(self)
+
     #
     # Class Methods (should be overwritten in children).
     #
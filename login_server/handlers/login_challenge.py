@@ -8,7 +8,7 @@ from login_server import op_code, router, session
 from login_server.packets import login_challenge
 
 
-@router.Handler(op_code.Client.LOGIN_CHALLENGE)
+@router.Handler(op_code.Client.LOGIN_CHALLENGE, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_login_challenge(pkt: login_challenge.ClientLoginChallenge,
                            session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -8,7 +8,7 @@ from login_server import op_code, router, session
 from login_server.packets import login_proof
 
 
-@router.Handler(op_code.Client.LOGIN_PROOF)
+@router.Handler(op_code.Client.LOGIN_PROOF, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_login_proof(pkt: login_proof.ClientLoginProof,
                        session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
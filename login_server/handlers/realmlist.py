@@ -7,7 +7,7 @@ from login_server import op_code, router, session
 from login_server.packets import realmlist
 
 
-@router.Handler(op_code.Client.REALMLIST)
+@router.Handler(op_code.Client.REALMLIST, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_realmlist(pkt: realmlist.ClientRealmlist, session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     account = world.Account[session.account_name]
@@ -5,6 +5,8 @@ import construct
 from common import router
 from login_server import op_code
 
+HandlerKind = router.HandlerKind
+
 
 class ClientPacket(router.Router):
     ROUTES: Dict[op_code.Client, construct.Struct] = {}
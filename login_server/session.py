@@ -11,6 +11,9 @@ _OP_PACKET_SIZE = {
     op_code.Client.REALMLIST: 4,
 }
 
+# The maximum size of a packet which isn't in _OP_PACKET_SIZE.
+_MAX_UNKNOWN_PACKET_SIZE = 1024
+
 
 class Session(session.Session):
 
@@ -24,7 +27,7 @@ class Session(session.Session):
         self.b: int = None
         self.B: int = None
 
-    def read_header(self) -> Tuple[Optional[int], int]:
+    def read_header(self, buffer: memoryview) -> Optional[Tuple[int, int, int]]:
         """Read the AUTH client packet header.
 
         This is always at least:
@@ -34,26 +37,28 @@ class Session(session.Session):
             1 byte error (unknown usage)
             2 byte length
 
+        Args:
+            buffer: All received data which hasn't been processed yet.
+
         Returns:
-            The op_code + the length of the packet. op_code will be None
-            in the case that the client disconnected.
+            None if the header hasn't been fully received, otherwise the
+            op_code + the length of the header + the length of the packet.
         """
-        header = self.request.recv(1)
-        if len(header) != 1:
-            return None, 0
+        if len(buffer) < 1:
+            return None
 
-        op = op_code.Client(int.from_bytes(header, 'little'))
-        length = _OP_PACKET_SIZE.get(op, 1024)
+        op = buffer[0]
 
         # Special case: LOGIN_CHALLENGE includes a length.
         if op == op_code.Client.LOGIN_CHALLENGE:
-            extended_header = self.request.recv(3)
-            if len(extended_header) != 3:
-                return None, 0
+            if len(buffer) < 4:
+                return None
 
-            length = int.from_bytes(extended_header[1:], 'little')
+            return op, 4, int.from_bytes(buffer[2:4], 'little')
 
-        return op, length
+        # Packets without a known size take whatever has been received.
+        length = _OP_PACKET_SIZE.get(op, min(len(buffer) - 1, _MAX_UNKNOWN_PACKET_SIZE))
+        return op, 1, length
 
     def write_header(self, op: op_code.Server, data: bytes) -> bytes:
         """Write the AUTH server header.
@@ -9,8 +9,10 @@ import threading
 import pytest
 from pony import orm
 
+import world_server.systems  # register systems
 from common import server
 from database import common, constants, data, db, game, world
+from world_server import system
 
 _db_tempfile = tempfile.NamedTemporaryFile()
 
@@ -24,6 +26,12 @@ def pytest_configure(config):
 def pytest_runtest_setup(item):
     data.clear_world_database(db.db)
     db.db.create_tables()
+
+    # The world database was cleared without running any hooks, so drop
+    # everything which was cached from it.
+    system.Register.Get(system.System.ID.LOGIN_CACHE).clear()
+    system.Register.Get(system.System.ID.QUERY_CACHE).clear()
+    system.Register.Get(system.System.ID.UPDATER).reset()
     orm.db_session.__enter__()
 
 
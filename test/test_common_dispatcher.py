@@ -0,0 +1,175 @@
+import threading
+import time
+
+from common import dispatcher, metrics, router
+
+
+class FakeSession(object):
+    """Records the packets it handles, in order."""
+
+    def __init__(self, mocker, block: threading.Event = None):
+        self.log = mocker.MagicMock()
+        self.writer = mocker.MagicMock()
+        self.flush = mocker.MagicMock()
+        self.handled = []
+        self.block = block
+
+    def run_handler(self, route, data):
+        if self.block:
+            self.block.wait(timeout=5)
+        self.handled.append(data)
+
+
+ROUTE = router.Route(op=1, name='OP1', packet_format=None, handler=None, kind=router.HandlerKind.NO_DB)
+
+
+def test_submit_runs_in_order(mocker):
+    pool = dispatcher.Dispatcher(max_workers=4)
+    session = FakeSession(mocker)
+
+    for i in range(50):
+        assert pool.submit(session, ROUTE, bytes([i]))
+    pool.shutdown()
+
+    assert session.handled == [bytes([i]) for i in range(50)]
+    assert session.flush.call_count == 50
+    assert len(pool) == 0
+
+
+def test_slow_session_does_not_block_others(mocker):
+    pool = dispatcher.Dispatcher(max_workers=2)
+    block = threading.Event()
+    slow = FakeSession(mocker, block=block)
+    fast = FakeSession(mocker)
+    done = threading.Event()
+    fast.flush.side_effect = done.set
+
+    pool.submit(slow, ROUTE, b'slow')
+    pool.submit(fast, ROUTE, b'fast')
+
+    # The fast session finishes while the slow one is still running.
+    assert done.wait(timeout=5)
+    assert fast.handled == [b'fast']
+    assert slow.handled == []
+
+    block.set()
+    pool.shutdown()
+    assert slow.handled == [b'slow']
+
+
+def test_submit_rejects_when_session_backlog_full(mocker):
+    pool = dispatcher.Dispatcher(max_workers=1, max_pending_per_session=2)
+    block = threading.Event()
+    session = FakeSession(mocker, block=block)
+
+    # The first packet is taken off the queue as soon as it starts running,
+    # so wait for that before filling up the queue.
+    assert pool.submit(session, ROUTE, b'1')
+    while len(pool):
+        time.sleep(0.001)
+
+    assert pool.submit(session, ROUTE, b'2')
+    assert pool.submit(session, ROUTE, b'3')
+    assert not pool.submit(session, ROUTE, b'4')
+
+    block.set()
+    pool.shutdown()
+    assert session.handled == [b'1', b'2', b'3']
+
+
+def test_handler_error_closes_session(mocker):
+    pool = dispatcher.Dispatcher(max_workers=1)
+    session = FakeSession(mocker)
+    session.run_handler = mocker.MagicMock(side_effect=RuntimeError('boom'))
+
+    pool.submit(session, ROUTE, b'1')
+    pool.shutdown()
+
+    session.log.exception.assert_called_once()
+    session.writer.abort.assert_called_once_with()
+
+
+def test_metrics(mocker):
+    pool = dispatcher.Dispatcher(max_workers=1)
+    session = FakeSession(mocker)
+    count = metrics.distribution('dispatcher.wait_time').count
+
+    pool.submit(session, ROUTE, b'1')
+    pool.submit(session, ROUTE, b'2')
+    pool.shutdown()
+
+    assert metrics.distribution('dispatcher.wait_time').count == count + 2
+    assert metrics.gauge('dispatcher.queue_depth').value == 0
+
+
+def _route(kind):
+    return router.Route(op=1, name='OP1', packet_format=None, handler=None, kind=kind)
+
+
+def _run_concurrently(mocker, pool, routes):
+    """Submit one packet per route (from different sessions), and return the
+    maximum number of handlers which were running at the same time."""
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    class _Session(FakeSession):
+
+        def run_handler(self, route, data):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    for route in routes:
+        pool.submit(_Session(mocker), route, b'')
+    pool.shutdown()
+
+    return peak[0]
+
+
+def test_read_only_handlers_run_concurrently(mocker):
+    pool = dispatcher.Dispatcher(max_workers=4)
+    assert _run_concurrently(mocker, pool, [_route(router.HandlerKind.READ_ONLY)] * 4) > 1
+
+
+def test_no_db_handlers_run_concurrently(mocker):
+    pool = dispatcher.Dispatcher(max_workers=4)
+    assert _run_concurrently(mocker, pool, [_route(router.HandlerKind.NO_DB)] * 4) > 1
+
+
+def test_mutating_handlers_run_alone(mocker):
+    pool = dispatcher.Dispatcher(max_workers=4)
+    routes = [_route(router.HandlerKind.MUTATING)] * 3 + [_route(router.HandlerKind.READ_ONLY)]
+    assert _run_concurrently(mocker, pool, routes) == 1
+
+
+def test_read_write_lock_prefers_writers():
+    lock = dispatcher.ReadWriteLock()
+    order = []
+
+    def _write():
+        with lock.write():
+            order.append('write')
+
+    def _read():
+        with lock.read():
+            order.append('read')
+
+    with lock.read():
+        writer = threading.Thread(target=_write)
+        writer.start()
+        while not lock._writers_waiting:
+            time.sleep(0.001)
+
+        # A new reader has to wait for the waiting writer.
+        reader = threading.Thread(target=_read)
+        reader.start()
+        time.sleep(0.05)
+        assert order == []
+
+    writer.join(timeout=5)
+    reader.join(timeout=5)
+    assert order == ['write', 'read']
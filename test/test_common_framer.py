@@ -0,0 +1,93 @@
+from common import framer
+
+
+def _read_header(buffer):
+    """Header format: 1 byte op_code, 1 byte length."""
+    if len(buffer) < 2:
+        return None
+    return buffer[0], 2, buffer[1]
+
+
+def test_frames_empty():
+    f = framer.Framer(_read_header)
+
+    assert list(f.frames()) == []
+
+
+def test_frames_pipelined():
+    f = framer.Framer(_read_header)
+    f.feed(b'\x01\x02ab\x02\x00\x03\x01c')
+
+    frames = [(op, bytes(data)) for op, data in f.frames()]
+
+    assert frames == [(1, b'ab'), (2, b''), (3, b'c')]
+    assert len(f) == 0
+
+
+def test_frames_split_header_and_data():
+    headers_read = []
+
+    def _counting_read_header(buffer):
+        header = _read_header(buffer)
+        if header:
+            headers_read.append(header[0])
+        return header
+
+    f = framer.Framer(_counting_read_header)
+
+    f.feed(b'\x01')
+    assert list(f.frames()) == []
+
+    f.feed(b'\x04ab')
+    assert list(f.frames()) == []
+
+    f.feed(b'cd\x02')
+    assert [(op, bytes(data)) for op, data in f.frames()] == [(1, b'abcd')]
+    assert len(f) == 1
+
+    # The header should only have been read once, even though it was seen
+    # multiple times while waiting for the data.
+    assert headers_read == [1]
+
+
+def test_frames_are_views():
+    f = framer.Framer(_read_header)
+    f.feed(b'\x01\x02ab')
+
+    (_, data), = list(f.frames())
+
+    assert isinstance(data, memoryview)
+
+
+def test_get_buffer_grows():
+    f = framer.Framer(_read_header, initial_size=8)
+    f.feed(b'\x01\xFF')
+
+    data = bytes(range(255))
+    f.feed(data)
+
+    assert [(op, bytes(d)) for op, d in f.frames()] == [(1, data)]
+
+
+def test_get_buffer_compacts():
+    f = framer.Framer(_read_header, initial_size=16)
+
+    for i in range(10):
+        f.feed(b'\x01\x04abcd')
+        assert [(op, bytes(data)) for op, data in f.frames()] == [(1, b'abcd')]
+
+    assert len(f.get_buffer(min_size=8)) >= 8
+
+
+def test_recv_into(mocker):
+    f = framer.Framer(_read_header)
+    sock = mocker.MagicMock()
+
+    def _recv_into(buffer):
+        buffer[:4] = b'\x01\x02ab'
+        return 4
+
+    sock.recv_into.side_effect = _recv_into
+
+    assert f.recv_into(sock) == 4
+    assert [(op, bytes(data)) for op, data in f.frames()] == [(1, b'ab')]
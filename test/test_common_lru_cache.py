@@ -0,0 +1,58 @@
+from common import lru_cache
+
+
+def test_get_and_put():
+    cache = lru_cache.LRUCache('test_get_and_put', max_size=2)
+    assert cache.get('a') is None
+
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    assert 'a' in cache
+    assert cache.hit_rate() == 0.5
+
+
+def test_evicts_least_recently_used():
+    cache = lru_cache.LRUCache('test_evicts', max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert len(cache) == 2
+
+
+def test_get_or_build(mocker):
+    cache = lru_cache.LRUCache('test_get_or_build', max_size=2)
+    build = mocker.MagicMock(return_value=b'packet')
+
+    assert cache.get_or_build('a', build) == b'packet'
+    assert cache.get_or_build('a', build) == b'packet'
+    build.assert_called_once_with()
+
+
+def test_invalidate():
+    cache = lru_cache.LRUCache('test_invalidate', max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+
+    cache.invalidate('a', 'missing')
+    assert 'a' not in cache
+    assert 'b' in cache
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_invalidate_while_building():
+    cache = lru_cache.LRUCache('test_invalidate_while_building', max_size=2)
+
+    def build():
+        # The data changes while the entry is being built.
+        cache.invalidate('a')
+        return 1
+
+    assert cache.get_or_build('a', build) == 1
+    assert 'a' not in cache
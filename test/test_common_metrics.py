@@ -0,0 +1,33 @@
+import pytest
+
+from common import metrics
+
+
+def test_counter():
+    counter = metrics.counter('test.counter')
+    counter.inc()
+    counter.inc(2)
+
+    assert metrics.counter('test.counter') is counter
+    assert metrics.snapshot()['test.counter'] == 3
+
+
+def test_gauge():
+    metrics.gauge('test.gauge').set(5)
+
+    assert metrics.snapshot()['test.gauge'] == 5
+
+
+def test_distribution():
+    distribution = metrics.distribution('test.distribution')
+    for value in (1, 5, 3):
+        distribution.record(value)
+
+    assert metrics.snapshot()['test.distribution'] == dict(count=3, total=9, min=1, max=5, mean=3.0)
+
+
+def test_wrong_type():
+    metrics.counter('test.wrong_type')
+
+    with pytest.raises(TypeError):
+        metrics.distribution('test.wrong_type')
@@ -0,0 +1,153 @@
+import threading
+
+import pytest
+
+from common import metrics, outbound
+
+
+class FakeSocket:
+    """Socket which only accepts up to `limit` bytes per sendmsg() call."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.calls = 0
+        self.data = b''
+
+    def sendmsg(self, buffers):
+        self.calls += 1
+        data = b''.join(bytes(b) for b in buffers)
+        if self.limit is not None:
+            data = data[:self.limit]
+        self.data += data
+        return len(data)
+
+
+class FakeStream:
+    """Socket-like object without sendmsg()."""
+
+    def __init__(self):
+        self.data = []
+
+    def sendall(self, data):
+        self.data.append(data)
+
+
+def test_flush_single_call():
+    buffer = outbound.OutboundBuffer()
+    buffer.append(b'h1', b'data1')
+    buffer.append(b'h2', b'data2')
+    assert len(buffer) == 2
+    assert buffer.num_bytes == 14
+
+    sock = FakeSocket()
+    assert buffer.flush(sock) == 2
+
+    assert sock.calls == 1
+    assert sock.data == b'h1data1h2data2'
+    assert len(buffer) == 0
+    assert buffer.num_bytes == 0
+
+
+def test_flush_empty():
+    sock = FakeSocket()
+
+    assert outbound.OutboundBuffer().flush(sock) == 0
+    assert sock.calls == 0
+
+
+def test_flush_records_metrics():
+    frames_per_flush = metrics.distribution('outbound.frames_per_flush')
+    count = frames_per_flush.count
+
+    buffer = outbound.OutboundBuffer()
+    for _ in range(3):
+        buffer.append(b'h', b'd')
+    buffer.flush(FakeSocket())
+
+    assert frames_per_flush.count == count + 1
+    assert frames_per_flush.max >= 3
+
+
+def test_send_buffers_partial_sends():
+    sock = FakeSocket(limit=3)
+
+    assert outbound.send_buffers(sock, [b'abcd', b'', b'ef', b'ghijk']) == 11
+
+    assert sock.data == b'abcdefghijk'
+    assert sock.calls == 4
+
+
+def test_send_buffers_without_sendmsg():
+    stream = FakeStream()
+
+    assert outbound.send_buffers(stream, [b'ab', b'cd']) == 4
+
+    assert stream.data == [b'abcd']
+
+
+def test_admit_limits():
+    buffer = outbound.OutboundBuffer(high_water_packets=1, max_packets=2)
+
+    assert buffer.admit(1)
+    buffer.append(b'h', b'd')
+
+    # Above the high-water mark, only non-droppable packets are allowed.
+    assert not buffer.admit(1, droppable=True)
+    assert buffer.admit(1)
+    buffer.append(b'h', b'd')
+
+    # Above the maximum, nothing is allowed.
+    assert not buffer.admit(1, droppable=True)
+    with pytest.raises(outbound.OutboundQueueFull):
+        buffer.admit(1)
+
+
+def test_admit_byte_limits():
+    buffer = outbound.OutboundBuffer(high_water_bytes=4, max_bytes=8)
+    buffer.append(b'h', b'ddd')
+
+    assert not buffer.admit(1, droppable=True)
+    assert buffer.admit(4)
+    with pytest.raises(outbound.OutboundQueueFull):
+        buffer.admit(5)
+
+
+def test_thread_writer_does_not_block_senders():
+    unblock = threading.Event()
+
+    class BlockingSocket(FakeSocket):
+
+        def sendmsg(self, buffers):
+            unblock.wait(timeout=5)
+            return super(BlockingSocket, self).sendmsg(buffers)
+
+    sock = BlockingSocket()
+    buffer = outbound.OutboundBuffer()
+    writer = outbound.ThreadWriter(sock, buffer)
+    writer.start()
+
+    buffer.append(b'h1', b'data1')
+    writer.wake()
+
+    # The writer is stuck on the first batch, but packets can still be queued.
+    buffer.append(b'h2', b'data2')
+    writer.wake()
+    assert len(buffer) >= 1
+
+    unblock.set()
+    writer.stop()
+
+    assert sock.data == b'h1data1h2data2'
+    assert len(buffer) == 0
+
+
+def test_thread_writer_abort(mocker):
+    sock = mocker.MagicMock()
+    buffer = outbound.OutboundBuffer()
+    writer = outbound.ThreadWriter(sock, buffer)
+    buffer.append(b'h', b'd')
+
+    writer.abort()
+
+    assert len(buffer) == 0
+    sock.shutdown.assert_called_once()
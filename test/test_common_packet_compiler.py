@@ -0,0 +1,94 @@
+import os
+
+import construct
+from construct import Adapter, CString, Int8ul, Int32ul, Struct
+
+from common import packet_compiler, records
+
+
+class _DoubleAdapter(Adapter):
+
+    def _decode(self, obj, context, path):
+        return obj * 2
+
+    def _encode(self, obj, context, path):
+        return obj // 2
+
+
+SIMPLE = Struct(
+    'a' / Int32ul,
+    'b' / Int8ul,
+    'name' / CString('ascii'),
+)
+
+WITH_ADAPTER = Struct(
+    'a' / Int32ul,
+    'doubled' / _DoubleAdapter(Int8ul),
+)
+
+
+def test_compile_parses_the_same():
+    compiled = packet_compiler.PacketCompiler().compile('SIMPLE', SIMPLE)
+    data = SIMPLE.build(dict(a=1, b=2, name='hello'))
+
+    assert isinstance(compiled, construct.Compiled)
+    assert compiled.parse(data) == SIMPLE.parse(data)
+    assert compiled.build(dict(a=1, b=2, name='hello')) == data
+
+
+def test_compile_with_adapter_interprets_only_the_adapter():
+    compiler = packet_compiler.PacketCompiler()
+    compiled = compiler.compile('WITH_ADAPTER', WITH_ADAPTER)
+
+    assert compiler.results == [packet_compiler.CompileResult('WITH_ADAPTER', compiled=True, interpreted_parts=1)]
+    assert compiled.parse(b'\x01\x00\x00\x00\x05').doubled == 10
+
+
+def test_compile_falls_back_to_interpreter():
+    fmt = _DoubleAdapter(Int8ul)
+
+    compiler = packet_compiler.PacketCompiler()
+    assert compiler.compile('ADAPTER', fmt) is fmt
+    assert not compiler.results[0].compiled
+
+
+def test_compile_uses_cache(tmp_path):
+    first = packet_compiler.PacketCompiler(str(tmp_path))
+    first.compile('SIMPLE', SIMPLE)
+    first.compile('WITH_ADAPTER', WITH_ADAPTER)
+    assert not any(result.from_cache for result in first.results)
+    assert len(os.listdir(tmp_path)) == 2
+
+    second = packet_compiler.PacketCompiler(str(tmp_path))
+    compiled = second.compile('WITH_ADAPTER', WITH_ADAPTER)
+    assert second.results[0].from_cache
+    assert compiled.parse(b'\x01\x00\x00\x00\x05').doubled == 10
+
+
+def test_compile_ignores_corrupt_cache(tmp_path):
+    packet_compiler.PacketCompiler(str(tmp_path)).compile('SIMPLE', SIMPLE)
+    for filename in os.listdir(tmp_path):
+        with open(tmp_path / filename, 'wb') as f:
+            f.write(b'\x00')
+
+    compiler = packet_compiler.PacketCompiler(str(tmp_path))
+    compiled = compiler.compile('SIMPLE', SIMPLE)
+    assert not compiler.results[0].from_cache
+    assert compiled.parse(b'\x01\x00\x00\x00\x02\x00').a == 1
+
+
+def test_compile_all():
+    compiled = packet_compiler.CompileAll({1: SIMPLE, 2: WITH_ADAPTER})
+    assert set(compiled) == {1, 2}
+    assert compiled[2].defersubcon is WITH_ADAPTER
+
+
+def test_compile_fixed_layout():
+    fmt = Struct('a' / Int32ul, 'b' / Int8ul)
+
+    compiler = packet_compiler.PacketCompiler()
+    compiled = compiler.compile('FIXED_LAYOUT', fmt)
+
+    assert isinstance(compiled, records.FixedLayout)
+    assert compiled.record_type.__name__ == 'FixedLayout'
+    assert compiler.results == [packet_compiler.CompileResult('FIXED_LAYOUT', compiled=True, fixed_layout=True)]
@@ -0,0 +1,71 @@
+import pytest
+from construct import (Array, BytesInteger, CString, Default, Float32l, Int8ul, Int16ub, Int24ul, Int32sl, Int32ul,
+                       Int64ul, Struct)
+
+from common import records
+from world_server.packets import item_query_single, name_query, ping, set_action_button, swap_inv_item
+
+MIXED = Struct(
+    'a' / Int8ul,
+    'b' / Int24ul,
+    'c' / Default(Int32sl, -1),
+    'd' / Float32l,
+    'e' / BytesInteger(3, signed=True),
+)
+
+
+@pytest.mark.parametrize('fmt, obj', [
+    (ping.ClientPing, dict(ping=1, latency=2)),
+    (name_query.ClientNameQuery, dict(guid=0x1122334455667788)),
+    (item_query_single.ClientItemQuerySingle, dict(entry=25, guid=0xFFFFFFFFFFFFFFFF)),
+    (swap_inv_item.ClientSwapInvItem, dict(src_slot=23, dst_slot=255)),
+    (set_action_button.ClientSetActionButton, dict(slot=119, action=0xABCDEF, type=64)),
+    (MIXED, dict(a=1, b=0x123456, c=-5, d=1.5, e=-2)),
+])
+def test_parse_matches_construct(fmt, obj):
+    layout = records.FixedLayout.FromStruct('Test', fmt)
+    data = fmt.build(obj)
+
+    pkt = layout.parse(memoryview(data))
+    assert pkt == fmt.parse(data)
+    assert layout.sizeof() == len(data)
+    assert layout.build(obj) == data
+    for name, value in obj.items():
+        assert getattr(pkt, name) == value
+        assert pkt[name] == value
+
+
+def test_parse_empty_struct():
+    layout = records.FixedLayout.FromStruct('Empty', Struct())
+    assert layout.parse(b'') == {}
+
+
+def test_parse_too_short():
+    layout = records.FixedLayout.FromStruct('Test', ping.ClientPing)
+    with pytest.raises(Exception):
+        layout.parse(b'\x00' * 7)
+
+
+@pytest.mark.parametrize('fmt', [
+    Struct('name' / CString('ascii')),
+    Struct('values' / Array(2, Int8ul)),
+    Struct('big' / Int16ub),
+    Struct(Int8ul),
+    Int32ul,
+])
+def test_variable_or_unsupported_layouts(fmt):
+    assert records.FixedLayout.FromStruct('Test', fmt) is None
+
+
+def test_record_type():
+    layout = records.FixedLayout.FromStruct('PingRecord', ping.ClientPing)
+    pkt = layout.parse(b'\x01\x00\x00\x00\x02\x00\x00\x00')
+
+    assert type(pkt).__name__ == 'PingRecord'
+    assert type(pkt).__slots__ == ('ping', 'latency')
+    assert repr(pkt) == 'PingRecord(ping=1, latency=2)'
+    assert pkt == layout.parse(b'\x01\x00\x00\x00\x02\x00\x00\x00')
+    assert pkt != layout.parse(b'\x01\x00\x00\x00\x03\x00\x00\x00')
+
+    with pytest.raises(AttributeError):
+        pkt.other = 1
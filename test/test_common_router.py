@@ -43,3 +43,40 @@ def test_router_multiple_register_fn():
 
     assert len(router.Router.ROUTES) == 1
     assert router.Router.ROUTES[FakeOpCode.OP2] == '1'
+
+
+def test_dispatch_table():
+    table = router.DispatchTable({FakeOpCode.OP1: 'format1', FakeOpCode.OP2: 'format2'}, {FakeOpCode.OP2: test_router})
+
+    assert len(table) == 3
+    assert table.get(0) is None
+    assert table.get(1) == router.Route(op=1, name='OP1', packet_format='format1', handler=None)
+    assert table.get(2) == router.Route(op=2, name='OP2', packet_format='format2', handler=test_router)
+    assert table.get(2).kind == router.HandlerKind.MUTATING
+
+
+def test_dispatch_table_handler_kind():
+    router.Router.ROUTES = {}
+
+    @router.Router(FakeOpCode.OP1, kind=router.HandlerKind.READ_ONLY)
+    def handler(pkt, session):
+        return []
+
+    table = router.DispatchTable({FakeOpCode.OP1: 'format1'}, router.Router.ROUTES)
+
+    assert table.get(1).kind == router.HandlerKind.READ_ONLY
+
+
+def test_dispatch_table_unknown_op():
+    table = router.DispatchTable({FakeOpCode.OP1: 'format1'}, {})
+
+    assert table.get(-1) is None
+    assert table.get(2) is None
+    assert table.get(0xFFFFFFFF) is None
+
+
+def test_dispatch_table_empty():
+    table = router.DispatchTable({}, {})
+
+    assert len(table) == 0
+    assert table.get(0) is None
@@ -1,4 +1,13 @@
-from common import server
+import enum
+import logging
+import socket
+import threading
+import time
+
+import construct
+import pytest
+
+from common import server, session
 
 
 def test_server_run(mocker):
@@ -22,3 +31,66 @@ def test_server_run(mocker):
     mock_server_bind.assert_called_once_with()
     mock_server_activate.assert_called_once_with()
     assert server.Server.allow_reuse_address
+
+
+class _EchoOpCode(enum.IntEnum):
+    ECHO = 1
+
+
+class _EchoSession(session.Session):
+    """Session with a 2 byte header: (op_code, length)."""
+
+    def read_header(self, buffer):
+        if len(buffer) < 2:
+            return None
+        return _EchoOpCode(buffer[0]), 2, buffer[1]
+
+    def write_header(self, op, data):
+        return bytes([op, len(data)])
+
+
+def test_async_server_multiple_clients():
+    echo_server = server.AsyncServer(
+        packet_formats={_EchoOpCode.ECHO: construct.GreedyBytes},
+        handlers={_EchoOpCode.ECHO: lambda pkt, session_: [(_EchoOpCode.ECHO, bytes(pkt))]},
+        log=logging.LoggerAdapter(logging.getLogger('test'), {}),
+        server_address=('127.0.0.1', 0),
+        RequestHandlerClass=_EchoSession,
+    )
+
+    server_thread = threading.Thread(target=echo_server.serve_forever, daemon=True)
+    server_thread.start()
+    while echo_server.server_address[1] == 0:
+        time.sleep(0.01)
+
+    try:
+        # Both clients are connected at the same time; neither should block the other.
+        client1 = socket.create_connection(echo_server.server_address)
+        client2 = socket.create_connection(echo_server.server_address)
+
+        # Send a packet split over multiple writes, to make sure it is reassembled.
+        client2.sendall(b'\x01\x05he')
+        client1.sendall(b'\x01\x03abc')
+        assert client1.recv(5) == b'\x01\x03abc'
+
+        client2.sendall(b'llo')
+        assert client2.recv(7) == b'\x01\x05hello'
+
+        client1.close()
+        client2.close()
+    finally:
+        echo_server.shutdown()
+        server_thread.join(timeout=5)
+
+
+def test_server_run_unknown_engine():
+    with pytest.raises(ValueError):
+        server.run(
+            name='name',
+            host='host',
+            port=100,
+            session_type=int,
+            packet_formats={},
+            handlers={},
+            engine='unknown',
+        )
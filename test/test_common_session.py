@@ -1,10 +1,10 @@
 import enum
-from typing import Any, Tuple
+from typing import Any, List, Optional, Tuple
 
 import pytest
 from construct import Int8ul, Struct
 
-from common import session
+from common import metrics, records, router, session
 
 FakePacket = Struct('num' / Int8ul)
 ZeroLengthPacket = Struct()
@@ -22,34 +22,49 @@ class FakeOpCode(enum.IntEnum):
 
 
 class FakeSession(session.Session):
+    """Session with a 2 byte header: (op_code, length)."""
 
     def __init__(self, mocker):
-        super(FakeSession, self).__init__(request=mocker.MagicMock(), client_address='fake', server=mocker.MagicMock())
+        super(FakeSession, self).__init__(request=mocker.MagicMock(),
+                                          client_address='fake',
+                                          server=mocker.MagicMock(dispatcher=None))
 
     def setup(self):
         super(FakeSession, self).setup()
 
-        self.read_headers = []
-        self.write_headers = []
+        self.fake_headers = []
+        self.request.sendmsg.side_effect = lambda buffers: sum(len(b) for b in buffers)
 
     def handle(self, run=False):
         if run:
             super(FakeSession, self).handle()
 
     def write_header(self, op: Any, data: bytes) -> bytes:
-        return self.write_headers.pop(0).format(op=op, data=data.decode()).encode()
+        return self.fake_headers.pop(0).format(op=op, data=data.decode()).encode()
 
-    def read_header(self) -> Tuple[int, int]:
-        if not self.read_headers:
-            return (None, 0)
-        return self.read_headers.pop(0)
+    def read_header(self, buffer: memoryview) -> Optional[Tuple[Any, int, int]]:
+        if len(buffer) < 2:
+            return None
+        return buffer[0], 2, buffer[1]
+
+
+def _fake_recv(session: FakeSession, chunks: List[bytes]):
+    """Make each call to request.recv_into() return the next chunk of data."""
+    chunks = iter(chunks)
+
+    def _recv_into(buffer):
+        data = next(chunks, b'')
+        buffer[:len(data)] = data
+        return len(data)
+
+    session.request.recv_into.side_effect = _recv_into
 
 
 def test_unimplement_functions(mocker):
     session = FakeSession(mocker)
 
     with pytest.raises(NotImplementedError):
-        super(FakeSession, session).read_header()
+        super(FakeSession, session).read_header(memoryview(b''))
 
     with pytest.raises(NotImplementedError):
         super(FakeSession, session).write_header(FakeOpCode.OP1, b'data')
@@ -57,44 +72,69 @@ def test_unimplement_functions(mocker):
 
 def test_handle_client_disconnect_no_packet(mocker):
     session = FakeSession(mocker)
+    _fake_recv(session, [])
 
     session.handle(run=True)
 
     session.log.warning.assert_called_once_with('client disconnect')
-    assert session.request.recv.call_count == 0
+    assert session.request.recv_into.call_count == 1
 
 
 def test_handle_client_disconnect_when_reading_packet(mocker):
     session = FakeSession(mocker)
-    session.read_headers.append((FakeOpCode.OP1, 100))
-    session.request.recv.return_value = b''
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: mocker.MagicMock()})
+    _fake_recv(session, [b'\x01\x64', b'partial'])
 
     session.handle(run=True)
 
     session.log.warning.assert_called_once_with('client disconnect')
-    session.request.recv.assert_called_once_with(100)
+    assert session.server.routes.get(FakeOpCode.OP1).handler.call_count == 0
 
 
-def test_handle_short_read(mocker):
+def test_handle_split_packet(mocker):
     session = FakeSession(mocker)
-    session.read_headers.append((FakeOpCode.OP1, 4))
-    session.request.recv.return_value = b'123'
+    session.fake_headers.append('header({op})data({data})')
+    _fake_recv(session, [b'\x01', b'\x01', b'\xFF'])
+
+    def _fake_handler(pkt, session_):
+        assert pkt.num == 255
+        return [(FakeOpCode.OP2, b'resp')]
+
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: _fake_handler})
 
     session.handle(run=True)
 
-    session.log.warning.assert_has_calls([
-        mocker.call(AnyStringWith('short read')),
-        mocker.call('client disconnect'),
+    session.request.sendmsg.assert_called_once_with([b'header(2)data(resp)', b'resp'])
+
+
+def test_handle_pipelined_packets(mocker):
+    session = FakeSession(mocker)
+    session.fake_headers.append('header({op})data({data})01')
+    session.fake_headers.append('header({op})data({data})02')
+    _fake_recv(session, [b'\x01\x01\x01\x01\x01\x02'])
+
+    def _fake_handler(pkt, session_):
+        return [(FakeOpCode.OP2, bytes([pkt.num + ord('0')]))]
+
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: _fake_handler})
+
+    session.handle(run=True)
+
+    # Both responses should be sent with a single call.
+    assert session.request.recv_into.call_count == 2
+    session.request.sendmsg.assert_called_once_with([
+        b'header(2)data(1)01',
+        b'1',
+        b'header(2)data(2)02',
+        b'2',
     ])
 
 
 def test_handle_unknown_packet_format(mocker):
     session = FakeSession(mocker)
-    session.read_headers.append((FakeOpCode.OP1, 4))
-    session.request.recv.return_value = b'1234'
+    _fake_recv(session, [b'\x01\x041234'])
 
-    session.server.packet_formats = {}
-    session.server.handlers = {}
+    session.server.routes = router.DispatchTable({}, {})
 
     session.handle(run=True)
 
@@ -104,13 +144,27 @@ def test_handle_unknown_packet_format(mocker):
     ])
 
 
+def test_handle_unregistered_opcode(mocker):
+    session = FakeSession(mocker)
+    _fake_recv(session, [b'\x03\x00\x01\x01\xFF'])
+
+    responses = []
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket},
+                                                 {FakeOpCode.OP1: lambda pkt, s: responses.append(pkt.num) or []})
+    unknown = metrics.counter('session.unknown_opcodes').value
+
+    session.handle(run=True)
+
+    # The unknown packet is skipped, and the session carries on.
+    assert metrics.counter('session.unknown_opcodes').value == unknown + 1
+    assert responses == [255]
+
+
 def test_handle_unhandled_opcode(mocker):
     session = FakeSession(mocker)
-    session.read_headers.append((FakeOpCode.OP1, 4))
-    session.request.recv.return_value = b'1234'
+    _fake_recv(session, [b'\x01\x041234'])
 
-    session.server.packet_formats = {FakeOpCode.OP1: FakePacket}
-    session.server.handlers = {}
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {})
 
     session.handle(run=True)
 
@@ -122,10 +176,9 @@ def test_handle_unhandled_opcode(mocker):
 
 def test_handle_single_response(mocker):
     session = FakeSession(mocker)
-    session.read_headers.append((FakeOpCode.OP1, 1))
-    session.write_headers.append('header({op})data({data})01')
-    session.write_headers.append('header({op})data({data})02')
-    session.request.recv.return_value = b'\xFF'
+    session.fake_headers.append('header({op})data({data})01')
+    session.fake_headers.append('header({op})data({data})02')
+    _fake_recv(session, [b'\x01\x01\xFF'])
 
     def _fake_handler(pkt, session_):
         assert pkt.num == 255
@@ -136,14 +189,15 @@ def test_handle_single_response(mocker):
             (FakeOpCode.OP2, b'resp2'),
         ]
 
-    session.server.packet_formats = {FakeOpCode.OP1: FakePacket}
-    session.server.handlers = {FakeOpCode.OP1: _fake_handler}
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: _fake_handler})
 
     session.handle(run=True)
 
-    session.request.sendall.assert_has_calls([
-        mocker.call(b'header(2)data(resp1)01resp1'),
-        mocker.call(b'header(2)data(resp2)02resp2'),
+    session.request.sendmsg.assert_called_once_with([
+        b'header(2)data(resp1)01',
+        b'resp1',
+        b'header(2)data(resp2)02',
+        b'resp2',
     ])
     session.log.warning.assert_has_calls([
         mocker.call('client disconnect'),
@@ -152,10 +206,9 @@ def test_handle_single_response(mocker):
 
 def test_handle_zero_length_packet(mocker):
     session = FakeSession(mocker)
-    session.read_headers.append((FakeOpCode.OP1, 0))
-    session.write_headers.append('header({op})data({data})01')
-    session.write_headers.append('header({op})data({data})02')
-    session.request.recv.side_effect = Exception('should not be called')
+    session.fake_headers.append('header({op})data({data})01')
+    session.fake_headers.append('header({op})data({data})02')
+    _fake_recv(session, [b'\x01\x00'])
 
     def _fake_handler(pkt, session_):
         assert session == session_
@@ -165,15 +218,175 @@ def test_handle_zero_length_packet(mocker):
             (FakeOpCode.OP2, b'resp2'),
         ]
 
-    session.server.packet_formats = {FakeOpCode.OP1: ZeroLengthPacket}
-    session.server.handlers = {FakeOpCode.OP1: _fake_handler}
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: ZeroLengthPacket}, {FakeOpCode.OP1: _fake_handler})
 
     session.handle(run=True)
 
-    session.request.sendall.assert_has_calls([
-        mocker.call(b'header(2)data(resp1)01resp1'),
-        mocker.call(b'header(2)data(resp2)02resp2'),
+    session.request.sendmsg.assert_called_once_with([
+        b'header(2)data(resp1)01',
+        b'resp1',
+        b'header(2)data(resp2)02',
+        b'resp2',
     ])
     session.log.warning.assert_has_calls([
         mocker.call('client disconnect'),
     ])
+
+
+def test_send_packet_waits_for_flush(mocker):
+    session = FakeSession(mocker)
+    session.fake_headers.append('h{op}')
+
+    session.send_packet(FakeOpCode.OP1, b'data')
+    assert len(session.outbound) == 1
+
+    session.writer.start()
+    session.flush()
+    session.writer.stop()
+
+    session.request.sendmsg.assert_called_once_with([b'h1', b'data'])
+    assert len(session.outbound) == 0
+
+
+def test_send_packet_drops_droppable_above_high_water(mocker):
+    session = FakeSession(mocker)
+    session.outbound.high_water_packets = 1
+    session.fake_headers += ['h1', 'h2', 'h3']
+
+    session.send_packet(FakeOpCode.OP1, b'a', droppable=True)
+    session.send_packet(FakeOpCode.OP1, b'b', droppable=True)
+    session.send_packet(FakeOpCode.OP1, b'c')
+
+    # The dropped packet shouldn't have had a header generated for it.
+    assert len(session.outbound) == 2
+    assert session.fake_headers == ['h3']
+    assert not session.evicted
+
+
+def test_send_packet_evicts_when_full(mocker):
+    session = FakeSession(mocker)
+    session.outbound.max_bytes = 4
+    session.fake_headers += ['h1', 'h2']
+
+    session.send_packet(FakeOpCode.OP1, b'abc')
+    session.send_packet(FakeOpCode.OP1, b'def')
+
+    assert session.evicted
+    assert len(session.outbound) == 0
+    session.request.shutdown.assert_called_once()
+
+    # Further packets are ignored.
+    session.send_packet(FakeOpCode.OP1, b'ghi')
+    assert len(session.outbound) == 0
+
+
+def test_handle_packet_with_dispatcher(mocker):
+    session = FakeSession(mocker)
+    session.dispatcher = mocker.MagicMock()
+    session.dispatcher.submit.side_effect = [True, False]
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: mocker.MagicMock()})
+    route = session.server.routes.get(FakeOpCode.OP1)
+
+    session.handle_packet(FakeOpCode.OP1, memoryview(b'\x01'))
+
+    # The handler is run by the dispatcher, with a copy of the data.
+    session.dispatcher.submit.assert_called_once_with(session, route, b'\x01')
+    assert type(session.dispatcher.submit.call_args[0][2]) is bytes
+    assert route.handler.call_count == 0
+
+    # If the session has too much work queued up, it is disconnected.
+    session.handle_packet(FakeOpCode.OP1, memoryview(b'\x02'))
+    assert session.evicted
+
+
+def test_handle_fixed_layout_packet_with_dispatcher(mocker):
+    session = FakeSession(mocker)
+    session.dispatcher = mocker.MagicMock()
+    fmt = records.FixedLayout.FromStruct('Fake', FakePacket)
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: fmt}, {FakeOpCode.OP1: mocker.MagicMock()})
+    route = session.server.routes.get(FakeOpCode.OP1)
+
+    buffer = bytearray(b'\x07')
+    session.handle_packet(FakeOpCode.OP1, memoryview(buffer))
+
+    # The packet is parsed straight out of the buffer, and the record is queued.
+    pkt = session.dispatcher.submit.call_args[0][2]
+    assert isinstance(pkt, records.Record)
+    buffer[0] = 0
+    assert pkt.num == 7
+
+    # The handler gets the record as it is.
+    session.run_handler(route, pkt)
+    route.handler.assert_called_once_with(pkt, session)
+
+
+def test_handle_generator_handler_flushes_each_response(mocker):
+    session = FakeSession(mocker)
+    session.fake_headers += ['h1', 'h2']
+    session.flush = mocker.MagicMock(side_effect=lambda: flushed.append(len(session.outbound)))
+    flushed = []
+
+    def _fake_handler(pkt, session_):
+        yield FakeOpCode.OP2, b'resp1'
+        # The first response has been queued + flushed before the second is built.
+        assert flushed == [1]
+        yield FakeOpCode.OP2, b'resp2'
+
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: _fake_handler})
+
+    session.handle_packet(FakeOpCode.OP1, memoryview(b'\x01'))
+
+    assert flushed == [1, 2]
+    assert session.outbound.take() == ([b'h1', b'resp1', b'h2', b'resp2'], 2)
+
+
+def test_handle_generator_handler_stops_when_evicted(mocker):
+    session = FakeSession(mocker)
+    session.fake_headers += ['h1']
+    built = []
+
+    def _fake_handler(pkt, session_):
+        for i in range(3):
+            built.append(i)
+            if i == 1:
+                session_.evict('test')
+            yield FakeOpCode.OP2, b'resp'
+
+    session.server.routes = router.DispatchTable({FakeOpCode.OP1: FakePacket}, {FakeOpCode.OP1: _fake_handler})
+
+    session.handle_packet(FakeOpCode.OP1, memoryview(b'\x01'))
+
+    assert built == [0, 1]
+
+
+def test_inline_ops_run_before_the_next_header_is_read(mocker):
+    session = FakeSession(mocker)
+    session.INLINE_OPS = frozenset([FakeOpCode.OP1])
+    session.dispatcher = mocker.MagicMock()
+    session.dispatcher.submit.return_value = True
+
+    # Once OP1 has been handled, op codes in headers are offset by one (like
+    # the WORLD server's header cipher being installed).
+    offset = []
+    session.read_header = lambda buffer: None if len(buffer) < 2 else (buffer[0] + sum(offset), 2, buffer[1])
+    session.framer.read_header = session.read_header
+
+    def _fake_handler(pkt, session_):
+        offset.append(1)
+        return []
+
+    session.server.routes = router.DispatchTable({
+        FakeOpCode.OP1: FakePacket,
+        FakeOpCode.OP2: FakePacket,
+    }, {
+        FakeOpCode.OP1: _fake_handler,
+        FakeOpCode.OP2: _fake_handler,
+    })
+
+    session.framer.feed(b'\x01\x01\x01\x01\x01\x02')
+    session.process_frames()
+
+    # OP1 ran inline; the second packet was read as OP2 and handed to the dispatcher.
+    assert offset == [1]
+    session.dispatcher.submit.assert_called_once()
+    assert session.dispatcher.submit.call_args[0][1].op == FakeOpCode.OP2
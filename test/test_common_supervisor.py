@@ -0,0 +1,80 @@
+import multiprocessing
+import sys
+import time
+
+import pytest
+
+from common import supervisor
+
+
+def _crash():
+    sys.exit(1)
+
+
+def _exit_cleanly():
+    sys.exit(0)
+
+
+def _busy():
+    end = time.time() + 10
+    while time.time() < end:
+        pass
+
+
+def _poll_until(sup, condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        sup.poll(0.05)
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context('fork')
+
+
+def test_supervisor_restarts_crashed_child(context):
+    sup = supervisor.Supervisor([supervisor.Child('crash', _crash)], restart_delay=0, context=context)
+    sup.start()
+    first_pid = sup.pid('crash')
+
+    try:
+        _poll_until(sup, lambda: sup.pid('crash') != first_pid)
+    finally:
+        sup.stop()
+
+
+def test_supervisor_does_not_restart_clean_exit(context):
+    sup = supervisor.Supervisor([supervisor.Child('clean', _exit_cleanly)], restart_delay=0, context=context)
+    sup.start()
+    pid = sup.pid('clean')
+
+    try:
+        sup._processes['clean'].join(timeout=10)
+        sup.poll(0.1)
+        sup.poll(0.1)
+        assert sup.pid('clean') == pid
+    finally:
+        sup.stop()
+
+
+def test_supervisor_reports_cpu_usage(context):
+    sup = supervisor.Supervisor([supervisor.Child('busy', _busy)], report_interval=0.2, context=context)
+    sup.start()
+
+    try:
+        _poll_until(sup, lambda: 'busy' in sup.cpu_percent)
+        assert sup.cpu_percent['busy'] > 10
+    finally:
+        sup.stop()
+
+
+def test_cpu_report_ignores_restarted_process():
+    sup = supervisor.Supervisor([])
+
+    sup._record(supervisor.CpuReport('child', pid=1, cpu_time=1.0, wall_time=100.0))
+    sup._record(supervisor.CpuReport('child', pid=2, cpu_time=0.1, wall_time=101.0))
+    assert 'child' not in sup.cpu_percent
+
+    sup._record(supervisor.CpuReport('child', pid=2, cpu_time=0.6, wall_time=102.0))
+    assert sup.cpu_percent['child'] == pytest.approx(50.0)
@@ -18,64 +18,48 @@ class FakeSession(session.Session):
 
 def test_read_header_short_read(mocker):
     session = FakeSession(mocker)
-    session.request.recv.return_value = b''
 
-    op, size = session.read_header()
-
-    assert op is None
-    assert size == 0
-    assert session.request.recv.mock_calls == [mocker.call(1)]
+    assert session.read_header(memoryview(b'')) is None
 
 
 def test_read_header(mocker):
     session = FakeSession(mocker)
-    session.request.recv.return_value = op_code.Client.REALMLIST.to_bytes(1, 'little')
 
-    op, length = session.read_header()
+    op, header_len, length = session.read_header(memoryview(op_code.Client.REALMLIST.to_bytes(1, 'little')))
 
     assert op == op_code.Client.REALMLIST
+    assert header_len == 1
     assert length == 4
-    assert session.request.recv.mock_calls == [mocker.call(1)]
 
 
-def test_read_header_login_challenge(mocker):
+def test_read_header_unknown_size(mocker):
     session = FakeSession(mocker)
 
-    values = iter([
-        op_code.Client.LOGIN_CHALLENGE.to_bytes(1, 'little'),
-        b'\x00\x01\x00',
-    ])
+    op, header_len, length = session.read_header(
+        memoryview(op_code.Client.RECONNECT_PROOF.to_bytes(1, 'little') + b'abc'))
 
-    def _fake_recv(n):
-        return next(values)
+    assert op == op_code.Client.RECONNECT_PROOF
+    assert header_len == 1
+    assert length == 3
 
-    session.request.recv.side_effect = _fake_recv
 
-    op, length = session.read_header()
+def test_read_header_login_challenge(mocker):
+    session = FakeSession(mocker)
+
+    op, header_len, length = session.read_header(
+        memoryview(op_code.Client.LOGIN_CHALLENGE.to_bytes(1, 'little') + b'\x00\x01\x00'))
 
     assert op == op_code.Client.LOGIN_CHALLENGE
+    assert header_len == 4
     assert length == 1
-    assert session.request.recv.mock_calls == [mocker.call(1), mocker.call(3)]
 
 
-def test_read_header_login_challenge_invalid(mocker):
+def test_read_header_login_challenge_incomplete(mocker):
     session = FakeSession(mocker)
 
-    values = iter([
-        op_code.Client.LOGIN_CHALLENGE.to_bytes(1, 'little'),
-        b'\x00',
-    ])
-
-    def _fake_recv(n):
-        return next(values)
-
-    session.request.recv.side_effect = _fake_recv
-
-    op, length = session.read_header()
+    header = session.read_header(memoryview(op_code.Client.LOGIN_CHALLENGE.to_bytes(1, 'little') + b'\x00'))
 
-    assert op is None
-    assert length == 0
-    assert session.request.recv.mock_calls == [mocker.call(1), mocker.call(3)]
+    assert header is None
 
 
 def test_write_header(mocker):
@@ -0,0 +1,37 @@
+from database import game
+from world_server import op_code
+from world_server.handlers import creature_query as handler
+from world_server.packets import creature_query as packet
+
+
+def test_handle_creature_query(mocker, fake_db):
+    mock_session = mocker.MagicMock()
+
+    unit = game.UnitTemplate.get(Name='Lady Sylvanas Windrunner')
+
+    client_pkt = packet.ClientCreatureQuery.parse(packet.ClientCreatureQuery.build(dict(
+        entry=unit.entry,
+        guid=0,
+    )))
+
+    response_pkts = handler.handle_creature_query(client_pkt, mock_session)
+
+    assert len(response_pkts) == 1
+
+    response_op, response_bytes = response_pkts[0]
+    response_pkt = packet.ServerCreatureQuery.parse(response_bytes)
+    assert response_op == op_code.Server.CREATURE_QUERY_RESPONSE
+    assert response_pkt.entry == unit.entry
+    assert response_pkt.name == 'Lady Sylvanas Windrunner'
+    assert response_pkt.sub_name == 'Banshee Queen'
+    assert response_pkt.display_id == unit.ModelId1.id
+
+
+def test_handle_creature_query_not_found(mocker, fake_db):
+    mock_session = mocker.MagicMock()
+
+    client_pkt = packet.ClientCreatureQuery.parse(packet.ClientCreatureQuery.build(dict(entry=0x7FFFFFFF, guid=0)))
+
+    response_op, response_bytes = handler.handle_creature_query(client_pkt, mock_session)[0]
+    assert response_op == op_code.Server.CREATURE_QUERY_RESPONSE
+    assert packet.ServerCreatureQueryNotFound.parse(response_bytes).entry == 0xFFFFFFFF
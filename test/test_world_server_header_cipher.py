@@ -0,0 +1,86 @@
+import random
+
+from world_server import header_cipher
+
+SESSION_KEY = bytes(random.Random(1).randrange(256) for _ in range(40))
+
+
+def _reference_encode(key: bytes, data: bytes, state: list) -> bytes:
+    """The original per-byte encoding; state is [i, j]."""
+    out = bytearray(data)
+    for i in range(len(out)):
+        state[0] %= len(key)
+        x = (out[i] ^ key[state[0]]) + state[1]
+        state[0] += 1
+        x %= 256
+        out[i] = state[1] = x
+    return bytes(out)
+
+
+def _reference_decode(key: bytes, data: bytes, state: list) -> bytes:
+    """The original per-byte decoding; state is [i, j]."""
+    out = bytearray(data)
+    for i in range(len(out)):
+        state[0] %= len(key)
+        x = (out[i] - state[1]) ^ key[state[0]]
+        state[0] += 1
+        state[1] = out[i]
+        x %= 256
+        out[i] = x
+    return bytes(out)
+
+
+def test_encode_matches_reference():
+    rng = random.Random(2)
+    cipher = header_cipher.HeaderCipher(SESSION_KEY)
+    state = [0, 0]
+
+    # Enough headers to wrap around the key several times.
+    for _ in range(100):
+        header = bytes(rng.randrange(256) for _ in range(4))
+        assert bytes(cipher.encode(bytearray(header))) == _reference_encode(SESSION_KEY, header, state)
+
+
+def test_decode_matches_reference():
+    rng = random.Random(3)
+    cipher = header_cipher.HeaderCipher(SESSION_KEY)
+    state = [0, 0]
+
+    for _ in range(100):
+        header = bytes(rng.randrange(256) for _ in range(6))
+        assert bytes(cipher.decode(bytearray(header))) == _reference_decode(SESSION_KEY, header, state)
+
+
+def test_encode_headers_matches_one_at_a_time():
+    rng = random.Random(4)
+    batch = header_cipher.HeaderCipher(SESSION_KEY)
+    single = header_cipher.HeaderCipher(SESSION_KEY)
+
+    for batch_size in [0, 1, 3, 17, 64]:
+        headers = [bytes(rng.randrange(256) for _ in range(4)) for _ in range(batch_size)]
+        assert batch.encode_headers(headers) == [bytes(single.encode(bytearray(h))) for h in headers]
+
+
+def test_send_and_receive_are_independent():
+    cipher = header_cipher.HeaderCipher(SESSION_KEY)
+    send_state, recv_state = [0, 0], [0, 0]
+
+    assert cipher.encode_headers([b'\x00\x04\x01\x00']) == [
+        _reference_encode(SESSION_KEY, b'\x00\x04\x01\x00', send_state),
+    ]
+    assert bytes(cipher.decode(bytearray(b'abcdef'))) == _reference_decode(SESSION_KEY, b'abcdef', recv_state)
+    assert cipher.encode_headers([b'\x00\x08\x02\x00']) == [
+        _reference_encode(SESSION_KEY, b'\x00\x08\x02\x00', send_state),
+    ]
+
+
+def test_round_trip():
+    sender = header_cipher.HeaderCipher(SESSION_KEY)
+    receiver = header_cipher.HeaderCipher(SESSION_KEY)
+
+    headers = [b'\x00\x06\xee\x01\x00\x00', b'\x00\x0a\xdd\x00\x00\x00']
+    encoded = [bytes(sender.encode(bytearray(h))) for h in headers]
+
+    # Server->client uses the same cipher as client->server, so a receiver can
+    # decode what a sender encoded.
+    assert [bytes(receiver.decode(bytearray(h))) for h in encoded] == headers
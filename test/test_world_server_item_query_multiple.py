@@ -0,0 +1,42 @@
+from database import game
+from world_server import config, op_code
+from world_server.handlers import item_query_multiple as handler
+from world_server.packets import item_query_multiple as packet
+from world_server.systems import query_store
+
+
+def _query(entries):
+    client_pkt = packet.ClientItemQueryMultiple.parse(
+        packet.ClientItemQueryMultiple.build(dict(count=len(entries), entries=entries)))
+    return handler.handle_item_query_multiple(client_pkt, None)
+
+
+def test_handle_item_query_multiple(fake_db):
+    # Unknown and repeated entries are left out.
+    response_pkts = _query([11922, 1, 14156, 11922])
+
+    assert len(response_pkts) == 1
+
+    response_op, response_bytes = response_pkts[0]
+    response_pkt = packet.ServerItemQueryMultiple.parse(response_bytes)
+    assert response_op == op_code.Server.ITEM_QUERY_MULTIPLE_RESPONSE
+    assert [item.entry for item in response_pkt['items']] == [11922, 14156]
+    assert response_bytes[4:] == b''.join(
+        query_store.ItemQueryResponse(game.ItemTemplate[entry], entry) for entry in (11922, 14156))
+
+
+def test_handle_item_query_multiple_none_found(fake_db):
+    response_pkts = _query([1, 2])
+    assert response_pkts == [(op_code.Server.ITEM_QUERY_MULTIPLE_RESPONSE, b'\x00\x00\x00\x00')]
+
+
+def test_handle_item_query_multiple_splits_packets(mocker, fake_db):
+    mocker.patch.object(config, 'MAX_PACKET_SIZE', 600)
+    entries = list(fake_db.select('SELECT entry FROM ItemTemplate LIMIT 10'))
+
+    response_pkts = _query(entries)
+
+    assert len(response_pkts) > 1
+    parsed = [packet.ServerItemQueryMultiple.parse(data) for _, data in response_pkts]
+    assert all(len(data) <= 600 for _, data in response_pkts)
+    assert [item.entry for pkt in parsed for item in pkt['items']] == entries
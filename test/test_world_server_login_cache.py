@@ -0,0 +1,45 @@
+from pony import orm
+
+from database import constants, enums
+from world_server import op_code, system
+
+
+def test_login_cache(mocker):
+    cache = system.Register.Get(system.System.ID.LOGIN_CACHE)
+    cache.invalidate(1)
+    build = mocker.MagicMock(return_value=b'spells')
+
+    assert cache.get(1, op_code.Server.INITIAL_SPELLS, build) == b'spells'
+    assert cache.get(1, op_code.Server.INITIAL_SPELLS, build) == b'spells'
+    assert build.call_count == 1
+
+    cache.invalidate(1, op_code.Server.ACTION_BUTTONS)
+    assert cache.get(1, op_code.Server.INITIAL_SPELLS, build) == b'spells'
+    assert build.call_count == 1
+
+    cache.invalidate(1)
+    assert cache.get(1, op_code.Server.INITIAL_SPELLS, build) == b'spells'
+    assert build.call_count == 2
+
+
+def test_learning_spell_invalidates_login_cache(mocker, fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+    player = fake_db.Player.New(
+        id=10,
+        account=account,
+        realm=realm,
+        name='test',
+        race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+        class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+        gender=enums.Gender.MALE,
+    )
+    orm.flush()
+
+    cache = system.Register.Get(system.System.ID.LOGIN_CACHE)
+    cache.get(player.id, op_code.Server.INITIAL_SPELLS, lambda: b'old')
+
+    fake_db.PlayerSpell(player=player, spell=constants.Spell[1472])
+    orm.flush()
+
+    assert cache.get(player.id, op_code.Server.INITIAL_SPELLS, lambda: b'new') == b'new'
@@ -0,0 +1,66 @@
+from pony import orm
+
+from database import enums, world
+from world_server import op_code, system
+from world_server.handlers import player_login as handler
+from world_server.packets import player_login
+
+
+def test_handle_player_login(mocker, fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+    player = fake_db.Player.New(
+        id=10,
+        account=account,
+        realm=realm,
+        name='test',
+        race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+        class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+        gender=enums.Gender.MALE,
+    )
+    fake_db.commit()
+
+    mock_updater = mocker.MagicMock()
+    mock_updater.login.return_value = [(op_code.Server.UPDATE_OBJECT, b'update')]
+    mock_aura_manager = mocker.MagicMock()
+    mock_aura_manager.login.return_value = [(op_code.Server.UPDATE_AURA_DURATION, b'aura')]
+    mocker.patch.dict(system.Register.SYSTEMS, {
+        system.System.ID.UPDATER: mock_updater,
+        system.System.ID.AURA_MANAGER: mock_aura_manager,
+    })
+
+    pkt = player_login.ClientPlayerLogin.parse(player_login.ClientPlayerLogin.build(dict(guid_low=10, guid_high=0)))
+    mock_session = mocker.MagicMock()
+
+    # The handler is a generator with its own db_session, which Pony won't
+    # run inside the session every test is wrapped in.
+    orm.db_session.__exit__()
+    try:
+        responses = []
+        for op, data in handler.handle_player_login(pkt, mock_session):
+            responses.append((op, data))
+
+            # Nothing is written until the last packet has been sent.
+            with orm.db_session:
+                assert world.Player[10].last_login is None
+
+        with orm.db_session:
+            assert world.Player[10].last_login is not None
+    finally:
+        # Required so post-test doesn't fail.
+        orm.db_session.__enter__()
+
+    assert [op for op, _ in responses] == [
+        op_code.Server.LOGIN_VERIFY_WORLD,
+        op_code.Server.ACCOUNT_DATA_TIMES,
+        op_code.Server.INIT_WORLD_STATES,
+        op_code.Server.TUTORIAL_FLAGS,
+        op_code.Server.INITIAL_SPELLS,
+        op_code.Server.ACTION_BUTTONS,
+        op_code.Server.UPDATE_OBJECT,
+        op_code.Server.UPDATE_AURA_DURATION,
+        op_code.Server.TRIGGER_CINEMATIC,
+    ]
+    assert responses[6][1] == b'update'
+    assert responses[7][1] == b'aura'
+    assert mock_session.player_id == 10
@@ -0,0 +1,128 @@
+import datetime
+
+from pony import orm
+
+from database import enums
+from world_server import system
+from world_server.handlers import guild_query, name_query, pet_name_query
+from world_server.packets import guild_query as guild_query_packet
+from world_server.packets import name_query as name_query_packet
+from world_server.packets import pet_name_query as pet_name_query_packet
+
+
+def _create_player(fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+    return fake_db.Player.New(
+        id=10,
+        account=account,
+        realm=realm,
+        name='test',
+        race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+        class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+        gender=enums.Gender.MALE,
+    )
+
+
+def _name_query(guid):
+    _, response = name_query.handle_name_query(name_query_packet.ClientNameQuery.parse(guid.to_bytes(8, 'little')),
+                                               None)[0]
+    return name_query_packet.ServerNameQuery.parse(response)
+
+
+def test_name_query_is_cached(mocker, fake_db):
+    player = _create_player(fake_db)
+    orm.flush()
+
+    build = mocker.spy(name_query, '_build_response')
+    assert _name_query(player.guid).name == 'test'
+    assert _name_query(player.guid).name == 'test'
+    assert build.call_count == 1
+
+    rates = system.Register.Get(system.System.ID.QUERY_CACHE).hit_rates()
+    assert set(rates) == {'name', 'pet_name', 'guild'}
+    assert rates['name'] > 0
+
+
+def test_name_query_invalidated_on_rename(fake_db):
+    player = _create_player(fake_db)
+    orm.flush()
+    assert _name_query(player.guid).name == 'test'
+
+    player.name = 'renamed'
+    orm.flush()
+    assert _name_query(player.guid).name == 'renamed'
+
+    # Changes to anything else rebuild the same response.
+    player.money = 100
+    orm.flush()
+    assert _name_query(player.guid).name == 'renamed'
+
+
+def test_pet_name_query_invalidated(fake_db):
+    player = _create_player(fake_db)
+    orm.flush()
+
+    def query(pet_id):
+        client_pkt = pet_name_query_packet.ClientPetNameQuery.parse(
+            pet_name_query_packet.ClientPetNameQuery.build(dict(pet_number=7, pet_guid=pet_id)))
+        return pet_name_query.handle_pet_name_query(client_pkt, None)
+
+    assert query(100) == []
+
+    base_unit = fake_db.UnitTemplate.get(Name='Young Nightsaber')
+    pet = fake_db.Pet(
+        id=100,
+        base_unit=base_unit,
+        name='Kiko',
+        level=1,
+        race=fake_db.ChrRaces[1],
+        class_=fake_db.ChrClasses[base_unit.UnitClass],
+        gender=enums.Gender.FEMALE,
+        team=player.team,
+        x=0,
+        y=0,
+        z=0,
+        o=0,
+        summoner=player,
+        created_by=player,
+        base_health=100,
+        base_power=100,
+    )
+    orm.flush()
+
+    _, response = query(100)[0]
+    response_pkt = pet_name_query_packet.ServerPetNameQuery.parse(response)
+    assert response_pkt.number == 7
+    assert response_pkt.name == 'Kiko'
+
+    pet.name = 'Renamed'
+    pet.name_timestamp = datetime.datetime.now()
+    orm.flush()
+    _, response = query(100)[0]
+    assert pet_name_query_packet.ServerPetNameQuery.parse(response).name == 'Renamed'
+
+
+def test_guild_query_invalidated_on_rank_edit(fake_db):
+    guild = fake_db.Guild(name='g', emblem_style=1, emblem_color=1, border_style=1, border_color=1, background_color=1)
+    rank = fake_db.GuildRank(guild=guild, slot=0, name='Leader')
+    orm.flush()
+
+    def query():
+        client_pkt = guild_query_packet.ClientGuildQuery.parse(guild.id.to_bytes(4, 'little'))
+        _, response = guild_query.handle_guild_query(client_pkt, None)[0]
+        return guild_query_packet.ServerGuildQuery.parse(response)
+
+    assert query().rank_names[0] == 'Leader'
+
+    rank.name = 'Boss'
+    orm.flush()
+    assert query().rank_names[0] == 'Boss'
+
+    fake_db.GuildRank(guild=guild, slot=1, name='Member')
+    orm.flush()
+    assert query().rank_names[1] == 'Member'
+
+    guild.name = 'renamed'
+    orm.flush()
+    assert query().name == 'renamed'
@@ -0,0 +1,63 @@
+import pytest
+
+from database import game
+from world_server.systems import query_store
+
+
+@pytest.fixture
+def responses(fake_db):
+    # Building every template takes a while, so only build a few.
+    items = [game.ItemTemplate[entry] for entry in (11922, 14156)]
+    units = [game.UnitTemplate.get(Name='Lady Sylvanas Windrunner')]
+    return [(query_store.QueryKind.ITEM, item.entry, query_store.ItemQueryResponse(item, item.entry))
+            for item in items] + \
+        [(query_store.QueryKind.CREATURE, unit.entry, query_store.CreatureQueryResponse(unit, unit.entry))
+         for unit in units]
+
+
+def test_load_builds_store(mocker, tmp_path, responses):
+    build_all = mocker.patch.object(query_store, '_build_all', return_value=responses)
+
+    store = query_store.QueryStore()
+    store.load(str(tmp_path / 'store'))
+    build_all.assert_called_once_with()
+
+    for kind, entry, response in responses:
+        assert store.get(kind, entry) == response
+
+
+def test_load_reuses_store(mocker, tmp_path, responses):
+    build_all = mocker.patch.object(query_store, '_build_all', return_value=responses)
+
+    query_store.QueryStore().load(str(tmp_path / 'store'))
+    query_store.QueryStore().load(str(tmp_path / 'store'))
+    assert build_all.call_count == 1
+
+    # A change to the static data means the store has to be rebuilt.
+    mocker.patch.object(query_store, 'Fingerprint', return_value=b'\x00' * 20)
+    query_store.QueryStore().load(str(tmp_path / 'store'))
+    assert build_all.call_count == 2
+
+
+def test_get_falls_back_to_database(mocker, tmp_path, responses):
+    mocker.patch.object(query_store, '_build_all', return_value=responses[:1])
+
+    store = query_store.QueryStore()
+    store.load(str(tmp_path / 'store'))
+
+    item = game.ItemTemplate[14156]
+    assert store.item(14156) == query_store.ItemQueryResponse(item, 14156)
+    assert store.item(1) == query_store.ItemQueryResponse(None, 1)
+
+
+def test_get_many(mocker, tmp_path, responses):
+    mocker.patch.object(query_store, '_build_all', return_value=responses[:1])
+
+    store = query_store.QueryStore()
+    store.load(str(tmp_path / 'store'))
+
+    # 11922 is in the store, 14156 has to be looked up, and 1 doesn't exist.
+    assert store.get_many(query_store.QueryKind.ITEM, [14156, 1, 11922, 14156]) == {
+        14156: responses[1][2],
+        11922: responses[0][2],
+    }
@@ -0,0 +1,41 @@
+import pytest
+
+from common import router
+from common import session as common_session
+from world_server import session, system
+
+
+@pytest.fixture
+def world_session():
+    # Skip setup(), which needs a server and a realm.
+    return session.Session.__new__(session.Session)
+
+
+@pytest.fixture
+def mock_updater(mocker):
+    mock_updater = mocker.MagicMock()
+    mocker.patch.dict(system.Register.SYSTEMS, {system.System.ID.UPDATER: mock_updater})
+    return mock_updater
+
+
+ROUTE = router.Route(op=1, name='OP1', packet_format=None, handler=None, kind=router.HandlerKind.MUTATING)
+
+
+def test_run_handler_publishes_changes(mocker, world_session, mock_updater):
+    run_handler = mocker.patch.object(common_session.Session, 'run_handler')
+
+    world_session.run_handler(ROUTE, b'data')
+
+    run_handler.assert_called_once_with(ROUTE, b'data')
+    mock_updater.publish.assert_called_once_with()
+    assert not mock_updater.discard.called
+
+
+def test_run_handler_discards_changes_on_error(mocker, world_session, mock_updater):
+    mocker.patch.object(common_session.Session, 'run_handler', side_effect=RuntimeError('failed'))
+
+    with pytest.raises(RuntimeError):
+        world_session.run_handler(ROUTE, b'data')
+
+    mock_updater.discard.assert_called_once_with()
+    assert not mock_updater.publish.called
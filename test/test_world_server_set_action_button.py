@@ -3,7 +3,7 @@ import sys
 import pytest
 
 from database import enums, world
-from world_server import op_code
+from world_server import op_code, system
 from world_server.handlers import set_action_button as handler
 from world_server.packets import set_action_button as packet
 
@@ -32,8 +32,12 @@ def test_handle_set_action_button_make_new(mocker, fake_db):
 
     assert fake_db.PlayerActionButton.get(player=player, slot=1) is None
 
+    login_cache = system.Register.Get(system.System.ID.LOGIN_CACHE)
+    login_cache.get(player.id, op_code.Server.ACTION_BUTTONS, lambda: b'old')
+
     response_pkts = handler.handle_set_action_button(client_pkt, mock_session)
     assert len(response_pkts) == 0
+    assert login_cache.get(player.id, op_code.Server.ACTION_BUTTONS, lambda: b'new') == b'new'
 
     action_button = fake_db.PlayerActionButton.get(player=player, slot=1)
     assert action_button is not None
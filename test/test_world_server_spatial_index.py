@@ -0,0 +1,126 @@
+from database import enums
+from world_server import config, spatial_index
+from world_server.systems import updater
+
+
+def test_in_range():
+    assert spatial_index.InRange((0, 0.0, 0.0, 0.0), (0, 3.0, 4.0, 0.0), 5.0)
+    assert not spatial_index.InRange((0, 0.0, 0.0, 0.0), (0, 3.0, 4.0, 0.1), 5.0)
+    assert not spatial_index.InRange((0, 0.0, 0.0, 0.0), (1, 0.0, 0.0, 0.0), 5.0)
+
+
+def test_query_finds_objects_across_cells():
+    index = spatial_index.SpatialIndex(cell_size=10.0)
+    index.update('a', (0, 1.0, 1.0, 0.0))
+    index.update('b', (0, -9.0, 1.0, 0.0))
+    index.update('c', (0, 25.0, 1.0, 0.0))
+    index.update('d', (1, 1.0, 1.0, 0.0))
+
+    assert sorted(index.query((0, 0.0, 0.0, 0.0), 15.0)) == ['a', 'b']
+    assert sorted(index.query((0, 10.0, 0.0, 0.0), 20.0)) == ['a', 'b', 'c']
+    assert index.query((1, 0.0, 0.0, 0.0), 15.0) == ['d']
+
+
+def test_update_moves_objects():
+    index = spatial_index.SpatialIndex(cell_size=10.0)
+    index.update('a', (0, 1.0, 1.0, 0.0))
+    index.update('a', (0, 101.0, 1.0, 0.0))
+
+    assert len(index) == 1
+    assert index.position('a') == (0, 101.0, 1.0, 0.0)
+    assert index.query((0, 0.0, 0.0, 0.0), 15.0) == []
+    assert index.query((0, 100.0, 0.0, 0.0), 15.0) == ['a']
+
+
+def test_remove():
+    index = spatial_index.SpatialIndex(cell_size=10.0)
+    index.update('a', (0, 1.0, 1.0, 0.0))
+    index.remove('a')
+    index.remove('b')
+
+    assert 'a' not in index
+    assert index.position('a') is None
+    assert index.query((0, 0.0, 0.0, 0.0), 15.0) == []
+
+
+def test_updater_finds_nearby_players_and_their_items(fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+
+    def new_player(name):
+        return fake_db.Player.New(
+            account=account,
+            realm=realm,
+            name=name,
+            race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+            class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+            gender=enums.Gender.MALE,
+        )
+
+    player = new_player('near')
+    nearby = new_player('nearby')
+    far = new_player('far')
+    far.x += 10000.0
+    fake_db.commit()
+
+    updater_system = updater.Updater()
+    nearby_objects = updater_system._nearby_objects(player, config.MAX_UPDATE_DISTANCE)
+
+    assert player in nearby_objects
+    assert nearby in nearby_objects
+    assert far not in nearby_objects
+    assert set(player.carried_items()) <= set(nearby_objects)
+    assert [o.id for o in nearby_objects] == sorted(o.id for o in nearby_objects)
+
+    # Moving is picked up by the index.
+    far.x -= 10000.0
+    updater_system.track(far)
+    assert far in updater_system._nearby_objects(player, config.MAX_UPDATE_DISTANCE)
+
+    # Deleted objects are dropped from the index.
+    updater_system.untrack(nearby)
+    assert nearby not in updater_system._nearby_objects(player, config.MAX_UPDATE_DISTANCE)
+
+
+def test_updater_finds_units_on_the_players_map(fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+    player = fake_db.Player.New(
+        account=account,
+        realm=realm,
+        name='elf',
+        race=fake_db.ChrRaces[enums.EChrRaces.NIGHT_ELF],
+        class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+        gender=enums.Gender.FEMALE,
+    )
+    assert player.map != 0
+
+    base_unit = fake_db.UnitTemplate.get(Name='Young Nightsaber')
+
+    def new_unit(cls, **kwargs):
+        return cls(
+            base_unit=base_unit,
+            level=1,
+            race=fake_db.ChrRaces[1],
+            class_=fake_db.ChrClasses[base_unit.UnitClass],
+            gender=enums.Gender.FEMALE,
+            team=player.team,
+            x=player.x + 1,
+            y=player.y,
+            z=player.z,
+            o=player.o,
+            base_health=100,
+            base_power=100,
+            **kwargs,
+        )
+
+    # Pets are on their summoner's map; other units are on the map they were spawned on.
+    pet = new_unit(fake_db.Pet, name='Kiko', summoner=player, created_by=player)
+    same_map = new_unit(fake_db.Unit, map=player.map)
+    other_map = new_unit(fake_db.Unit, map=0)
+    fake_db.commit()
+
+    nearby_objects = updater.Updater()._nearby_objects(player, config.MAX_UPDATE_DISTANCE)
+    assert pet in nearby_objects
+    assert same_map in nearby_objects
+    assert other_map not in nearby_objects
@@ -34,8 +34,12 @@ def test_handle_tutorial_flag(mocker, fake_db):
     assert player.tutorials[1] == False
     assert player.tutorial_flags()[0] == 0b00000000
 
+    login_cache = system.Register.Get(system.System.ID.LOGIN_CACHE)
+    login_cache.get(player.id, op_code.Server.TUTORIAL_FLAGS, lambda: b'old')
+
     response_pkts = handler.handle_tutorial_flag(client_pkt, mock_session)
     assert len(response_pkts) == 0
+    assert login_cache.get(player.id, op_code.Server.TUTORIAL_FLAGS, lambda: b'new') == b'new'
 
     player = fake_db.Player.get(id=player.id)
     assert player.tutorials[1] == True
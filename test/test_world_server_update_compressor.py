@@ -0,0 +1,72 @@
+import random
+import zlib
+
+from common import metrics
+from world_server import config, op_code, update_compressor, update_encoder
+
+COMPRESSIBLE = bytes(range(64)) * 16
+
+
+def _incompressible(size: int) -> bytes:
+    rng = random.Random(size)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+
+def test_small_packets_are_not_compressed():
+    compressor = update_compressor.UpdateCompressor(min_size=100)
+    assert compressor.pack(b'\x01' * 100) == (op_code.Server.UPDATE_OBJECT, b'\x01' * 100)
+
+
+def test_large_packets_are_compressed():
+    compressor = update_compressor.UpdateCompressor(min_size=100, min_savings_rate=0)
+    saved = metrics.counter('update_compressor.bytes_saved').snapshot()
+
+    op, packet = compressor.pack(COMPRESSIBLE)
+    assert op == op_code.Server.COMPRESSED_UPDATE_OBJECT
+    assert packet == update_encoder.PackCompressedUpdateObject(len(COMPRESSIBLE), zlib.compress(COMPRESSIBLE))
+    assert zlib.decompress(packet[4:]) == COMPRESSIBLE
+    assert metrics.counter('update_compressor.bytes_saved').snapshot() == saved + len(COMPRESSIBLE) - len(packet)
+
+    # The compressor can be used again.
+    assert compressor.pack(COMPRESSIBLE) == (op, packet)
+
+
+def test_incompressible_packets_are_sent_plain():
+    compressor = update_compressor.UpdateCompressor(min_size=100, min_savings_rate=0)
+
+    payload = _incompressible(1000)
+    assert compressor.pack(payload) == (op_code.Server.UPDATE_OBJECT, payload)
+    assert not compressor.worthwhile()
+
+
+def test_compression_backs_off_then_probes(mocker):
+    compressor = update_compressor.UpdateCompressor(min_size=100, min_savings_rate=0, probe_interval=3)
+    compressor.pack(_incompressible(1000))
+
+    # While compression isn't worthwhile, only one in every few packets is tried.
+    compressor._template = compress = mocker.MagicMock(wraps=compressor._template)
+    for _ in range(3):
+        assert compressor.pack(COMPRESSIBLE)[0] == op_code.Server.UPDATE_OBJECT
+    assert compress.copy.call_count == 0
+
+    assert compressor.pack(COMPRESSIBLE)[0] == op_code.Server.COMPRESSED_UPDATE_OBJECT
+    assert compress.copy.call_count == 1
+
+
+def test_compression_skipped_when_too_slow():
+    compressor = update_compressor.UpdateCompressor(min_size=100, min_savings_rate=float('inf'))
+    compressor.pack(COMPRESSIBLE)
+    assert not compressor.worthwhile()
+
+
+def test_packets_too_large_to_send_are_always_compressed():
+    compressor = update_compressor.UpdateCompressor(min_size=100, min_savings_rate=0, probe_interval=1000)
+    compressor.pack(_incompressible(1000))
+    assert not compressor.worthwhile()
+
+    # Even though compression is backing off and won't save anything, the
+    # packet can't be sent as it is.
+    payload = _incompressible(config.MAX_PACKET_SIZE + 1)
+    op, packet = compressor.pack(payload)
+    assert op == op_code.Server.COMPRESSED_UPDATE_OBJECT
+    assert zlib.decompress(packet[4:]) == payload
@@ -0,0 +1,278 @@
+import enum
+import random
+import zlib
+
+import pytest
+
+from database import enums, world
+from world_server import update_encoder, update_fields
+from world_server.packets import compressed_update_object, update_object
+from world_server.systems import updater
+
+
+class _Color(enum.Enum):
+    RED = 1
+    BLUE = 0xFFFFFFFF
+
+
+def _create_player(fake_db) -> world.Player:
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+    return fake_db.Player.New(
+        id=10,
+        account=account,
+        realm=realm,
+        name='test',
+        race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+        class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+        gender=enums.Gender.MALE,
+    )
+
+
+def _random_guid(rng: random.Random) -> int:
+    # Leave some bytes zero, so the packed GUIDs have gaps.
+    guid = int.from_bytes(bytes(rng.choice([0, rng.randrange(256)]) for _ in range(8)), 'little')
+    return rng.choice([int, world.GUID])(guid)
+
+
+def _random_point(rng: random.Random) -> dict:
+    return dict(x=rng.uniform(-1e4, 1e4), y=rng.uniform(-1e4, 1e4), z=rng.uniform(-1e3, 1e3))
+
+
+def _random_fields(rng: random.Random, num_fields: int) -> dict:
+    fields = {}
+    field = 0
+    while field < num_fields - 1:
+        kind = rng.randrange(8)
+        if kind == 0:
+            fields[field] = world.GUID(_random_guid(rng))
+            field += 1
+        elif kind == 1:
+            fields[field] = rng.randrange(-2**31, 0)
+        elif kind == 2:
+            fields[field] = rng.uniform(-1e6, 1e6)
+        elif kind == 3:
+            fields[field] = bytes(rng.randrange(256) for _ in range(4))
+        elif kind == 4:
+            fields[field] = rng.choice(list(_Color))
+        elif kind == 5:
+            fields[field] = rng.choice(list(enums.TypeID))
+        elif kind == 6:
+            fields[field] = None
+        else:
+            fields[field] = rng.randrange(2**32)
+
+        field += rng.randrange(1, 4)
+
+    return dict(num_fields=num_fields, fields=fields)
+
+
+def _random_spline(rng: random.Random) -> dict:
+    flags = 0
+    for flag in (enums.SplineFlags.Final_Point, enums.SplineFlags.Final_Target, enums.SplineFlags.Final_Angle,
+                 enums.SplineFlags.Runmode):
+        if rng.random() < 0.5:
+            flags |= flag
+
+    points = [_random_point(rng) for _ in range(rng.randrange(4))]
+    return dict(
+        flags=flags,
+        facing=_random_point(rng),
+        target=_random_guid(rng),
+        angle=rng.uniform(-3.14, 3.14),
+        time_passed=rng.randrange(2**32),
+        duration=rng.randrange(2**32),
+        id=rng.randrange(2**32),
+        n_points=len(points),
+        points=points,
+        final_point=_random_point(rng),
+    )
+
+
+def _random_movement(rng: random.Random) -> dict:
+    flags = enums.MovementFlags.NONE
+    for flag in (enums.MovementFlags.ONTRANSPORT, enums.MovementFlags.SWIMMING, enums.MovementFlags.FALLING,
+                 enums.MovementFlags.SPLINE_ELEVATION, enums.MovementFlags.SPLINE_ENABLED,
+                 enums.MovementFlags.FORWARD):
+        if rng.random() < 0.5:
+            flags |= flag
+
+    return dict(
+        flags=flags,
+        time=rng.randrange(2**32),
+        o=rng.uniform(0, 6.28),
+        transport=dict(guid=_random_guid(rng), o=0.5, time=rng.randrange(2**32), **_random_point(rng)),
+        swimming=dict(pitch=rng.uniform(-1, 1)),
+        last_fall_time=rng.randrange(2**32),
+        falling=dict(velocity=1.5, sin_angle=0.25, cos_angle=-0.75, xy_speed=7.0),
+        spline_elevation=dict(unk1=rng.uniform(-10, 10)),
+        speed=dict(walk=2.5, run=7.0, run_backward=4.5, swim=4.722, swim_backward=2.5, turn=3.14159),
+        spline_update=_random_spline(rng),
+        **_random_point(rng),
+    )
+
+
+def _random_full_block(rng: random.Random) -> dict:
+    flags = enums.UpdateFlags.NONE
+    for flag in enums.UpdateFlags:
+        if rng.random() < 0.5:
+            flags |= flag
+
+    if flags & enums.UpdateFlags.LIVING:
+        movement = _random_movement(rng)
+    elif flags & enums.UpdateFlags.HAS_POSITION:
+        movement = dict(o=1.0, **_random_point(rng))
+    else:
+        movement = None
+
+    return dict(
+        update_type=rng.choice([enums.UpdateType.CREATE_OBJECT, enums.UpdateType.CREATE_OBJECT2,
+                                enums.UpdateType.MOVEMENT]),
+        update_block=dict(
+            guid=_random_guid(rng),
+            object_type=rng.choice(list(enums.TypeID)),
+            flags=flags,
+            movement_update=movement,
+            high_guid=rng.randrange(2**32),
+            victim_guid=_random_guid(rng),
+            world_time=rng.randrange(2**32),
+            update_fields=_random_fields(rng, rng.randrange(1, 1500)),
+        ),
+    )
+
+
+def _random_update_object(rng: random.Random) -> dict:
+    blocks = []
+    for _ in range(rng.randrange(1, 6)):
+        kind = rng.randrange(3)
+        if kind == 0:
+            guids = [_random_guid(rng) for _ in range(rng.randrange(5))]
+            blocks.append(
+                dict(update_type=enums.UpdateType.OUT_OF_RANGE_OBJECTS,
+                     update_block=dict(n_guids=len(guids), guids=guids)))
+        elif kind == 1:
+            blocks.append(
+                dict(update_type=enums.UpdateType.VALUES,
+                     update_block=dict(guid=_random_guid(rng), update=_random_fields(rng, rng.randrange(1, 200)))))
+        else:
+            blocks.append(_random_full_block(rng))
+
+    return dict(n_blocks=len(blocks), is_transport=rng.randrange(2), blocks=blocks)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_encode_matches_construct(seed):
+    update_data = _random_update_object(random.Random(seed))
+    assert update_encoder.EncodeUpdateObject(update_data) == update_object.ServerUpdateObject.build(update_data)
+
+
+def test_encode_grows_buffer():
+    rng = random.Random(0)
+    encoder = update_encoder.UpdateObjectEncoder(size_hint=1)
+
+    # Encode a large packet then a small one, to check nothing leaks between them.
+    for update_data in (_random_update_object(rng), _random_update_object(rng)):
+        assert encoder.encode(update_data) == update_object.ServerUpdateObject.build(update_data)
+
+
+def test_encode_rejects_wrong_counts():
+    with pytest.raises(ValueError):
+        update_encoder.EncodeUpdateObject(dict(n_blocks=2, is_transport=0, blocks=[]))
+
+    with pytest.raises(ValueError):
+        update_encoder.EncodeUpdateObject(
+            dict(n_blocks=1,
+                 is_transport=0,
+                 blocks=[dict(update_type=enums.UpdateType.OUT_OF_RANGE_OBJECTS, update_block=dict(n_guids=3,
+                                                                                                   guids=[1]))]))
+
+
+def test_encode_player_create(mocker, fake_db):
+    player = _create_player(fake_db)
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+
+    updater.Updater().login(player, mocker.MagicMock())
+    update_block = next(call[0][0] for call in encode_spy.call_args_list
+                        if call[0][0]['update_block'].get('guid') == player.guid)
+    assert update_block['update_type'] == enums.UpdateType.CREATE_OBJECT
+    assert update_block['update_block']['flags'] & enums.UpdateFlags.SELF
+    assert isinstance(update_block['update_block']['update_fields'], update_fields.MaskedFields)
+
+    # The construct definition needs the fields as a dictionary.
+    update_data = dict(n_blocks=1, is_transport=0, blocks=[update_block])
+    expected = dict(update_block)
+    expected['update_block'] = dict(update_block['update_block'],
+                                    update_fields=dict(num_fields=player.num_fields(), fields=player.update_fields()))
+
+    assert update_encoder.EncodeUpdateObject(update_data) == update_object.ServerUpdateObject.build(
+        dict(n_blocks=1, is_transport=0, blocks=[expected]))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_join_encoded_blocks(seed):
+    update_data = _random_update_object(random.Random(seed))
+    blocks = [update_encoder.EncodeUpdateBlock(block) for block in update_data['blocks']]
+    assert update_encoder.JoinUpdateBlocks(blocks, update_data['is_transport']) == \
+        update_encoder.EncodeUpdateObject(update_data)
+
+
+def test_batch_update_blocks():
+    blocks = [b'a' * 40, b'b' * 40, b'c' * 100, b'd' * 10, b'e' * 10]
+
+    # The UPDATE_OBJECT header takes 5 bytes.
+    assert update_encoder.BatchUpdateBlocks(blocks, 85) == [
+        [b'a' * 40, b'b' * 40],
+        [b'c' * 100],
+        [b'd' * 10, b'e' * 10],
+    ]
+    assert update_encoder.BatchUpdateBlocks(blocks, 1000) == [blocks]
+    assert update_encoder.BatchUpdateBlocks([], 1000) == []
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_encode_masked_fields_matches_dict(seed):
+    rng = random.Random(seed)
+    fields = _random_fields(rng, rng.randrange(1, 1500))
+
+    array = update_fields.UpdateFieldArray(fields['num_fields'])
+    array.update(fields['fields'])
+
+    def _values_block(update):
+        return dict(n_blocks=1,
+                    is_transport=0,
+                    blocks=[dict(update_type=enums.UpdateType.VALUES, update_block=dict(guid=12, update=update))])
+
+    assert update_encoder.EncodeUpdateObject(_values_block(array.all())) == \
+        update_object.ServerUpdateObject.build(_values_block(fields))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_pack_guid_matches_construct(seed):
+    rng = random.Random(seed)
+    guids = [0, 0xFFFFFFFFFFFFFFFF, 0x8000000000000001] + [_random_guid(rng) for _ in range(50)]
+
+    for guid in guids:
+        assert world.PackGUID(guid) == update_object.PackedGUID.build(int(guid))
+        assert world.GUID(guid).packed == world.PackGUID(guid)
+
+    assert world.PackGUIDs(guids) == b''.join(update_object.PackedGUID.build(int(guid)) for guid in guids)
+
+
+def test_guid_is_cached(fake_db):
+    player = _create_player(fake_db)
+
+    guid = player.guid
+    assert guid == (enums.HighGUID.PLAYER << 32) | player.id
+    assert player.guid is guid
+    assert guid.packed is guid.packed
+
+
+def test_compress_matches_construct():
+    update_data = _random_update_object(random.Random(1))
+    payload = update_encoder.EncodeUpdateObject(update_data)
+
+    assert update_encoder.PackCompressedUpdateObject(len(payload), zlib.compress(payload)) == \
+        compressed_update_object.ServerCompressedUpdateObject.build(dict(
+            uncompressed_size=len(payload),
+            data=update_data,
+        ))
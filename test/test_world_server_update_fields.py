@@ -0,0 +1,100 @@
+import struct
+
+import pytest
+
+from database import enums, world
+from world_server import update_encoder, update_fields
+from world_server.systems import updater
+
+
+def test_set_marks_only_changed_fields():
+    fields = update_fields.UpdateFieldArray(64)
+    fields.update({0: world.GUID(0x100000000 | 12), 2: 25, 4: 1.0})
+    assert fields.present == 0b10111
+    assert fields.dirty == 0b10111
+
+    fields.clear_dirty()
+    fields.update({0: world.GUID(0x100000000 | 12), 2: 26, 4: 1.0})
+    assert fields.dirty == 0b00100
+    assert fields.values[2] == 26
+
+
+def test_set_converts_values_to_slots():
+    fields = update_fields.UpdateFieldArray(8)
+    fields.set(0, -1)
+    fields.set(1, 1.5)
+    fields.set(2, b'\x01\x02\x03\x04')
+    fields.set(3, enums.TypeID.PLAYER)
+
+    assert list(fields.values[:4]) == [
+        0xFFFFFFFF,
+        struct.unpack('<I', struct.pack('<f', 1.5))[0],
+        0x04030201,
+        enums.TypeID.PLAYER,
+    ]
+
+
+def test_set_rejects_out_of_range_values():
+    fields = update_fields.UpdateFieldArray(8)
+    with pytest.raises(OverflowError):
+        fields.set(0, 1 << 32)
+
+
+def test_removed_fields_are_not_sent():
+    fields = update_fields.UpdateFieldArray(8)
+    fields.update({0: 1, 1: 2})
+    fields.clear_dirty()
+
+    fields.update({0: 1, 1: None})
+    assert fields.present == 0b01
+    assert fields.changed().mask == 0
+
+    # Giving the field a value again marks it dirty, even if the value is the same.
+    fields.update({0: 1, 1: 2})
+    assert fields.changed().mask == 0b10
+
+
+def test_slots_to_bytes():
+    fields = update_fields.UpdateFieldArray(2)
+    fields.update({0: 1, 1: 0x01020304})
+
+    assert update_fields.SlotsToBytes(fields.values) == b'\x01\x00\x00\x00\x04\x03\x02\x01'
+
+
+def test_updater_sends_only_changed_fields(mocker, fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+    player = fake_db.Player.New(
+        id=10,
+        account=account,
+        realm=realm,
+        name='test',
+        race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+        class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+        gender=enums.Gender.MALE,
+    )
+
+    session = mocker.MagicMock()
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+
+    updater_system = updater.Updater()
+    updater_system.login(player, session)
+    assert encode_spy.call_args_list[0][0][0]['update_type'] == enums.UpdateType.CREATE_OBJECT
+
+    # Nothing has changed, so there is nothing to send.
+    encode_spy.reset_mock()
+    updater_system.update_object(player)
+    updater_system.flush()
+    assert not encode_spy.called
+    assert not session.send_packet.called
+
+    before = player.update_fields()
+    player.scale = 2.0
+    after = player.update_fields()
+
+    updater_system.update_object(player)
+    updater_system.flush()
+    update_block = encode_spy.call_args[0][0]
+    assert update_block['update_type'] == enums.UpdateType.VALUES
+    assert update_block['update_block']['update'].mask == sum(1 << k for k, v in after.items() if before.get(k) != v)
+    assert update_block['update_block']['update'].mask & (1 << enums.ObjectFields.SCALE_X)
@@ -0,0 +1,325 @@
+import threading
+import zlib
+
+import pytest
+from pony import orm
+
+from database import enums, world
+from world_server import config, op_code, update_compressor, update_encoder
+from world_server.systems import updater
+
+
+@pytest.fixture
+def players(fake_db):
+    account = fake_db.Account(name='account', salt_str='11', verifier_str='22', session_key_str='33')
+    realm = fake_db.Realm(name='r1', hostport='r1')
+
+    def new_player(id, name):
+        return fake_db.Player.New(
+            id=id,
+            account=account,
+            realm=realm,
+            name=name,
+            race=fake_db.ChrRaces[enums.EChrRaces.HUMAN],
+            class_=fake_db.ChrClasses[enums.EChrClasses.WARRIOR],
+            gender=enums.Gender.MALE,
+        )
+
+    players = new_player(1000, 'watcher'), new_player(2000, 'mover'), new_player(3000, 'other')
+    fake_db.commit()
+    return players
+
+
+def _sent_update_types(encode_spy):
+    """Get the update types (and out of range GUIDs) of the blocks encoded since the spy was reset."""
+    update_types = []
+    for block in (call[0][0] for call in encode_spy.call_args_list):
+        update_types.append(block['update_type'])
+        if block['update_type'] == enums.UpdateType.OUT_OF_RANGE_OBJECTS:
+            update_types.append(block['update_block']['guids'])
+
+    return update_types
+
+
+def test_objects_are_created_on_enter_and_removed_on_leave(mocker, players):
+    watcher, mover, _ = players
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+
+    updater_system = updater.Updater()
+    updater_system.login(watcher, mocker.MagicMock())
+    assert mover.id in updater_system._update_cache[watcher.id].known_objects
+
+    def move_to(x):
+        encode_spy.reset_mock()
+        mover.x = watcher.x + x
+        updater_system.update_object(mover)
+        updater_system.flush()
+
+    # Between the enter and leave distances: still visible.
+    move_to((config.MAX_UPDATE_DISTANCE + config.UPDATE_LEAVE_DISTANCE) / 2)
+    assert _sent_update_types(encode_spy) == [enums.UpdateType.MOVEMENT]
+
+    # Beyond the leave distance, the object is removed once.
+    move_to(config.UPDATE_LEAVE_DISTANCE + 1)
+    assert _sent_update_types(encode_spy) == [enums.UpdateType.OUT_OF_RANGE_OBJECTS, [mover.guid]]
+    assert mover.id not in updater_system._update_cache[watcher.id].known_objects
+    assert mover.id not in updater_system._update_cache[watcher.id].movement_versions
+
+    move_to(config.UPDATE_LEAVE_DISTANCE + 2)
+    assert not encode_spy.called
+
+    # Between the enter and leave distances: still not visible.
+    move_to((config.MAX_UPDATE_DISTANCE + config.UPDATE_LEAVE_DISTANCE) / 2)
+    assert not encode_spy.called
+
+    move_to(config.MAX_UPDATE_DISTANCE / 2)
+    assert _sent_update_types(encode_spy) == [enums.UpdateType.CREATE_OBJECT]
+
+
+def test_moving_player_sees_objects_enter_and_leave(mocker, players):
+    watcher, mover, _ = players
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+
+    updater_system = updater.Updater()
+    updater_system.login(mover, mocker.MagicMock())
+    watcher_items = {item.id for item in watcher.carried_items()}
+    assert watcher.id in updater_system._update_cache[mover.id].known_objects
+
+    encode_spy.reset_mock()
+    mover.x = watcher.x + config.UPDATE_LEAVE_DISTANCE + 1
+    updater_system.update_object(mover)
+    updater_system.flush()
+
+    update_types = _sent_update_types(encode_spy)
+    assert update_types[0] == enums.UpdateType.MOVEMENT
+    assert update_types[1] == enums.UpdateType.OUT_OF_RANGE_OBJECTS
+    assert watcher.guid in update_types[2]
+    assert not watcher_items & set(updater_system._update_cache[mover.id].known_objects)
+
+    encode_spy.reset_mock()
+    mover.x = watcher.x
+    updater_system.update_object(mover)
+    updater_system.flush()
+
+    update_types = _sent_update_types(encode_spy)
+    assert update_types[0] == enums.UpdateType.MOVEMENT
+    assert update_types[1:] == [enums.UpdateType.CREATE_OBJECT] * (len(update_types) - 1)
+    assert watcher_items <= set(updater_system._update_cache[mover.id].known_objects)
+
+
+def test_updates_are_merged_into_one_packet_per_tick(mocker, players):
+    watcher, mover, _ = players
+    session = mocker.MagicMock()
+
+    updater_system = updater.Updater()
+    updater_system.login(watcher, session)
+
+    # Nothing is sent until the tick.
+    mover.x += 1.0
+    updater_system.update_object(mover)
+    updater_system.update_object(mover)
+    updater_system.update_object(watcher)
+    assert not session.send_packet.called
+
+    updater_system.flush()
+    session.send_packet.assert_called_once()
+
+    # Everything was sent, so the next tick has nothing to do.
+    session.reset_mock()
+    updater_system.flush()
+    assert not session.send_packet.called
+
+
+def test_run_flushes_until_stopped(mocker):
+    updater_system = updater.Updater()
+
+    def flush():
+        if mock_flush.call_count == 3:
+            updater_system.stop()
+
+    mock_flush = mocker.patch.object(updater_system, 'flush', side_effect=flush)
+    mocker.patch.object(updater.config, 'UPDATE_TICK_RATE', 1000)
+    updater_system.run()
+
+    assert mock_flush.call_count == 3
+
+
+def test_updates_are_encoded_once_for_every_observer(mocker, players):
+    watcher, mover, other = players
+    watcher_session, other_session = mocker.MagicMock(), mocker.MagicMock()
+
+    updater_system = updater.Updater()
+    updater_system.login(watcher, watcher_session)
+    updater_system.login(other, other_session)
+
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+    mover.x += 1.0
+    updater_system.update_object(mover)
+    updater_system.flush()
+
+    assert _sent_update_types(encode_spy) == [enums.UpdateType.MOVEMENT]
+    watcher_session.send_packet.assert_called_once()
+    assert watcher_session.send_packet.call_args == other_session.send_packet.call_args
+
+
+def test_updates_too_large_for_one_packet_are_split(mocker, players):
+    watcher, _, _ = players
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+    unsplit = updater.Updater().login(watcher, mocker.MagicMock())
+    assert len(unsplit) == 1
+    blocks = list(encode_spy.spy_return_list)
+
+    # Even compressed (level 0 only stores the data), the blocks don't fit in one packet.
+    max_size = max(len(block) for block in blocks) + 5
+    mocker.patch.object(updater.config, 'MAX_PACKET_SIZE', max_size)
+    updater_system = updater.Updater()
+    updater_system._compressor = update_compressor.UpdateCompressor(level=0)
+    packets = updater_system.login(watcher, mocker.MagicMock())
+
+    assert len(packets) > 1
+    payloads = []
+    for op, packet in packets:
+        assert len(packet) <= max_size
+        if op == op_code.Server.COMPRESSED_UPDATE_OBJECT:
+            packet = zlib.decompress(packet[4:])
+        payloads.append(packet)
+
+    # Every block is sent once, in order.
+    assert b''.join(payload[5:] for payload in payloads) == b''.join(blocks)
+    assert sum(int.from_bytes(payload[:4], 'little') for payload in payloads) == len(blocks)
+
+
+def test_player_update_cache_evicts_least_recently_sent():
+    cache = updater.PlayerUpdateCache(max_bytes=1 << 20)
+    for object_id in range(10):
+        cache.remember(object_id, object_id + 100, 0)
+
+    # Sending an object again makes it the most recently sent.
+    cache.remember(0, 100, 1)
+    assert list(cache.known_objects) == [*range(1, 10), 0]
+    assert list(cache.movement_versions) == [*range(1, 10), 0]
+    assert cache.movement_versions[0] == 1
+    assert cache.evict(keep=0, out_of_view=lambda guid: True) == []
+
+    # Objects out of view are forgotten first.
+    out_of_view = {102, 105}
+    cache.max_bytes = cache.size() - 1
+    assert cache.evict(keep=1, out_of_view=out_of_view.__contains__) == [102]
+    assert 2 not in cache.known_objects
+    assert len(cache) == 9
+
+    # Objects in view are never forgotten, only their movement versions are dropped.
+    cache.max_bytes = 0
+    assert cache.evict(keep=1, out_of_view=out_of_view.__contains__) == [105]
+    assert list(cache.known_objects) == [1, 3, 4, 6, 7, 8, 9, 0]
+    assert list(cache.movement_versions) == [1]
+
+
+def test_player_update_cache_size_shrinks_after_eviction():
+    cache = updater.PlayerUpdateCache(max_bytes=256 * 1024)
+    for object_id in range(3000):
+        cache.remember(object_id, object_id + 10000, 0)
+    assert cache.size() > cache.max_bytes
+
+    cache.evict(keep=0, out_of_view=lambda guid: True)
+    assert cache.size() <= cache.max_bytes
+
+    # Once within budget, sending the objects which are left doesn't evict anything else.
+    for object_id, guid in list(cache.known_objects.items()):
+        cache.remember(object_id, guid, 1)
+    assert cache.evict(keep=0, out_of_view=lambda guid: True) == []
+
+
+def test_updater_keeps_player_caches_within_budget(mocker, players):
+    watcher, mover, _ = players
+    mocker.patch.object(updater.config, 'PLAYER_UPDATE_CACHE_MAX_BYTES', 0)
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+
+    updater_system = updater.Updater()
+    updater_system.login(watcher, mocker.MagicMock())
+    player_cache = updater_system._update_cache[watcher.id]
+
+    # Everything in view stays in view; only cached movement state is dropped.
+    assert enums.UpdateType.OUT_OF_RANGE_OBJECTS not in _sent_update_types(encode_spy)
+    assert mover.id in player_cache.known_objects
+    assert list(player_cache.movement_versions) == [watcher.id]
+    assert updater_system.cache_sizes() == {watcher.id: player_cache.size()}
+
+    # An object in view whose movement state was dropped is sent a movement update, not created again.
+    encode_spy.reset_mock()
+    mover.x = watcher.x + config.MAX_UPDATE_DISTANCE / 2
+    updater_system.update_object(mover)
+    updater_system.flush()
+    assert _sent_update_types(encode_spy) == [enums.UpdateType.MOVEMENT]
+    assert mover.id in player_cache.known_objects
+
+    # Once out of view (but within the leave distance), the object can be removed from view.
+    encode_spy.reset_mock()
+    mover.x = watcher.x + (config.MAX_UPDATE_DISTANCE + config.UPDATE_LEAVE_DISTANCE) / 2
+    updater_system.update_object(mover)
+    updater_system.flush()
+    assert _sent_update_types(encode_spy) == [
+        enums.UpdateType.MOVEMENT,
+        enums.UpdateType.OUT_OF_RANGE_OBJECTS,
+        [mover.guid],
+    ]
+    assert mover.id not in player_cache.known_objects
+
+
+def test_changes_are_only_sent_once_committed(mocker, players):
+    watcher, mover, _ = players
+    session = mocker.MagicMock()
+
+    updater_system = updater.Updater()
+    updater_system.login(watcher, session)
+    encode_spy = mocker.spy(update_encoder, 'EncodeUpdateBlock')
+
+    def flush_on_another_thread():
+        thread = threading.Thread(target=updater_system.flush)
+        thread.start()
+        thread.join()
+
+    # The change has to be committed for the other thread to see it.
+    orm.db_session.__exit__()
+    try:
+        with orm.db_session:
+            moved = world.Player[mover.id]
+            moved.x += 1.0
+            new_x = moved.x
+            updater_system.update_object(moved)
+            orm.flush()
+
+            # The tick can't see the change yet, so it must not send (or forget) it.
+            flush_on_another_thread()
+            assert not session.send_packet.called
+
+        # Nothing is sent until the change is published.
+        flush_on_another_thread()
+        assert not session.send_packet.called
+
+        updater_system.publish()
+        flush_on_another_thread()
+    finally:
+        # Required so post-test doesn't fail.
+        orm.db_session.__enter__()
+
+    session.send_packet.assert_called_once()
+    block = encode_spy.call_args[0][0]
+    assert block['update_type'] == enums.UpdateType.MOVEMENT
+    assert block['update_block']['movement_update']['x'] == new_x
+
+
+def test_discarded_changes_are_not_sent(mocker, players):
+    watcher, mover, _ = players
+    session = mocker.MagicMock()
+
+    updater_system = updater.Updater()
+    updater_system.login(watcher, session)
+
+    mover.x += 1.0
+    updater_system.update_object(mover)
+    updater_system.discard()
+    updater_system.publish()
+    updater_system.flush()
+
+    assert not session.send_packet.called
@@ -7,6 +7,7 @@ def test_wow_server_basic(mocker, fake_db):
     mock_thread = mocker.MagicMock()
     mock_thread_constructor = mocker.patch('threading.Thread', return_value=mock_thread)
     mocker.patch('coloredlogs.install')
+    mock_load_query_store = mocker.patch('world_server.systems.query_store.QueryStore.load')
 
     sys.argv = ['wow_server.py', '--auth_port', '1000', '--world_port', '1001', '--host', 'host']
 
@@ -19,6 +20,28 @@ def test_wow_server_basic(mocker, fake_db):
     assert mock_thread_constructor.call_count > 0
     assert mock_thread.start.call_count == mock_thread_constructor.call_count
     assert mock_thread.start.call_count == mock_thread.join.call_count
+    mock_load_query_store.assert_called_once()
+
+    # Required so post-test doesn't fail.
+    orm.db_session.__enter__()
+
+
+def test_wow_server_processes(mocker, fake_db):
+    mock_supervisor = mocker.patch('common.supervisor.Supervisor')
+    mocker.patch('coloredlogs.install')
+
+    sys.argv = ['wow_server.py', '--processes', '--auth_port', '1000', '--world_port', '1001', '--host', 'host']
+
+    orm.db_session.__exit__()
+
+    import wow_server
+    mocker.patch.object(wow_server, '__name__', '__main__')
+    wow_server.wow_server()
+
+    children = mock_supervisor.call_args[0][0]
+    assert [child.name for child in children] == ['AUTH', 'WORLD']
+    assert [child.target for child in children] == [wow_server.run_auth_server, wow_server.run_world_server]
+    mock_supervisor.return_value.run.assert_called_once_with()
 
     # Required so post-test doesn't fail.
     orm.db_session.__enter__()
@@ -0,0 +1,67 @@
+"""Compare the table-driven HeaderCipher against the original per-byte header encoding.
+
+Usage:
+    python -m util.bench_header_cipher --packets 100 --rounds 2000
+"""
+import argparse
+import os
+import timeit
+from typing import List
+
+from world_server import header_cipher
+
+
+class PerByteCipher(object):
+    """The original per-byte header encoding, which used modular arithmetic for every byte."""
+
+    def __init__(self, session_key: bytes):
+        self.session_key_b = session_key
+        self._send_i = self._send_j = 0
+
+    def encode(self, header: bytearray) -> bytearray:
+        for i in range(len(header)):
+            self._send_i %= len(self.session_key_b)
+            x = (header[i] ^ self.session_key_b[self._send_i]) + self._send_j
+            self._send_i += 1
+            x %= 256
+            header[i] = self._send_j = x
+
+        return header
+
+
+def _make_headers(num_packets: int) -> List[bytes]:
+    return [int(i + 2).to_bytes(2, 'big') + (i & 0x3FF).to_bytes(2, 'little') for i in range(num_packets)]
+
+
+def main(num_packets: int, rounds: int):
+    session_key = os.urandom(40)
+    headers = _make_headers(num_packets)
+
+    # Make sure the two are actually interchangeable before timing them.
+    old, new = PerByteCipher(session_key), header_cipher.HeaderCipher(session_key)
+    assert [bytes(old.encode(bytearray(h))) for h in headers] == new.encode_headers(headers)
+
+    per_byte = PerByteCipher(session_key)
+    single = header_cipher.HeaderCipher(session_key)
+    batch = header_cipher.HeaderCipher(session_key)
+
+    results = {
+        'per-byte': timeit.timeit(lambda: [per_byte.encode(bytearray(h)) for h in headers], number=rounds),
+        'table, one at a time': timeit.timeit(lambda: [single.encode(bytearray(h)) for h in headers], number=rounds),
+        'table, batched': timeit.timeit(lambda: batch.encode_headers(headers), number=rounds),
+    }
+
+    baseline = results['per-byte']
+    print(f'{rounds} rounds of {num_packets} headers:')
+    for name, elapsed in results.items():
+        per_header = elapsed / (rounds * num_packets) * 1e9
+        print(f'  {name:<22} {elapsed:8.3f}s  {per_header:8.1f}ns/header  {baseline / elapsed:5.2f}x')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--packets', type=int, default=100, help='The number of headers in each batch.')
+    arg_parser.add_argument('--rounds', type=int, default=2000, help='The number of batches to encode.')
+
+    args = arg_parser.parse_args()
+    main(args.packets, args.rounds)
@@ -0,0 +1,95 @@
+"""Compare the hand-written UPDATE_OBJECT encoder against the construct definition.
+
+Usage:
+    python -m util.bench_update_object --objects 20 --rounds 500
+"""
+import argparse
+import timeit
+
+from database import enums, world
+from world_server import update_encoder
+from world_server.packets import update_object
+
+# Roughly the number of update fields a player has.
+NUM_FIELDS = 1270
+
+
+def _make_create_block(guid: int) -> dict:
+    """A CREATE_OBJECT block like the ones sent for players."""
+    fields = {0: world.GUID(guid), 2: 0x19, 3: 0, 4: 1.0}
+    for field in range(6, 200, 3):
+        fields[field] = field * 1000
+    for field in range(200, 260):
+        fields[field] = float(field) / 7
+    fields[300] = b'\x01\x02\x03\x04'
+    fields[301] = -5
+
+    return dict(
+        update_type=enums.UpdateType.CREATE_OBJECT,
+        update_block=dict(
+            guid=guid,
+            object_type=enums.TypeID.PLAYER,
+            flags=enums.UpdateFlags.LIVING | enums.UpdateFlags.ALL,
+            movement_update=dict(
+                flags=enums.MovementFlags.NONE,
+                time=0,
+                x=-8949.95,
+                y=-132.493,
+                z=83.5312,
+                o=0.0,
+                transport=None,
+                swimming=None,
+                last_fall_time=0,
+                falling=None,
+                spline_elevation=None,
+                speed=dict(walk=2.5, run=7.0, run_backward=4.5, swim=4.722, swim_backward=2.5, turn=3.14159),
+                spline_update=None,
+            ),
+            high_guid=None,
+            victim_guid=None,
+            world_time=None,
+            update_fields=dict(num_fields=NUM_FIELDS, fields=fields),
+        ),
+    )
+
+
+def _make_values_block(guid: int) -> dict:
+    """A VALUES block like the ones sent when something changes (e.g. health)."""
+    return dict(
+        update_type=enums.UpdateType.VALUES,
+        update_block=dict(guid=guid, update=dict(num_fields=NUM_FIELDS, fields={22: 100, 23: 50})),
+    )
+
+
+def main(num_objects: int, rounds: int):
+    workloads = {
+        'create': [_make_create_block(10 + i) for i in range(num_objects)],
+        'values': [_make_values_block(10 + i) for i in range(num_objects)],
+        'out of range': [
+            dict(
+                update_type=enums.UpdateType.OUT_OF_RANGE_OBJECTS,
+                update_block=dict(n_guids=num_objects, guids=list(range(10, 10 + num_objects))),
+            )
+        ],
+    }
+
+    print(f'{rounds} rounds of {num_objects} objects:')
+    for name, blocks in workloads.items():
+        update_data = dict(n_blocks=len(blocks), is_transport=0, blocks=blocks)
+
+        # Make sure the two are actually interchangeable before timing them.
+        assert update_encoder.EncodeUpdateObject(update_data) == update_object.ServerUpdateObject.build(update_data)
+
+        slow = timeit.timeit(lambda: update_object.ServerUpdateObject.build(update_data), number=rounds)
+        fast = timeit.timeit(lambda: update_encoder.EncodeUpdateObject(update_data), number=rounds)
+        print(f'  {name:<14} construct {slow / rounds * 1e6:9.1f}us  '
+              f'encoder {fast / rounds * 1e6:9.1f}us  {slow / fast:6.2f}x')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--objects', type=int, default=20, help='The number of objects in each packet.')
+    arg_parser.add_argument('--rounds', type=int, default=500, help='The number of packets to encode.')
+
+    args = arg_parser.parse_args()
+    main(args.objects, args.rounds)
@@ -54,7 +54,7 @@ from world_server import op_code, router, session
 from world_server.packets import {op_packet_file}
 
 
-@router.Handler(op_code.Client.{op_name})
+@router.Handler(op_code.Client.{op_name}, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handler(pkt: {op_packet_file}.Client{op_camel_case},
             session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -69,7 +69,7 @@ from world_server import op_code, router, session
 from world_server.packets import {op_packet_file}
 
 
-@router.Handler(op_code.Client.{op_name})
+@router.Handler(op_code.Client.{op_name}, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handler(pkt: {op_packet_file}.Client{op_camel_case},
             session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -0,0 +1,82 @@
+"""Report which packet formats compile, and how much faster the compiled versions are.
+
+Usage:
+    python -m util.packet_compile_report --rounds 2000
+"""
+import argparse
+import inspect
+import logging
+
+import construct
+
+import login_server.packets  # register packet formats
+import world_server.packets  # register packet formats
+from common import packet_compiler
+from login_server import router as login_router
+from world_server import router as world_router
+
+# The size of the zero-filled buffer used to make a sample of each packet.
+SAMPLE_SIZE = 256
+
+
+def _make_sample(fmt: construct.Construct) -> bytes:
+    """Make a sample packet by parsing zeros, then building the result."""
+    return fmt.build(fmt.parse(bytes(SAMPLE_SIZE)))
+
+
+def _report_client_packets(server_name: str, packet_formats: dict, rounds: int):
+    compiler = packet_compiler.PacketCompiler()
+    compiled_formats = compiler.compile_all(packet_formats)
+
+    print(f'{server_name} client packets:')
+    for result, (op, fmt) in zip(compiler.results, packet_formats.items()):
+        if not result.compiled:
+            print(f'  {result.name:<24} interpreted ({result.error})')
+            continue
+
+        status = 'compiled'
+        if result.fixed_layout:
+            status = 'fixed layout (zero-copy)'
+        elif result.interpreted_parts:
+            status += f' ({result.interpreted_parts} parts interpreted)'
+
+        try:
+            parse, build = packet_compiler.MeasureSpeedup(fmt, compiled_formats[op], _make_sample(fmt), rounds)
+            speedup = f'parse {parse:5.2f}x  build {build:5.2f}x'
+        except Exception as e:
+            speedup = f'not measured ({type(e).__name__})'
+
+        print(f'  {result.name:<24} {status:<32} {speedup}')
+
+
+def _report_server_packets(server_name: str, packets_module):
+    # Some packet modules import structs from others, so report each struct
+    # under the module whose name it matches.
+    structs = {}
+    for module_name, module in sorted(inspect.getmembers(packets_module, inspect.ismodule)):
+        camel_case = 'Server' + module_name.title().replace('_', '')
+        for name, value in sorted(vars(module).items()):
+            if name.startswith('Server') and isinstance(value, construct.Construct):
+                if id(value) not in structs or name == camel_case:
+                    structs[id(value)] = f'{module_name}.{name}'
+
+    print(f'{server_name} server packets (build only, so left on the interpreter):')
+    for name in sorted(structs.values()):
+        print(f'  {name}')
+
+
+def main(rounds: int):
+    logging.basicConfig(level=logging.WARNING)
+
+    _report_client_packets('LOGIN', login_router.ClientPacket.ROUTES, rounds)
+    _report_client_packets('WORLD', world_router.ClientPacket.ROUTES, rounds)
+    _report_server_packets('LOGIN', login_server.packets)
+    _report_server_packets('WORLD', world_server.packets)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--rounds', type=int, default=2000, help='The number of times to parse/build each sample.')
+
+    args = arg_parser.parse_args()
+    main(args.rounds)
@@ -2,3 +2,48 @@ MAX_CHARACTERS_PER_ACCOUNT = 1024
 MAX_CHARACTERS_PER_REALM = 10
 MAX_UPDATE_DISTANCE = 100.0
 MAX_UPDATE_OBJECT_PACKET_SIZE = 100  # bytes
+
+# The width of each cell in the spatial index used to find nearby objects.
+SPATIAL_INDEX_CELL_SIZE = MAX_UPDATE_DISTANCE
+
+# Objects come into view within MAX_UPDATE_DISTANCE, but only go out of view
+# beyond UPDATE_LEAVE_DISTANCE, so objects moving along the border aren't
+# repeatedly destroyed and created again.
+UPDATE_LEAVE_DISTANCE = MAX_UPDATE_DISTANCE + 10.0
+
+# How many times a second changed objects are sent to players. Changes made
+# between ticks are merged into one UPDATE_OBJECT per player, so this bounds
+# how late an update can be.
+UPDATE_TICK_RATE = 10
+
+# The memory budget (in bytes) of each player's cache of the objects they can
+# see. Beyond this, objects which are out of view are removed from view, then
+# the cached movement state of the objects updated least recently is dropped.
+PLAYER_UPDATE_CACHE_MAX_BYTES = 256 * 1024
+
+# How UPDATE_OBJECT packets larger than MAX_UPDATE_OBJECT_PACKET_SIZE are
+# compressed. Compression is skipped while it isn't shrinking packets below
+# the maximum ratio, or isn't saving enough bytes for the CPU time it costs.
+UPDATE_OBJECT_COMPRESSION_LEVEL = 6
+UPDATE_OBJECT_MAX_COMPRESSION_RATIO = 0.9
+UPDATE_OBJECT_MIN_COMPRESSION_SAVINGS_RATE = 1024 * 1024  # bytes saved per second
+UPDATE_OBJECT_COMPRESSION_PROBE_INTERVAL = 32  # packets
+
+# Limits on each session's outbound queue. Above the high-water marks, low-value
+# packets (e.g. aura duration refreshes) are dropped. Above the maximums, the
+# client is too far behind and is disconnected.
+OUTBOUND_HIGH_WATER_BYTES = 256 * 1024
+OUTBOUND_HIGH_WATER_PACKETS = 1024
+OUTBOUND_MAX_BYTES = 2 * 1024 * 1024
+OUTBOUND_MAX_PACKETS = 8192
+
+# The largest packet the server can send (the length in the header is 2 bytes,
+# and includes the 2 byte op_code).
+MAX_PACKET_SIZE = 0xFFFF - 2
+
+# How many players' login packets (spells, action buttons, ...) to keep encoded.
+LOGIN_CACHE_MAX_PLAYERS = 1024
+
+# How many encoded NAME_QUERY, PET_NAME_QUERY and GUILD_QUERY responses to keep
+# (for each kind of query).
+QUERY_CACHE_SIZE = 4096
@@ -5,8 +5,10 @@ import world_server.handlers.battlefield_status
 import world_server.handlers.char_create
 import world_server.handlers.char_delete
 import world_server.handlers.char_enum
+import world_server.handlers.creature_query
 import world_server.handlers.gm_get_ticket
 import world_server.handlers.guild_query
+import world_server.handlers.item_query_multiple
 import world_server.handlers.item_query_single
 import world_server.handlers.meetingstone_info
 import world_server.handlers.move_time_skipped
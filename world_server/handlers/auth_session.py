@@ -4,11 +4,11 @@ from pony import orm
 
 from common import srp
 from database import world
-from world_server import op_code, router, session
+from world_server import header_cipher, op_code, router, session
 from world_server.packets import auth_response, auth_session
 
 
-@router.Handler(op_code.Client.AUTH_SESSION)
+@router.Handler(op_code.Client.AUTH_SESSION, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_auth_session(pkt: auth_session.ClientAuthSession,
                         session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -25,6 +25,9 @@ def handle_auth_session(pkt: auth_session.ClientAuthSession,
     session.session_key = account.session_key
     session.session_key_b = session.session_key.to_bytes(40, 'little')
 
+    # From here on, all headers are encrypted.
+    session.header_cipher = header_cipher.HeaderCipher(session.session_key_b)
+
     # Validate the client proof.
     proof = srp.CalculateAuthSessionProof(
         pkt.account_name,
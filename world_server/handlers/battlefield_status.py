@@ -1,13 +1,10 @@
 from typing import List, Tuple
 
-from pony import orm
-
 from world_server import op_code, router, session
 from world_server.packets import battlefield_status
 
 
-@router.Handler(op_code.Client.BATTLEFIELD_STATUS)
-@orm.db_session
+@router.Handler(op_code.Client.BATTLEFIELD_STATUS, kind=router.HandlerKind.NO_DB)
 def handler(pkt: battlefield_status.ClientBattlefieldStatus,
             session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     return [
@@ -36,7 +36,7 @@ class ResponseCode(enum.IntEnum):
     SUCCESS = 0x2E
 
 
-@router.Handler(op_code.Client.CHAR_CREATE)
+@router.Handler(op_code.Client.CHAR_CREATE, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_char_create(pkt: char_create.ClientCharCreate,
                        session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -5,7 +5,7 @@ from pony import orm
 
 from common import srp
 from database import world
-from world_server import op_code, router, session
+from world_server import op_code, router, session, system
 from world_server.packets import char_delete
 
 
@@ -16,7 +16,7 @@ class ResponseCode(enum.IntEnum):
     SUCCESS = 0x39
 
 
-@router.Handler(op_code.Client.CHAR_DELETE)
+@router.Handler(op_code.Client.CHAR_DELETE, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_char_delete(pkt: char_delete.ClientCharDelete,
                        session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -31,6 +31,8 @@ def handle_char_delete(pkt: char_delete.ClientCharDelete,
             char_delete.ServerCharDelete.build(dict(error=ResponseCode.FAILED)),
         )]
 
+    # The ID may be reused by a new character.
+    system.Register.Get(system.System.ID.LOGIN_CACHE).invalidate(to_delete.id)
     to_delete.delete()
 
     return [(
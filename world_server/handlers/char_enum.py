@@ -8,7 +8,7 @@ from world_server import op_code, router, session
 from world_server.packets import char_enum
 
 
-@router.Handler(op_code.Client.CHAR_ENUM)
+@router.Handler(op_code.Client.CHAR_ENUM, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_char_enum(pkt: char_enum.ClientCharEnum, session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     account = world.Account[session.account_name]
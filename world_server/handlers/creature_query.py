@@ -0,0 +1,12 @@
+from typing import List, Tuple
+
+from world_server import op_code, router, session, system
+from world_server.packets import creature_query
+from world_server.systems import query_store
+
+
+@router.Handler(op_code.Client.CREATURE_QUERY, kind=router.HandlerKind.NO_DB)
+def handle_creature_query(pkt: creature_query.ClientCreatureQuery,
+                          session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
+    store: query_store.QueryStore = system.Register.Get(system.System.ID.QUERY_STORE)
+    return [(op_code.Server.CREATURE_QUERY_RESPONSE, store.creature(pkt.entry))]
@@ -3,34 +3,40 @@ from typing import List, Tuple
 from pony import orm
 
 from database import enums, world
-from world_server import op_code, router, session
+from world_server import op_code, router, session, system
 from world_server.packets import guild_command_result, guild_query
+from world_server.systems import query_cache
 
 
-@router.Handler(op_code.Client.GUILD_QUERY)
+def _build_response(guild_id: int) -> bytes:
+    guild = world.Guild[guild_id]
+
+    rank_names = []
+    for _, rank in sorted(guild.get_ranks().items()):
+        rank_names.append(rank.name if rank else '')
+
+    return guild_query.ServerGuildQuery.build(
+        dict(
+            id=guild.id,
+            name=guild.name,
+            rank_names=rank_names,
+            emblem_style=guild.emblem_style,
+            emblem_color=guild.emblem_color,
+            border_style=guild.border_style,
+            border_color=guild.border_color,
+            background_color=guild.background_color,
+        ))
+
+
+@router.Handler(op_code.Client.GUILD_QUERY, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_guild_query(pkt: guild_query.ClientGuildQuery,
                        session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
+    cache: query_cache.QueryCache = system.Register.Get(system.System.ID.QUERY_CACHE)
     try:
-        guild = world.Guild[pkt.id]
-
-        rank_names = []
-        for _, rank in sorted(guild.get_ranks().items()):
-            rank_names.append(rank.name if rank else '')
-
         return [(
             op_code.Server.GUILD_QUERY_RESPONSE,
-            guild_query.ServerGuildQuery.build(
-                dict(
-                    id=guild.id,
-                    name=guild.name,
-                    rank_names=rank_names,
-                    emblem_style=guild.emblem_style,
-                    emblem_color=guild.emblem_color,
-                    border_style=guild.border_style,
-                    border_color=guild.border_color,
-                    background_color=guild.background_color,
-                )),
+            cache.get(query_cache.CachedQuery.GUILD, pkt.id, lambda: _build_response(pkt.id)),
         )]
     except orm.ObjectNotFound:
         return [(
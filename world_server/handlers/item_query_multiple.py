@@ -0,0 +1,33 @@
+from typing import List, Tuple
+
+from world_server import config, op_code, router, session, system
+from world_server.packets import item_query_multiple
+from world_server.systems import query_store
+
+
+def _make_packet(responses: List[bytes]) -> Tuple[op_code.Server, bytes]:
+    return (op_code.Server.ITEM_QUERY_MULTIPLE_RESPONSE, len(responses).to_bytes(4, 'little') + b''.join(responses))
+
+
+@router.Handler(op_code.Client.ITEM_QUERY_MULTIPLE, kind=router.HandlerKind.NO_DB)
+def handle_item_query_multiple(pkt: item_query_multiple.ClientItemQueryMultiple,
+                               session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
+    store: query_store.QueryStore = system.Register.Get(system.System.ID.QUERY_STORE)
+    responses = store.get_many(query_store.QueryKind.ITEM, pkt.entries)
+
+    # Items which don't exist are left out. Split the rest into as few packets as possible.
+    packets = []
+    batch: List[bytes] = []
+    batch_size = 4
+    for response in responses.values():
+        if batch and batch_size + len(response) > config.MAX_PACKET_SIZE:
+            packets.append(_make_packet(batch))
+            batch, batch_size = [], 4
+
+        batch.append(response)
+        batch_size += len(response)
+
+    if batch or not packets:
+        packets.append(_make_packet(batch))
+
+    return packets
@@ -1,14 +1,11 @@
 from typing import List, Tuple
 
-from pony import orm
-
 from database import enums
 from world_server import op_code, router, session
 from world_server.packets import meetingstone_info, meetingstone_setqueue
 
 
-@router.Handler(op_code.Client.MEETINGSTONE_INFO)
-@orm.db_session
+@router.Handler(op_code.Client.MEETINGSTONE_INFO, kind=router.HandlerKind.NO_DB)
 def handle_meetingstone_info(pkt: meetingstone_info.ClientMeetingstoneInfo,
                              session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     # NOTE: Not implementing meeting stones; there will be other
@@ -3,24 +3,29 @@ from typing import List, Tuple
 from pony import orm
 
 from database import world
-from world_server import op_code, router, session
+from world_server import op_code, router, session, system
 from world_server.packets import name_query
+from world_server.systems import query_cache
 
 
-@router.Handler(op_code.Client.NAME_QUERY)
+def _build_response(guid: int) -> bytes:
+    player = world.Player[guid]
+    return name_query.ServerNameQuery.build(
+        dict(
+            guid=player.guid,
+            name=player.name,
+            realm_name=player.realm.name,
+            race=player.race.id,
+            gender=player.gender,
+            class_=player.class_.id,
+        ))
+
+
+@router.Handler(op_code.Client.NAME_QUERY, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_name_query(pkt: name_query.ClientNameQuery, session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
-    player = world.Player[pkt.guid]
-
+    cache: query_cache.QueryCache = system.Register.Get(system.System.ID.QUERY_CACHE)
     return [(
         op_code.Server.NAME_QUERY_RESPONSE,
-        name_query.ServerNameQuery.build(
-            dict(
-                guid=player.guid,
-                name=player.name,
-                realm_name=player.realm.name,
-                race=player.race.id,
-                gender=player.gender,
-                class_=player.class_.id,
-            )),
+        cache.get(query_cache.CachedQuery.NAME, pkt.guid, lambda: _build_response(pkt.guid)),
     )]
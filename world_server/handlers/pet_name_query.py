@@ -3,24 +3,34 @@ from typing import List, Tuple
 from pony import orm
 
 from database import world
-from world_server import op_code, router, session
+from world_server import op_code, router, session, system
 from world_server.packets import pet_name_query
+from world_server.systems import query_cache
 
 
-@router.Handler(op_code.Client.PET_NAME_QUERY)
+def _build_response(pet_id: int) -> bytes:
+    pet = world.Pet.get(id=pet_id)
+    if not pet:
+        return b''
+
+    # The pet number is echoed back from the query, so it isn't cached.
+    return pet_name_query.ServerPetNameQuery.build(
+        dict(
+            number=0,
+            name=pet.name,
+            name_timestamp=int(pet.name_timestamp.timestamp()),
+        ))[4:]
+
+
+@router.Handler(op_code.Client.PET_NAME_QUERY, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_pet_name_query(pkt: pet_name_query.ClientPetNameQuery,
                           session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
-    pet = world.Pet.get(id=world.GUID(pkt.pet_guid).low)
-    if not pet:
+    pet_id = world.GUID(pkt.pet_guid).low
+    cache: query_cache.QueryCache = system.Register.Get(system.System.ID.QUERY_CACHE)
+
+    response = cache.get(query_cache.CachedQuery.PET_NAME, pet_id, lambda: _build_response(pet_id))
+    if not response:
         return []
 
-    return [(
-        op_code.Server.PET_NAME_QUERY,
-        pet_name_query.ServerPetNameQuery.build(
-            dict(
-                number=pkt.pet_number,
-                name=pet.name,
-                name_timestamp=int(pet.name_timestamp.timestamp()),
-            )),
-    )]
+    return [(op_code.Server.PET_NAME_QUERY, pkt.pet_number.to_bytes(4, 'little') + response)]
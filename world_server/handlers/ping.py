@@ -1,13 +1,10 @@
 from typing import List, Tuple
 
-from pony import orm
-
 from world_server import op_code, router, session
 from world_server.packets import ping, pong
 
 
-@router.Handler(op_code.Client.PING)
-@orm.db_session
+@router.Handler(op_code.Client.PING, kind=router.HandlerKind.NO_DB)
 def handle_ping(pkt: ping.ClientPing, session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     return [(
         op_code.Server.PONG,
@@ -1,6 +1,7 @@
 import datetime
 import enum
-from typing import List, Tuple
+import functools
+from typing import Iterator, Tuple
 
 from pony import orm
 
@@ -9,6 +10,7 @@ from world_server import op_code, router, session, system
 from world_server.packets import (account_data_times, action_buttons, init_world_states, initial_spells,
                                   login_verify_world, player_login, set_action_button, trigger_cinematic,
                                   tutorial_flags, update_aura_duration)
+from world_server.systems import login_cache as login_cache_lib
 
 
 class ResponseCode(enum.IntEnum):
@@ -18,33 +20,41 @@ class ResponseCode(enum.IntEnum):
     SUCCESS = 0x39
 
 
-@router.Handler(op_code.Client.PLAYER_LOGIN)
-@orm.db_session
-def handle_player_login(pkt: player_login.ClientPlayerLogin,
-                        session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
-    player = world.Player[pkt.guid_low]
-    session.player_id = player.id
+# There is no account data yet, so this is the same for everyone.
+_ACCOUNT_DATA_TIMES = account_data_times.ServerAccountDataTimes.build(dict(data_times=[0] * 32))
 
-    # If this is the first time the player has logged in, send the
-    # appropriate cinematic.
-    is_first_login = player.last_login is None
-    player.last_login = datetime.datetime.utcnow()
 
-    # Build up the INITIAL_SPELLS packet.
-    initial_spells_pkt = initial_spells.ServerInitialSpells.build(
+@functools.lru_cache(maxsize=None)
+def _init_world_states(map: int, zone: int) -> bytes:
+    return init_world_states.ServerInitWorldStates.build(dict(
+        map=map,
+        zone=zone,
+        blocks=[],
+    ))
+
+
+def _tutorial_flags(player: world.Player) -> bytes:
+    return tutorial_flags.ServerTutorialFlags.build(dict(tutorials=player.tutorial_flags()))
+
+
+def _initial_spells(player: world.Player) -> bytes:
+    spells = [ps.spell for ps in player.spells]
+    return initial_spells.ServerInitialSpells.build(
         dict(
-            spells=[dict(id=ps.spell.id) for ps in player.spells],
+            spells=[dict(id=spell.id) for spell in spells],
             spell_cooldowns=[
                 dict(
-                    id=ps.spell.id,
+                    id=spell.id,
                     cast_item_id=0,
-                    category=ps.spell.category,
-                    cooldown=ps.spell.recovery_time,
-                    category_cooldown=ps.spell.category_recovery_time,
-                ) for ps in player.spells
+                    category=spell.category,
+                    cooldown=spell.recovery_time,
+                    category_cooldown=spell.category_recovery_time,
+                ) for spell in spells
             ],
         ))
 
+
+def _action_buttons(player: world.Player) -> bytes:
     actions = [dict(action=0, type=0)] * 120
     for pa in player.action_buttons:
         actions[pa.slot] = dict(
@@ -52,67 +62,58 @@ def handle_player_login(pkt: player_login.ClientPlayerLogin,
             type=pa.type,
         )
 
-    action_buttons_pkt = action_buttons.ServerActionButtons.build(dict(actions=actions))
+    return action_buttons.ServerActionButtons.build(dict(actions=actions))
+
+
+@router.Handler(op_code.Client.PLAYER_LOGIN, kind=router.HandlerKind.MUTATING)
+@orm.db_session
+def handle_player_login(pkt: player_login.ClientPlayerLogin,
+                        session: session.Session) -> Iterator[Tuple[op_code.Server, bytes]]:
+    player = world.Player[pkt.guid_low]
+    session.player_id = player.id
+
+    # If this is the first time the player has logged in, send the
+    # appropriate cinematic.
+    is_first_login = player.last_login is None
+
+    # Packets are sent as soon as they are yielded, so send the cheap ones
+    # first and let the client start loading the world.
+    yield (
+        op_code.Server.LOGIN_VERIFY_WORLD,
+        login_verify_world.ServerLoginVerifyWorld.build(dict(
+            map=player.map,
+            x=player.x,
+            y=player.y,
+            z=player.z,
+            o=player.o,
+        )),
+    )
+
+    yield (op_code.Server.ACCOUNT_DATA_TIMES, _ACCOUNT_DATA_TIMES)
+    yield (op_code.Server.INIT_WORLD_STATES, _init_world_states(player.map, player.zone))
+
+    # These only change when the player does something, so are cached between logins.
+    login_cache: login_cache_lib.LoginCache = system.Register.Get(system.System.ID.LOGIN_CACHE)
+    for op, build in (
+        (op_code.Server.TUTORIAL_FLAGS, _tutorial_flags),
+        (op_code.Server.INITIAL_SPELLS, _initial_spells),
+        (op_code.Server.ACTION_BUTTONS, _action_buttons),
+    ):
+        yield (op, login_cache.get(player.id, op, lambda: build(player)))
 
     # Add the player to the map.
-    update_op, update_pkt = system.Register.Get(system.System.ID.UPDATER).login(player, session)
+    yield from system.Register.Get(system.System.ID.UPDATER).login(player, session)
 
     # Send information about the player's auras.
-    aura_packets = system.Register.Get(system.System.ID.AURA_MANAGER).login(player, session)
-
-    # Make a list of return packets.
-    import time
-    packets = [
-        (
-            op_code.Server.LOGIN_VERIFY_WORLD,
-            login_verify_world.ServerLoginVerifyWorld.build(
-                dict(
-                    map=player.map,
-                    x=player.x,
-                    y=player.y,
-                    z=player.z,
-                    o=player.o,
-                )),
-        ),
-        (
-            op_code.Server.ACCOUNT_DATA_TIMES,
-            account_data_times.ServerAccountDataTimes.build(dict(data_times=[0] * 32)),
-        ),
-        (
-            op_code.Server.INIT_WORLD_STATES,
-            init_world_states.ServerInitWorldStates.build(dict(
-                map=player.map,
-                zone=player.zone,
-                blocks=[],
-            )),
-        ),
-        (
-            op_code.Server.TUTORIAL_FLAGS,
-            tutorial_flags.ServerTutorialFlags.build(dict(tutorials=player.tutorial_flags())),
-        ),
-        (
-            op_code.Server.INITIAL_SPELLS,
-            initial_spells_pkt,
-        ),
-        (
-            op_code.Server.ACTION_BUTTONS,
-            action_buttons_pkt,
-        ),
-        (
-            update_op,
-            update_pkt,
-        ),
-    ]
-
-    packets += aura_packets
+    yield from system.Register.Get(system.System.ID.AURA_MANAGER).login(player, session)
 
     # Trigger a cinematic if this is their first login.
-    if is_first_login:
-        cinematic = player.race.cinematic_sequence_id
-        packets.append((
+    cinematic = player.race.cinematic_sequence
+    if is_first_login and cinematic:
+        yield (
             op_code.Server.TRIGGER_CINEMATIC,
-            trigger_cinematic.ServerTriggerCinematic.build(dict(sequence_id=cinematic)),
-        ))
+            trigger_cinematic.ServerTriggerCinematic.build(dict(sequence_id=cinematic.id)),
+        )
 
     # TODO: send bindpoint update
     # TODO: send friend list
@@ -121,5 +122,6 @@ def handle_player_login(pkt: player_login.ClientPlayerLogin,
     # TODO: send enchantment durations
     # TODO: send item durations
 
-    # Send some initial setup packets.
-    return packets
+    # The database can only be changed after the last packet has been yielded
+    # (the changes are committed when the generator finishes).
+    player.last_login = datetime.datetime.utcnow()
@@ -7,7 +7,7 @@ from world_server import op_code, router, session
 from world_server.packets import query_next_mail_time
 
 
-@router.Handler(op_code.Client.QUERY_NEXT_MAIL_TIME)
+@router.Handler(op_code.Client.QUERY_NEXT_MAIL_TIME, kind=router.HandlerKind.READ_ONLY)
 @orm.db_session
 def handle_query_next_mail_time(pkt: query_next_mail_time.ClientQueryNextMailTime,
                                 session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
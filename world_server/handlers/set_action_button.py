@@ -3,11 +3,11 @@ from typing import List, Tuple
 from pony import orm
 
 from database import world
-from world_server import op_code, router, session
+from world_server import op_code, router, session, system
 from world_server.packets import set_action_button
 
 
-@router.Handler(op_code.Client.SET_ACTION_BUTTON)
+@router.Handler(op_code.Client.SET_ACTION_BUTTON, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_set_action_button(pkt: set_action_button.ClientSetActionButton,
                              session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -24,4 +24,5 @@ def handle_set_action_button(pkt: set_action_button.ClientSetActionButton,
             type=pkt.type,
         )
 
+    system.Register.Get(system.System.ID.LOGIN_CACHE).invalidate(player.id, op_code.Server.ACTION_BUTTONS)
     return []
@@ -7,7 +7,7 @@ from world_server import op_code, router, session
 from world_server.packets import stand_state_change
 
 
-@router.Handler(op_code.Client.STAND_STATE_CHANGE)
+@router.Handler(op_code.Client.STAND_STATE_CHANGE, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_stand_state_change(pkt: stand_state_change.ClientStandStateChange,
                               session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -11,7 +11,7 @@ from world_server.packets import inventory_change_failure, swap_inv_item
 # keyring, ...).
 
 
-@router.Handler(op_code.Client.SWAP_INV_ITEM)
+@router.Handler(op_code.Client.SWAP_INV_ITEM, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_swap_inv_item(pkt: swap_inv_item.ClientSwapInvItem,
                          session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
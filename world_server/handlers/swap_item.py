@@ -7,7 +7,7 @@ from world_server import op_code, router, session
 from world_server.packets import inventory_change_failure, swap_item
 
 
-@router.Handler(op_code.Client.SWAP_ITEM)
+@router.Handler(op_code.Client.SWAP_ITEM, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_swap_item(pkt: swap_item.ClientSwapItem, session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     player = world.Player[session.player_id]
@@ -3,14 +3,15 @@ from typing import List, Tuple
 from pony import orm
 
 from database import world
-from world_server import op_code, router, session
+from world_server import op_code, router, session, system
 from world_server.packets import tutorial_flag
 
 
-@router.Handler(op_code.Client.TUTORIAL_FLAG)
+@router.Handler(op_code.Client.TUTORIAL_FLAG, kind=router.HandlerKind.MUTATING)
 @orm.db_session
 def handle_tutorial_flag(pkt: tutorial_flag.ClientTutorialFlag,
                          session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     player = world.Player[session.player_id]
     player.tutorials[pkt.flag] = True
+    system.Register.Get(system.System.ID.LOGIN_CACHE).invalidate(player.id, op_code.Server.TUTORIAL_FLAGS)
     return []
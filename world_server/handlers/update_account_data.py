@@ -1,13 +1,10 @@
 from typing import List, Tuple
 
-from pony import orm
-
 from world_server import op_code, router, session
 from world_server.packets import update_account_data
 
 
-@router.Handler(op_code.Client.UPDATE_ACCOUNT_DATA)
-@orm.db_session
+@router.Handler(op_code.Client.UPDATE_ACCOUNT_DATA, kind=router.HandlerKind.NO_DB)
 def handle_update_account_data(pkt: update_account_data.ClientUpdateAccountData,
                                session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
     # Non-implemented packet.
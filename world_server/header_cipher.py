@@ -0,0 +1,110 @@
+"""The stream cipher used on WORLD packet headers once a client has authenticated.
+
+Each header byte is combined with the next byte of the session key (cycling
+through the key) and the previous encrypted byte:
+
+    encrypt: c = ((p ^ key[i]) + c_prev) % 256
+    decrypt: p = ((c - c_prev) % 256) ^ key[i]
+
+The XOR, add and subtract steps are all done with precomputed lookup tables,
+so no arithmetic is done per byte.
+"""
+from typing import List, Sequence
+
+# _XOR[k][b] == b ^ k
+_XOR = [bytes(b ^ k for b in range(256)) for k in range(256)]
+
+# _ADD[j][b] == (b + j) % 256
+_ADD = [bytes((b + j) % 256 for b in range(256)) for j in range(256)]
+
+# _SUB[j][b] == (b - j) % 256
+_SUB = [bytes((b - j) % 256 for b in range(256)) for j in range(256)]
+
+
+class HeaderCipher(object):
+    """Encrypts outgoing, and decrypts incoming, WORLD packet headers.
+
+    The key schedule is computed once, when the cipher is created. The send and
+    receive directions each keep their own position in the key stream, so
+    headers must be encoded in the same order they are sent (and decoded in the
+    same order they are received).
+    """
+
+    def __init__(self, session_key: bytes):
+        """Create a new cipher.
+
+        Args:
+            session_key: The session key bytes (from SRP) to use.
+        """
+        # The XOR table to use for each position in the key.
+        self._schedule = [_XOR[k] for k in session_key]
+
+        self._send_i = self._send_j = 0
+        self._recv_i = self._recv_j = 0
+
+    def encode(self, data: bytearray) -> bytearray:
+        """Encrypt some header bytes in place.
+
+        Args:
+            data: The bytes to encrypt.
+
+        Returns:
+            `data`, encrypted.
+        """
+        schedule = self._schedule
+        n = len(schedule)
+        i, j = self._send_i, self._send_j
+
+        for pos in range(len(data)):
+            j = _ADD[j][schedule[i][data[pos]]]
+            data[pos] = j
+            i += 1
+            if i == n:
+                i = 0
+
+        self._send_i, self._send_j = i, j
+        return data
+
+    def decode(self, data: bytearray) -> bytearray:
+        """Decrypt some header bytes in place.
+
+        Args:
+            data: The bytes to decrypt.
+
+        Returns:
+            `data`, decrypted.
+        """
+        schedule = self._schedule
+        n = len(schedule)
+        i, j = self._recv_i, self._recv_j
+
+        for pos in range(len(data)):
+            c = data[pos]
+            data[pos] = schedule[i][_SUB[j][c]]
+            j = c
+            i += 1
+            if i == n:
+                i = 0
+
+        self._recv_i, self._recv_j = i, j
+        return data
+
+    def encode_headers(self, headers: Sequence[bytes]) -> List[bytes]:
+        """Encrypt a batch of headers with a single pass over the key stream.
+
+        Args:
+            headers: The headers to encrypt, in the order they will be sent.
+
+        Returns:
+            The encrypted headers, in the same order.
+        """
+        data = self.encode(bytearray(b''.join(headers)))
+
+        encoded = []
+        start = 0
+        for header in headers:
+            end = start + len(header)
+            encoded.append(bytes(data[start:end]))
+            start = end
+
+        return encoded
@@ -10,12 +10,14 @@ import world_server.packets.char_create
 import world_server.packets.char_delete
 import world_server.packets.char_enum
 import world_server.packets.compressed_update_object
+import world_server.packets.creature_query
 import world_server.packets.gm_get_ticket
 import world_server.packets.guild_command_result
 import world_server.packets.guild_query
 import world_server.packets.init_world_states
 import world_server.packets.initial_spells
 import world_server.packets.inventory_change_failure
+import world_server.packets.item_query_multiple
 import world_server.packets.item_query_single
 import world_server.packets.login_verify_world
 import world_server.packets.meetingstone_info
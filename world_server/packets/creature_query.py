@@ -0,0 +1,32 @@
+from construct import CString, Int16ul, Int32ul, Int64ul, Struct
+
+from world_server import op_code, router
+
+ClientCreatureQuery = router.ClientPacket.Register(
+    op_code.Client.CREATURE_QUERY,
+    Struct(
+        'entry' / Int32ul,
+        'guid' / Int64ul,
+    ),
+)
+
+ServerCreatureQuery = Struct(
+    'entry' / Int32ul,
+    'name' / CString('ascii'),
+    'name_2' / CString('ascii'),
+    'name_3' / CString('ascii'),
+    'name_4' / CString('ascii'),
+    'sub_name' / CString('ascii'),
+    'type_flags' / Int32ul,
+    'creature_type' / Int32ul,
+    'family' / Int32ul,
+    'rank' / Int32ul,
+    'unknown' / Int32ul,
+    'pet_spell_data_id' / Int32ul,
+    'display_id' / Int32ul,
+    'civilian' / Int16ul,
+)
+
+# Sent instead of ServerCreatureQuery when the creature doesn't exist. The
+# entry has the top bit set.
+ServerCreatureQueryNotFound = Struct('entry' / Int32ul)
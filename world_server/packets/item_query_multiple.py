@@ -0,0 +1,17 @@
+from construct import Array, Int32ul, Struct, this
+
+from world_server import op_code, router
+from world_server.packets import item_query_single
+
+ClientItemQueryMultiple = router.ClientPacket.Register(
+    op_code.Client.ITEM_QUERY_MULTIPLE,
+    Struct(
+        'count' / Int32ul,
+        'entries' / Array(this.count, Int32ul),
+    ),
+)
+
+ServerItemQueryMultiple = Struct(
+    'count' / Int32ul,
+    'items' / Array(this.count, item_query_single.ServerItemQuerySingle),
+)
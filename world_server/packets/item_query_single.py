@@ -81,7 +81,7 @@ ServerItemQuerySingle = Struct(
     'page_material' / Int32ul,
     'start_quest' / Int32ul,
     'lock_id' / Int32ul,
-    'material' / Int32ul,
+    'material' / Int32sl,
     'sheath' / Int32ul,
     'random_property' / Int32ul,
     'block' / Int32ul,
@@ -91,3 +91,7 @@ ServerItemQuerySingle = Struct(
     'map' / Int32ul,
     'bag_family' / Int32ul,
 )
+
+# Sent instead of ServerItemQuerySingle when the item doesn't exist. The entry
+# has the top bit set.
+ServerItemQuerySingleNotFound = Struct('entry' / Int32ul)
@@ -28,14 +28,8 @@ class PackedGUIDAdapter(Adapter):
         return (hex(guid & 0xFFFFFFFF), hex(guid >> 32))
 
     def _encode(self, obj, context, path):
-        mask = 0
-        parts = []
-        for i, byte in enumerate(obj.to_bytes(8, 'little')):
-            if byte != 0:
-                mask |= (1 << i)
-                parts.append(byte)
-
-        return dict(mask=mask, parts=parts)
+        packed = obj.packed if type(obj) is world.GUID else world.PackGUID(obj)
+        return dict(mask=packed[0], parts=list(packed[1:]))
 
 
 PackedGUID = PackedGUIDAdapter(Struct(
@@ -217,16 +211,10 @@ PositionMovementUpdate = Struct(
 
 def PackGUID(guid: int) -> dict:
     """Make a PackedGUID dictionary."""
-    mask = 0
-    guid_bytes = []
-    for i, byte in enumerate(guid.to_bytes(8, 'little')):
-        if byte != 0:
-            mask |= (1 << i)
-            guid_bytes.append(byte)
-
+    packed = world.PackGUID(guid)
     return dict(
-        mask=mask,
-        bytes=guid_bytes,
+        mask=packed[0],
+        bytes=list(packed[1:]),
     )
 
 
@@ -1,15 +1,22 @@
-import threading
-from typing import Optional, Text, Tuple
+from typing import List, Optional, Sequence, Text, Tuple, Union
 
 from pony import orm
 
-from common import session, srp
+from common import records, router, session, srp
 from database.world.realm import Realm
-from world_server import op_code
+from world_server import config, header_cipher, op_code, system
 from world_server.packets import auth_challenge
 
 
 class Session(session.Session):
+    OUTBOUND_HIGH_WATER_BYTES = config.OUTBOUND_HIGH_WATER_BYTES
+    OUTBOUND_HIGH_WATER_PACKETS = config.OUTBOUND_HIGH_WATER_PACKETS
+    OUTBOUND_MAX_BYTES = config.OUTBOUND_MAX_BYTES
+    OUTBOUND_MAX_PACKETS = config.OUTBOUND_MAX_PACKETS
+
+    # AUTH_SESSION installs the header cipher, which every header after it is
+    # decoded with, so it can't be left to run later on a dispatcher thread.
+    INLINE_OPS = frozenset([op_code.Client.AUTH_SESSION])
 
     def setup(self):
         super(Session, self).setup()
@@ -31,34 +38,26 @@ class Session(session.Session):
         # Initial seed to prove login.
         self.auth_challenge_seed = 0
 
-        # Packet counters used to encrypt/decrypt the header.
-        self._send_i = self._send_j = 0
-        self._recv_i = self._recv_j = 0
-
-    def _decode_header(self, header: bytearray) -> bytearray:
-        """Decode the client packet header."""
-        for i in range(len(header)):
-            self._recv_i %= len(self.session_key_b)
-            x = (header[i] - self._recv_j) ^ self.session_key_b[self._recv_i]
-            self._recv_i += 1
-            self._recv_j = header[i]
-            x %= 256
-            header[i] = x
-
-        return header
-
-    def _encode_header(self, header: bytearray) -> bytearray:
-        """Encode the server packet header."""
-        for i in range(len(header)):
-            self._send_i %= len(self.session_key_b)
-            x = (header[i] ^ self.session_key_b[self._send_i]) + self._send_j
-            self._send_i += 1
-            x %= 256
-            header[i] = self._send_j = x
-
-        return header
-
-    def read_header(self) -> Tuple[Optional[op_code.Client], int]:
+        # Encrypts/decrypts packet headers, once the user has logged in.
+        self.header_cipher: Optional[header_cipher.HeaderCipher] = None
+
+    def run_handler(self, route: router.Route, data: Union[bytes, records.Record]):
+        """Run a packet's handler, then send the changes it made to players.
+
+        Handlers commit their db_session before returning, so the updater can
+        only read their changes once they have finished.
+        """
+        updater = system.Register.Get(system.System.ID.UPDATER)
+        try:
+            super(Session, self).run_handler(route, data)
+        except Exception:
+            # The handler's changes were rolled back.
+            updater.discard()
+            raise
+
+        updater.publish()
+
+    def read_header(self, buffer: memoryview) -> Optional[Tuple[int, int, int]]:
         """Read the WORLD client packet header.
 
         This is always at least:
@@ -68,24 +67,27 @@ class Session(session.Session):
         ... but, if logged in, the header is encoded based on the number of
             packets which have been sent and received.
 
+        Args:
+            buffer: All received data which hasn't been processed yet.
+
         Returns:
-            The op_code + the length of the packet. op_code will be None
-            in the case that the client disconnected.
+            None if the header hasn't been fully received, otherwise the
+            op_code + the length of the header + the length of the packet.
         """
-        header = bytearray(self.request.recv(6))
-        if len(header) != 6:
-            return (None, 0)
+        if len(buffer) < 6:
+            return None
 
         # If they are authenticated, then decode the header.
-        if self.session_key:
-            header = self._decode_header(header)
+        header = bytearray(buffer[:6])
+        if self.header_cipher:
+            self.header_cipher.decode(header)
 
         length = int.from_bytes(header[0:2], 'big') - 4
-        op = op_code.Client(int.from_bytes(header[2:6], 'little'))
-        return (op, length)
+        op = int.from_bytes(header[2:6], 'little')
+        return (op, 6, length)
 
     def write_header(self, op: op_code.Server, data: bytes) -> bytes:
-        """Write the AUTH server header.
+        """Write the WORLD server header.
 
         This is always at least:
             2 byte length (including op_code)
@@ -97,20 +99,26 @@ class Session(session.Session):
         Returns:
             The header of the server packet.
         """
-        length = int(len(data) + 2).to_bytes(2, 'big')
-        header = bytearray(length + op.to_bytes(2, 'little'))
+        return self.write_headers([(op, data)])[0]
 
-        # If they are authenticated, encode the header.
-        if self.session_key:
-            self._encode_header(header)
+    def write_headers(self, packets: Sequence[Tuple[op_code.Server, bytes]]) -> List[bytes]:
+        """Write the WORLD server headers for a batch of packets.
 
-        return header
+        If logged in, all of the headers are encoded together in a single pass.
 
-    def handle(self):
+        Returns:
+            The headers of each server packet, in order.
+        """
+        headers = [int(len(data) + 2).to_bytes(2, 'big') + op.to_bytes(2, 'little') for op, data in packets]
+
+        # If they are authenticated, encode the headers.
+        if self.header_cipher:
+            return self.header_cipher.encode_headers(headers)
+
+        return headers
+
+    def on_connect(self):
         """Send an initial AUTH_CHALLENGE packet when starting."""
         self.auth_challenge_seed = srp.Random(4)
         pkt = auth_challenge.ServerAuthChallenge.build(dict(seed=self.auth_challenge_seed))
         self.send_packet(op_code.Server.AUTH_CHALLENGE, pkt)
-
-        # Continue to handle requests like normal.
-        super(Session, self).handle()
@@ -0,0 +1,114 @@
+"""A grid-based spatial index, used to find the objects near a point.
+
+The world is divided into square cells (on the x/y plane), separately for each
+map. Each object is stored in the cell it is in, so finding everything within
+some radius of a point only has to look at the cells the radius overlaps,
+rather than every object in the world.
+"""
+import collections
+import math
+import threading
+from typing import DefaultDict, Dict, Hashable, List, Optional, Set, Tuple
+
+from world_server import config
+
+# A position on a map: (map, x, y, z).
+Position = Tuple[int, float, float, float]
+
+
+def InRange(a: Position, b: Position, radius: float) -> bool:
+    """Check whether two positions are within some distance of each other.
+
+    Positions on different maps are never in range.
+    """
+    if a[0] != b[0]:
+        return False
+
+    dx, dy, dz = a[1] - b[1], a[2] - b[2], a[3] - b[3]
+    return dx * dx + dy * dy + dz * dz <= radius * radius
+
+
+class SpatialIndex(object):
+    """Keeps track of where objects are, so they can be found by position."""
+
+    def __init__(self, cell_size: float = config.SPATIAL_INDEX_CELL_SIZE):
+        """Create a new, empty index.
+
+        Args:
+            cell_size: The width of each cell. Queries are fastest when their
+                       radius is around this size.
+        """
+        self.cell_size = cell_size
+
+        self._cells: DefaultDict[Tuple[int, int, int], Set[Hashable]] = collections.defaultdict(set)
+        self._positions: Dict[Hashable, Position] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._positions
+
+    def _cell(self, map: int, x: float, y: float) -> Tuple[int, int, int]:
+        return map, math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def position(self, key: Hashable) -> Optional[Position]:
+        """Get the position of an object, or None if it isn't in the index."""
+        return self._positions.get(key)
+
+    def update(self, key: Hashable, position: Position):
+        """Add an object to the index, or move it to a new position."""
+        cell = self._cell(position[0], position[1], position[2])
+        with self._lock:
+            old_position = self._positions.get(key)
+            if old_position:
+                old_cell = self._cell(old_position[0], old_position[1], old_position[2])
+                if old_cell != cell:
+                    self._remove_from_cell(key, old_cell)
+
+            self._cells[cell].add(key)
+            self._positions[key] = position
+
+    def remove(self, key: Hashable):
+        """Remove an object from the index (it doesn't matter if it isn't there)."""
+        with self._lock:
+            position = self._positions.pop(key, None)
+            if position:
+                self._remove_from_cell(key, self._cell(position[0], position[1], position[2]))
+
+    def clear(self):
+        """Remove every object from the index."""
+        with self._lock:
+            self._cells.clear()
+            self._positions.clear()
+
+    def query(self, position: Position, radius: float) -> List[Hashable]:
+        """Find every object within some distance of a position.
+
+        Args:
+            position: The position to search around.
+            radius: How far away objects can be.
+
+        Returns:
+            The keys of the objects which are in range.
+        """
+        map, x, y, _ = position
+        min_cell = self._cell(map, x - radius, y - radius)
+        max_cell = self._cell(map, x + radius, y + radius)
+
+        found = []
+        with self._lock:
+            for cell_x in range(min_cell[1], max_cell[1] + 1):
+                for cell_y in range(min_cell[2], max_cell[2] + 1):
+                    for key in self._cells.get((map, cell_x, cell_y), ()):
+                        if InRange(position, self._positions[key], radius):
+                            found.append(key)
+
+        return found
+
+    def _remove_from_cell(self, key: Hashable, cell: Tuple[int, int, int]):
+        keys = self._cells[cell]
+        keys.discard(key)
+        if not keys:
+            del self._cells[cell]
@@ -8,6 +8,9 @@ class System:
     class ID(enum.Enum):
         UPDATER = enum.auto()
         AURA_MANAGER = enum.auto()
+        QUERY_STORE = enum.auto()
+        LOGIN_CACHE = enum.auto()
+        QUERY_CACHE = enum.auto()
 
 
 class Register:
@@ -1,3 +1,6 @@
 ## AUTO-GENEATED USING gen_init_files.py
 import world_server.systems.aura_manager
+import world_server.systems.login_cache
+import world_server.systems.query_cache
+import world_server.systems.query_store
 import world_server.systems.updater
@@ -34,7 +34,9 @@ class AuraManager(system.System):
     @orm.db_session
     def _send_aura_duration_update(self, aura: world.Aura):
         pkt = self._get_duration_update_packet(aura)
-        self._players[aura.applied_to.id].send_packet(op_code.Server.UPDATE_AURA_DURATION, pkt)
+        session = self._players[aura.applied_to.id]
+        session.send_packet(op_code.Server.UPDATE_AURA_DURATION, pkt, droppable=True)
+        session.flush()
 
     @orm.db_session
     def login(self, player: world.Player, session: Session) -> List[Tuple[op_code.Server, bytes]]:
@@ -100,3 +102,4 @@ class AuraManager(system.System):
 
             # Process active auras.
             self.process_auras()
+            system.Register.Get(system.System.ID.UPDATER).publish()
@@ -0,0 +1,53 @@
+"""System which keeps each player's login packets, already encoded.
+
+Logging in sends several packets built from the player's spells, action
+buttons and tutorial flags. These rarely change between logins, so the
+encoded packets are cached per player. Whatever changes the underlying data
+(e.g. moving an action button, or learning a spell) has to invalidate them.
+"""
+from typing import Callable
+
+from common import lru_cache
+from world_server import config, op_code, system
+
+# The login packets which are cached.
+CACHED_PACKETS = (
+    op_code.Server.TUTORIAL_FLAGS,
+    op_code.Server.INITIAL_SPELLS,
+    op_code.Server.ACTION_BUTTONS,
+)
+
+
+@system.Register(system.System.ID.LOGIN_CACHE)
+class LoginCache(system.System):
+    """System which caches encoded login packets for each player."""
+
+    def __init__(self, max_players: int = config.LOGIN_CACHE_MAX_PLAYERS):
+        self._cache = lru_cache.LRUCache('login_cache', max_players * len(CACHED_PACKETS))
+
+    def get(self, player_id: int, op: op_code.Server, build: Callable[[], bytes]) -> bytes:
+        """Get one of a player's login packets.
+
+        Args:
+            player_id: The player who is logging in.
+            op: The packet to get (one of CACHED_PACKETS).
+            build: Builds the packet, if it isn't cached.
+
+        Returns:
+            The encoded packet.
+        """
+        return self._cache.get_or_build((player_id, op), build)
+
+    def invalidate(self, player_id: int, *ops: op_code.Server):
+        """Drop a player's cached login packets.
+
+        Args:
+            player_id: The player whose packets are out of date.
+            ops: The packets which are out of date. If none are given, all of
+                 them are dropped.
+        """
+        self._cache.invalidate(*((player_id, op) for op in ops or CACHED_PACKETS))
+
+    def clear(self):
+        """Drop every player's cached login packets."""
+        self._cache.clear()
@@ -0,0 +1,56 @@
+"""System which caches the responses to queries about dynamic objects.
+
+Every client asks about every player, pet and guild it can see, so the same
+NAME_QUERY, PET_NAME_QUERY and GUILD_QUERY responses are built over and over.
+The encoded responses are cached, keyed by the GUID (or guild ID) which was
+queried. The entities' change hooks invalidate them when they are renamed,
+deleted, or (for guilds) have their ranks edited.
+
+Each kind of query has its own cache, which records its hit rate (e.g.
+`query_cache.name.hits` and `query_cache.name.misses`).
+"""
+import enum
+from typing import Callable, Dict, Text
+
+from common import lru_cache
+from world_server import config, system
+
+
+class CachedQuery(enum.Enum):
+    NAME = 'name'
+    PET_NAME = 'pet_name'
+    GUILD = 'guild'
+
+
+@system.Register(system.System.ID.QUERY_CACHE)
+class QueryCache(system.System):
+    """System which caches encoded query responses."""
+
+    def __init__(self, max_size: int = config.QUERY_CACHE_SIZE):
+        self._caches = {query: lru_cache.LRUCache(f'query_cache.{query.value}', max_size) for query in CachedQuery}
+
+    def get(self, query: CachedQuery, key: int, build: Callable[[], bytes]) -> bytes:
+        """Get the response to a query.
+
+        Args:
+            query: The kind of query.
+            key: The GUID (or guild ID) which was queried.
+            build: Builds the response, if it isn't cached.
+
+        Returns:
+            The encoded response.
+        """
+        return self._caches[query].get_or_build(key, build)
+
+    def invalidate(self, query: CachedQuery, key: int):
+        """Drop a cached response, because the object it describes has changed."""
+        self._caches[query].invalidate(key)
+
+    def clear(self):
+        """Drop every cached response."""
+        for cache in self._caches.values():
+            cache.clear()
+
+    def hit_rates(self) -> Dict[Text, float]:
+        """Get the hit rate of each kind of query."""
+        return {query.value: cache.hit_rate() for query, cache in self._caches.items()}
@@ -0,0 +1,349 @@
+"""System which serves the responses to static queries.
+
+Item and creature templates never change while the server is running, so the
+response to every ITEM_QUERY_SINGLE and CREATURE_QUERY can be built ahead of
+time. The store writes them all to a single file:
+
+    header: magic, fingerprint of the static data, number of responses
+    index:  (kind, entry, offset, length) for each response
+    data:   the responses themselves
+
+At runtime the file is memory mapped, so answering a query is a dictionary
+lookup and a slice. The file is rebuilt whenever the static data files (or the
+way responses are built) change.
+
+Until a store is loaded, or for entries which aren't in it, responses are
+built straight from the database.
+
+The following metrics are recorded:
+    query_store.hits: Queries answered from the store.
+    query_store.misses: Queries which had to go to the database.
+"""
+import enum
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from typing import Callable, Dict, Iterable, Iterator, Optional, Text, Tuple, Type
+
+import construct
+from pony import orm
+
+from common import metrics
+from database import data, game
+from world_server import system
+from world_server.packets import creature_query, item_query_single
+
+# Bump this whenever the way responses are built changes, to invalidate old stores.
+STORE_VERSION = 1
+
+# The static data the responses are built from.
+SOURCE_DATA = (('ItemTemplate', 'game'), ('UnitTemplate', 'game'), ('UnitModelInfo', 'game'))
+
+# Set on the entry of a query response to say it doesn't exist.
+NOT_FOUND_FLAG = 0x80000000
+
+# Set in UnitTemplate.ExtraFlags for creatures which don't aggro.
+CIVILIAN_EXTRA_FLAG = 0x00000002
+
+_MAGIC = b'WQRY'
+_HEADER = struct.Struct('<4s20sI')
+_INDEX_ENTRY = struct.Struct('<BIII')
+
+
+class QueryKind(enum.IntEnum):
+    ITEM = 1
+    CREATURE = 2
+
+
+def ItemQueryResponse(item: Optional[game.ItemTemplate], entry: int) -> bytes:
+    """Build the ITEM_QUERY_SINGLE_RESPONSE for an item.
+
+    Args:
+        item: The item, or None if it doesn't exist.
+        entry: The entry which was queried.
+
+    Returns:
+        The response packet.
+    """
+    if item is None:
+        return item_query_single.ServerItemQuerySingleNotFound.build(dict(entry=entry | NOT_FOUND_FLAG))
+
+    return item_query_single.ServerItemQuerySingle.build(
+        dict(
+            entry=item.entry,
+            class_=item.class_,
+            subclass=item.subclass,
+            name=item.name,
+            name_2='',
+            name_3='',
+            name_4='',
+            display_info_id=item.displayid,
+            quality=item.Quality,
+            flags=item.Flags,
+            buy_price=item.BuyPrice,
+            sell_price=item.SellPrice,
+            inventory_type=item.InventoryType,
+            allowable_class=item.AllowableClass,
+            allowable_race=item.AllowableRace,
+            item_level=item.ItemLevel,
+            required_level=item.RequiredLevel,
+            required_skill=item.RequiredSkill,
+            required_skill_rank=item.RequiredSkillRank,
+            required_spell=item.requiredspell,
+            required_honor_rank=item.requiredhonorrank,
+            required_city_rank=item.RequiredCityRank,
+            required_reputation_faction=item.RequiredReputationFaction,
+            required_reputation_faction_2=item.RequiredReputationRank,
+            max_count=item.maxcount,
+            stackable=item.stackable,
+            container_slots=item.ContainerSlots,
+            stats=[
+                dict(
+                    type=getattr(item, f'stat_type{i}'),
+                    value=getattr(item, f'stat_type{i}'),
+                ) for i in range(1, 10 + 1)
+            ],
+            damages=[
+                dict(
+                    min=getattr(item, f'dmg_min{i}'),
+                    max=getattr(item, f'dmg_max{i}'),
+                    type=getattr(item, f'dmg_type{i}'),
+                ) for i in range(1, 5 + 1)
+            ],
+            armor=item.armor,
+            holy_res=item.holy_res,
+            fire_res=item.fire_res,
+            nature_res=item.nature_res,
+            frost_res=item.frost_res,
+            shadow_res=item.shadow_res,
+            arcane_res=item.arcane_res,
+            delay=item.delay,
+            ammo_type=item.ammo_type,
+            ranged_mod_range=item.RangedModRange,
+            spells=[
+                dict(
+                    id=getattr(item, f'spellid_{i}'),
+                    trigger=getattr(item, f'spelltrigger_{i}'),
+                    charges=getattr(item, f'spellcharges_{i}'),
+                    cooldown=getattr(item, f'spellcooldown_{i}'),
+                    category=getattr(item, f'spellcategory_{i}'),
+                    category_cooldown=getattr(item, f'spellcategorycooldown_{i}'),
+                ) for i in range(1, 5 + 1)
+            ],
+            bonding=item.bonding,
+            description=item.description,
+            page_text=item.PageText,
+            language_id=item.LanguageID,
+            page_material=item.PageMaterial,
+            start_quest=item.startquest,
+            lock_id=item.lockid,
+            material=item.Material,
+            sheath=item.sheath,
+            random_property=item.RandomProperty,
+            block=item.block,
+            item_set=item.itemset,
+            max_durability=item.MaxDurability,
+            area=item.area,
+            map=item.Map,
+            bag_family=item.BagFamily,
+        ))
+
+
+def CreatureQueryResponse(unit: Optional[game.UnitTemplate], entry: int) -> bytes:
+    """Build the CREATURE_QUERY_RESPONSE for a creature.
+
+    Args:
+        unit: The creature, or None if it doesn't exist.
+        entry: The entry which was queried.
+
+    Returns:
+        The response packet.
+    """
+    if unit is None:
+        return creature_query.ServerCreatureQueryNotFound.build(dict(entry=entry | NOT_FOUND_FLAG))
+
+    return creature_query.ServerCreatureQuery.build(
+        dict(
+            entry=unit.entry,
+            name=unit.Name,
+            name_2='',
+            name_3='',
+            name_4='',
+            sub_name=unit.SubName,
+            type_flags=unit.CreatureTypeFlags or 0,
+            creature_type=unit.CreatureType or 0,
+            family=unit.Family or 0,
+            rank=unit.Rank or 0,
+            unknown=0,
+            pet_spell_data_id=unit.PetSpellDataId or 0,
+            display_id=unit.ModelId1.id if unit.ModelId1 else 0,
+            civilian=1 if (unit.ExtraFlags or 0) & CIVILIAN_EXTRA_FLAG else 0,
+        ))
+
+
+# The template each kind of query is answered from, and how to build the response.
+_RESPONSES: Dict[QueryKind, Tuple[Type, Callable]] = {
+    QueryKind.ITEM: (game.ItemTemplate, ItemQueryResponse),
+    QueryKind.CREATURE: (game.UnitTemplate, CreatureQueryResponse),
+}
+
+
+def Fingerprint() -> bytes:
+    """Identify the static data (and code version) a store is built from."""
+    fingerprint = hashlib.sha1(f'{STORE_VERSION}'.encode())
+    for cls_name, module in SOURCE_DATA:
+        data_file = data.find_data_file(cls_name, module)
+        if data_file:
+            stat = os.stat(data_file)
+            fingerprint.update(f':{cls_name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+
+    return fingerprint.digest()
+
+
+@orm.db_session
+def _build_all() -> Iterator[Tuple[QueryKind, int, bytes]]:
+    for kind, (cls, make_response) in _RESPONSES.items():
+        for template in cls.select():
+            try:
+                yield kind, template.entry, make_response(template, template.entry)
+            except construct.ConstructError as e:
+                # Leave it out of the store, so it is looked up (and fails) when queried.
+                logging.getLogger('QUERY_STORE').warning(f'cannot build {kind.name} {template.entry}: {e}')
+
+
+def BuildStore(path: Text, fingerprint: bytes):
+    """Build the response to every static query, and write them to a file.
+
+    Args:
+        path: The file to write.
+        fingerprint: The fingerprint of the static data, see `Fingerprint`.
+    """
+    responses = list(_build_all())
+
+    index = bytearray()
+    offset = _HEADER.size + _INDEX_ENTRY.size * len(responses)
+    for kind, entry, response in responses:
+        index += _INDEX_ENTRY.pack(kind, entry, offset, len(response))
+        offset += len(response)
+
+    # Write to a temporary file first, so other processes never see a partial file.
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, fingerprint, len(responses)))
+        f.write(index)
+        for _, _, response in responses:
+            f.write(response)
+
+    os.replace(tmp_path, path)
+
+
+@system.Register(system.System.ID.QUERY_STORE)
+class QueryStore(system.System):
+    """System which answers static queries from a prebuilt file."""
+
+    def __init__(self):
+        self.path: Optional[Text] = None
+        self.log = logging.getLogger('QUERY_STORE')
+
+        self._mmap: Optional[mmap.mmap] = None
+        self._index: Dict[Tuple[int, int], Tuple[int, int]] = {}
+
+    def load(self, path: Text):
+        """Load the store from a file, building it first if it is missing or out of date.
+
+        Args:
+            path: The file the store is kept in.
+        """
+        fingerprint = Fingerprint()
+        if self._read_fingerprint(path) != fingerprint:
+            self.log.info(f'building query store {path}...')
+            BuildStore(path, fingerprint)
+
+        with open(path, 'rb') as f:
+            store = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, _, num_responses = _HEADER.unpack_from(store)
+        index = {}
+        for kind, entry, offset, length in _INDEX_ENTRY.iter_unpack(
+                store[_HEADER.size:_HEADER.size + _INDEX_ENTRY.size * num_responses]):
+            index[(kind, entry)] = (offset, offset + length)
+
+        if self._mmap:
+            self._mmap.close()
+
+        self.path = path
+        self._mmap, self._index = store, index
+        self.log.info(f'loaded {num_responses} query responses from {path}')
+
+    def item(self, entry: int) -> bytes:
+        """Get the ITEM_QUERY_SINGLE_RESPONSE for an item entry."""
+        return self.get(QueryKind.ITEM, entry)
+
+    def creature(self, entry: int) -> bytes:
+        """Get the CREATURE_QUERY_RESPONSE for a creature entry."""
+        return self.get(QueryKind.CREATURE, entry)
+
+    def get(self, kind: QueryKind, entry: int) -> bytes:
+        """Get the response to a query.
+
+        Args:
+            kind: The kind of query.
+            entry: The entry which was queried.
+
+        Returns:
+            The response packet.
+        """
+        location = self._index.get((kind, entry))
+        if location:
+            metrics.counter('query_store.hits').inc()
+            return self._mmap[location[0]:location[1]]
+
+        metrics.counter('query_store.misses').inc()
+        cls, make_response = _RESPONSES[kind]
+        with orm.db_session:
+            return make_response(cls.get(entry=entry), entry)
+
+    def get_many(self, kind: QueryKind, entries: Iterable[int]) -> Dict[int, bytes]:
+        """Get the responses to a batch of queries.
+
+        Entries which aren't in the store are all looked up in a single
+        database query.
+
+        Args:
+            kind: The kind of query.
+            entries: The entries which were queried.
+
+        Returns:
+            A mapping of entry --> response, in the order the entries were
+            queried. Entries which don't exist are left out.
+        """
+        responses: Dict[int, bytes] = {}
+        missing = []
+        for entry in entries:
+            location = self._index.get((kind, entry))
+            if location:
+                responses[entry] = self._mmap[location[0]:location[1]]
+            elif entry not in responses:
+                responses[entry] = b''
+                missing.append(entry)
+
+        metrics.counter('query_store.hits').inc(len(responses) - len(missing))
+        if missing:
+            metrics.counter('query_store.misses').inc(len(missing))
+            cls, make_response = _RESPONSES[kind]
+            with orm.db_session:
+                for template in cls.select(lambda t: t.entry in missing):
+                    responses[template.entry] = make_response(template, template.entry)
+
+        return {entry: response for entry, response in responses.items() if response}
+
+    def _read_fingerprint(self, path: Text) -> Optional[bytes]:
+        try:
+            with open(path, 'rb') as f:
+                magic, fingerprint, _ = _HEADER.unpack(f.read(_HEADER.size))
+        except (OSError, struct.error):
+            return None
+
+        return fingerprint if magic == _MAGIC else None
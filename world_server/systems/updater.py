@@ -1,25 +1,176 @@
 import enum
-from typing import Dict, Iterable, Optional, Tuple
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from construct import (Array, Bytes, Const, Enum, Float32l, GreedyBytes, GreedyRange, If, Int8ul, Int32ul, Int64ul,
                        Rebuild, Struct, Switch)
 from pony import orm
 
+from common import metrics
 from database import constants, enums, game, world
-from world_server import config, op_code, session, system
-from world_server.packets import compressed_update_object, update_object
+from world_server import (config, op_code, session, spatial_index, system, update_compressor, update_encoder,
+                          update_fields)
 
 
 class PlayerUpdateCache:
-    """PlayerUpdateCache is a per-player cache for update values.
+    """PlayerUpdateCache is a per-player cache of what they have seen.
 
-    Each cache contains a map for values & movement updates for each object
-    (based on ID).
+    Each cache contains the objects the player can see (ID --> GUID), and the
+    version of the last movement update sent for each object (ID --> version).
+    Objects are kept in the order they were last sent, so when the cache goes
+    over its memory budget the state of the least recently updated objects can
+    be shed first.
     """
 
-    def __init__(self):
-        self.values_updates: Dict[int, dict] = {}
-        self.movement_updates: Dict[int, dict] = {}
+    # Roughly how many bytes each entry costs (the dictionary slot, and the ints
+    # or GUID it holds). The size is computed from the number of entries rather
+    # than measured, as dictionaries don't shrink when entries are removed.
+    KNOWN_OBJECT_SIZE = 100
+    MOVEMENT_VERSION_SIZE = 80
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        """Create a new, empty cache.
+
+        Args:
+            max_bytes: The memory budget of the cache (defaults to
+                       PLAYER_UPDATE_CACHE_MAX_BYTES).
+        """
+        self.max_bytes = config.PLAYER_UPDATE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.known_objects: Dict[int, world.GUID] = {}
+        self.movement_versions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.known_objects)
+
+    def size(self) -> int:
+        """Estimate how much memory (in bytes) the cache is using."""
+        return (self.KNOWN_OBJECT_SIZE * len(self.known_objects) +
+                self.MOVEMENT_VERSION_SIZE * len(self.movement_versions))
+
+    def remember(self, object_id: int, guid: world.GUID, movement_version: int):
+        """Remember that an object has been sent to the player."""
+        # Adding the object again moves it to the end (the most recently sent).
+        self.known_objects.pop(object_id, None)
+        self.known_objects[object_id] = guid
+        self.movement_versions.pop(object_id, None)
+        self.movement_versions[object_id] = movement_version
+
+    def forget(self, object_id: int):
+        """Forget about an object (e.g. because it went out of range)."""
+        self.known_objects.pop(object_id, None)
+        self.movement_versions.pop(object_id, None)
+
+    def evict(self, keep: int, out_of_view: Callable[[world.GUID], bool]) -> List[world.GUID]:
+        """Shed the state of the least recently sent objects, until the cache is within its memory budget.
+
+        Objects which are out of view (i.e. they are only still visible because
+        they haven't gone beyond UPDATE_LEAVE_DISTANCE) are forgotten first. If
+        that isn't enough, the movement versions of the objects still in view
+        are dropped, so they are sent a movement update the next time they
+        change. Objects in view are never forgotten, as the client would be
+        told they are out of range.
+
+        Args:
+            keep: An object whose state must not be shed (i.e. the player).
+            out_of_view: Checks whether the object with the given GUID is out of view.
+
+        Returns:
+            The GUIDs of the forgotten objects, which the player needs to be
+            told are out of range.
+        """
+        evicted: List[world.GUID] = []
+        if self.size() <= self.max_bytes:
+            return evicted
+
+        for object_id, guid in list(self.known_objects.items()):
+            if self.size() <= self.max_bytes:
+                return evicted
+            if object_id != keep and out_of_view(guid):
+                evicted.append(guid)
+                self.forget(object_id)
+
+        for object_id in list(self.movement_versions):
+            if self.size() <= self.max_bytes:
+                break
+            if object_id != keep:
+                del self.movement_versions[object_id]
+
+        return evicted
+
+
+class ObjectUpdate(object):
+    """The parts of an object's update which are the same for every player.
+
+    These are worked out once per tick, and each kind of block is only encoded
+    the first time a player needs it, then shared with every other player.
+    """
+
+    def __init__(
+        self,
+        game_object: world.GameObject,
+        fields: update_fields.UpdateFieldArray,
+        movement_update: Optional[dict],
+        movement_version: int,
+        position: spatial_index.Position,
+    ):
+        self.id = game_object.id
+        self.guid = game_object.guid
+        self.object_type = game_object.type_id()
+        self.update_flags = game_object.update_flags()
+        self.fields = fields
+        self.movement_update = movement_update
+        self.movement_version = movement_version
+        self.position = position
+
+        self._encoded: Dict[Tuple[enums.UpdateType, bool], bytes] = {}
+
+    def block(self, update_type: enums.UpdateType, is_self: bool = False) -> dict:
+        """Return a FullUpdateBlock or ValuesUpdateBlock.
+
+        Args:
+            update_type: The type of block to make.
+            is_self: Whether the block is being sent to the object itself.
+
+        Returns:
+            A dictionary which can be encoded as an UpdateBlock.
+        """
+        if update_type == enums.UpdateType.VALUES:
+            return dict(
+                update_type=update_type,
+                update_block=dict(
+                    guid=self.guid,
+                    update=self.fields.changed(),
+                ),
+            )
+
+        update_flags = self.update_flags
+        if is_self:
+            update_flags |= enums.UpdateFlags.SELF
+
+        return dict(
+            update_type=update_type,
+            update_block=dict(
+                guid=self.guid,
+                object_type=self.object_type,
+                flags=update_flags,
+                movement_update=self.movement_update,
+                high_guid=None,
+                victim_guid=None,
+                world_time=None,
+                update_fields=self.fields.all(),
+            ),
+        )
+
+    def encoded(self, update_type: enums.UpdateType, is_self: bool = False) -> bytes:
+        """Get an encoded block (see `block`), encoding it if this is the first time it was needed."""
+        key = (update_type, is_self and update_type != enums.UpdateType.VALUES)
+        data = self._encoded.get(key)
+        if data is None:
+            data = self._encoded[key] = update_encoder.EncodeUpdateBlock(self.block(*key))
+
+        return data
 
 
 @system.Register(system.System.ID.UPDATER)
@@ -28,9 +179,180 @@ class Updater(system.System):
     def __init__(self):
         self.players: Dict[int, session.Session] = {}
 
+        # Decides which UPDATE_OBJECT packets to compress.
+        self._compressor = update_compressor.UpdateCompressor()
+
         # Caches to keep track of what players have seen.
         self._update_cache: Dict[int, PlayerUpdateCache] = {}
 
+        # The current update fields of each object which has been sent to a
+        # player (based on GUID, as IDs are shared between object types).
+        # Items and containers share a high GUID, so an array is replaced if
+        # its size no longer matches.
+        self._fields: Dict[int, update_fields.UpdateFieldArray] = {}
+
+        # The last movement update of each object (based on GUID), and its
+        # version. The version goes up every time the movement update changes,
+        # so players' caches only need to keep the version they were sent.
+        self._movement: Dict[int, Tuple[Optional[dict], int]] = {}
+
+        # Where each unit is (based on GUID). Items don't have a position of
+        # their own, so are found through whoever is carrying them.
+        self._index = spatial_index.SpatialIndex()
+        self._indexed = False
+
+        # The objects changed (based on ID) by each thread's current
+        # transaction, and when the first change was made. A tick reads from
+        # its own transaction, so these aren't sent until publish() is called
+        # once the transaction has committed.
+        self._staged = threading.local()
+
+        # The objects changed by committed transactions, and when the first
+        # change was made.
+        self._dirty: Set[int] = set()
+        self._dirty_since: Optional[float] = None
+        self._dirty_lock = threading.Lock()
+
+        # Held while building packets, so logins and ticks don't interleave.
+        self._lock = threading.RLock()
+        self._stopped = threading.Event()
+
+    def track(self, game_object: world.GameObject):
+        """Add an object to the spatial index, or update its position."""
+        if isinstance(game_object, world.Unit):
+            self._index.update(game_object.guid, self._position(game_object))
+
+    def untrack(self, game_object: world.GameObject):
+        """Remove an object from the spatial index (e.g. because it was deleted)."""
+        self._index.remove(game_object.guid)
+        self._fields.pop(game_object.guid, None)
+        self._movement.pop(game_object.guid, None)
+
+    def reset(self):
+        """Forget about every object (e.g. because the world database was cleared).
+
+        Objects are looked up again when they are next needed.
+        """
+        with self._lock:
+            self._index.clear()
+            self._indexed = False
+            self._fields.clear()
+            self._movement.clear()
+
+        self.discard()
+        with self._dirty_lock:
+            self._dirty.clear()
+            self._dirty_since = None
+
+    def _position(self, game_object: world.GameObject) -> spatial_index.Position:
+        return (game_object.map_id(), *game_object.position())
+
+    def _in_range(self, position: spatial_index.Position, game_object: world.GameObject, radius: float) -> bool:
+        object_position = self._index.position(game_object.guid) or self._position(game_object)
+        return spatial_index.InRange(position, object_position, radius)
+
+    def _is_visible(self, player_cache: PlayerUpdateCache, position: spatial_index.Position,
+                    update: ObjectUpdate) -> bool:
+        """Check whether a player should be able to see an object.
+
+        Objects the player can already see stay visible until they are beyond
+        UPDATE_LEAVE_DISTANCE; others have to come within MAX_UPDATE_DISTANCE.
+        """
+        if update.id in player_cache.known_objects:
+            return spatial_index.InRange(position, update.position, config.UPDATE_LEAVE_DISTANCE)
+        return spatial_index.InRange(position, update.position, config.MAX_UPDATE_DISTANCE)
+
+    def _nearby_objects(self, player: world.Player, radius: float) -> List[world.GameObject]:
+        """Find every object within range of a player.
+
+        Args:
+            player: The player to search around.
+            radius: How far away objects can be.
+
+        Returns:
+            The objects in range (including the player), sorted by ID.
+        """
+        if not self._indexed:
+            # Units created by another process (or before the server started)
+            # haven't been tracked yet.
+            for unit in world.Unit.select():
+                self.track(unit)
+            self._indexed = True
+
+        guids = self._index.query(self._position(player), radius)
+        ids = [world.GUID(guid).low for guid in guids]
+        units = {unit.guid: unit for unit in world.Unit.select(lambda u: u.id in ids)}
+
+        game_objects: List[world.GameObject] = []
+        for guid in guids:
+            unit = units.get(guid)
+            if unit is None:
+                # The unit no longer exists.
+                self._index.remove(guid)
+                continue
+
+            game_objects.append(unit)
+            if isinstance(unit, world.Player):
+                game_objects.extend(unit.carried_items())
+
+        return sorted(game_objects, key=lambda o: o.id)
+
+    def _visibility_changes(self, player: world.Player) -> Tuple[List[world.GameObject], List[int]]:
+        """Work out which objects have come into, or gone out of, a player's view.
+
+        This is needed when the player moves, as everything around them may
+        have come into (or gone out of) range without moving itself. Objects
+        which have gone out of view are forgotten.
+
+        Args:
+            player: The player whose view to refresh.
+
+        Returns:
+            A tuple of (objects which have come into view, GUIDs of objects
+            which have gone out of view).
+        """
+        player_cache = self._update_cache[player.id]
+        position = self._index.position(player.guid) or self._position(player)
+
+        in_view = set()
+        entering = []
+        for o in self._nearby_objects(player, config.UPDATE_LEAVE_DISTANCE):
+            if o.id in player_cache.known_objects:
+                in_view.add(o.id)
+            elif self._in_range(position, o, config.MAX_UPDATE_DISTANCE):
+                entering.append(o)
+
+        leaving = []
+        for object_id, guid in list(player_cache.known_objects.items()):
+            if object_id not in in_view:
+                leaving.append(guid)
+                player_cache.forget(object_id)
+
+        return entering, leaving
+
+    def _refresh_fields(self, game_object: world.GameObject) -> update_fields.UpdateFieldArray:
+        """Bring the stored update fields for an object up to date.
+
+        Only the fields which have changed are marked dirty. The dirty fields
+        are sent (and cleared) the next time the object is updated.
+
+        Args:
+            game_object: The object to refresh.
+
+        Returns:
+            The object's update fields.
+        """
+        fields = self._fields.get(game_object.guid)
+        if fields is None or fields.num_fields != game_object.num_fields():
+            # Nobody has seen this object yet, so there is nothing to send a delta for.
+            fields = self._fields[game_object.guid] = update_fields.UpdateFieldArray(game_object.num_fields())
+            fields.update(game_object.update_fields())
+            fields.clear_dirty()
+        else:
+            fields.update(game_object.update_fields())
+
+        return fields
+
     def _make_movement_update(self, game_object: world.GameObject) -> Optional[dict]:
         """Return either a FullMovementUpdate or PositionMovementUpdate.
 
@@ -78,130 +400,158 @@ class Updater(system.System):
 
         return None
 
-    def _make_update_block(self, player: world.Player, game_object: world.GameObject) -> dict:
-        """Return a FullUpdateBlock, ValuesUpdateBlock or OutOfRangeUpdateBlock.
-
-        Args:  
-            player: The player this update is being sent do.
-            game_object: The game object this update is for.
+    def _object_update(self, game_object: world.GameObject) -> ObjectUpdate:
+        """Work out the parts of an object's update which every player shares.
 
-        Returns:
-            A dictionary which can be used to construct an UpdateBlock struct.
+        The object's update fields must have been refreshed first.
         """
-        player_cache = self._update_cache[player.id]
-
-        # Generate the updates for the player.
         movement_update = self._make_movement_update(game_object)
-        values_update = game_object.update_fields()
+        last_movement_update, version = self._movement.get(game_object.guid, (None, 0))
+        if movement_update != last_movement_update:
+            version += 1
+            self._movement[game_object.guid] = (movement_update, version)
+
+        return ObjectUpdate(
+            game_object,
+            self._fields[game_object.guid],
+            movement_update,
+            version,
+            self._index.position(game_object.guid) or self._position(game_object),
+        )
+
+    def _update_type(self, player_cache: PlayerUpdateCache, update: ObjectUpdate) -> Optional[enums.UpdateType]:
+        """Work out which type of block a player needs for an object.
+
+        The player's cache is updated, as if the block has been sent.
 
-        # Get the cached updates.
-        last_movement_update = player_cache.movement_updates.get(game_object.id, None)
-        last_values_update = player_cache.values_updates.get(game_object.id, {})
+        Args:
+            player_cache: The cache of what the player has seen.
+            update: The object's update.
 
-        # Work out the delta in the values update.
-        values_update_diff = {k: v for k, v in values_update.items() if last_values_update.get(k, None) != v}
+        Returns:
+            The update type, or None if there is nothing to send.
+        """
+        fields = update.fields
 
-        # Work out the update type.
-        update_type = None
-        if game_object.id not in player_cache.values_updates:
+        if update.id not in player_cache.known_objects:
             # We need to create the object.
             update_type = enums.UpdateType.CREATE_OBJECT
+        elif update.movement_version != player_cache.movement_versions.get(update.id):
+            # Movement update required.
+            update_type = enums.UpdateType.MOVEMENT
+        elif fields.dirty & fields.present:
+            # No movement update, only a values update.
+            update_type = enums.UpdateType.VALUES
         else:
-            if movement_update != last_movement_update:
-                # Movement update required.
-                update_type = enums.UpdateType.MOVEMENT
-            else:
-                if values_update_diff:
-                    # No movement update, only a values update.
-                    update_type = enums.UpdateType.VALUES
-                else:
-                    # Shortcut: there is no update to perform.
-                    return {}
+            # Shortcut: there is no update to perform.
+            return None
 
         # Update the cache.
-        if movement_update:
-            player_cache.movement_updates[game_object.id] = movement_update
-        player_cache.values_updates[game_object.id] = values_update
+        player_cache.remember(update.id, update.guid, update.movement_version)
 
-        if update_type == enums.UpdateType.VALUES:
-            return dict(
-                update_type=update_type,
-                update_block=dict(
-                    guid=game_object.guid,
-                    update=dict(
-                        num_fields=game_object.num_fields(),
-                        fields=values_update_diff,
-                    ),
-                ),
-            )
-
-        update_flags = game_object.update_flags()
-        if player.guid == game_object.guid:
-            update_flags |= enums.UpdateFlags.SELF
-
-        return dict(
-            update_type=update_type,
-            update_block=dict(
-                guid=game_object.guid,
-                object_type=game_object.type_id(),
-                flags=update_flags,
-                movement_update=self._make_movement_update(game_object),
-                high_guid=None,
-                victim_guid=None,
-                world_time=None,
-                update_fields=dict(
-                    num_fields=game_object.num_fields(),
-                    fields=game_object.update_fields(),
-                ),
-            ),
-        )
+        return update_type
 
     def _make_update_object(
         self,
-        player: world.Player,
-        game_objects: Iterable[world.GameObject],
-    ) -> Tuple[op_code.Server, bytes]:
-        out_of_range_guids = []
-        update_blocks = []
-        for o in game_objects:
-            if player.distance_to(o) > config.MAX_UPDATE_DISTANCE:
-                out_of_range_guids.append(o.guid)
-            else:
-                update_block = self._make_update_block(player, o)
-                if update_block:
-                    update_blocks.append(update_block)
+        player_guid: world.GUID,
+        updates: Iterable[ObjectUpdate],
+        out_of_range_guids: Iterable[int] = (),
+    ) -> List[Tuple[op_code.Server, bytes]]:
+        """Make the UPDATE_OBJECT packets for the changes a player can see.
+
+        Objects are only created when they come into view, and only sent as
+        out of range when they go out of view; changes to objects the player
+        can't see are not sent at all. Blocks which aren't specific to the
+        player are shared with everyone else who is sent them.
+
+        Args:
+            player_guid: The player the packet is for.
+            updates: The objects which may have changed.
+            out_of_range_guids: Objects already known to have gone out of view.
+
+        Returns:
+            A list of (op code, packet) tuples, which is empty if there is nothing to send.
+        """
+        player_cache = self._update_cache[player_guid.low]
+        player_position = self._index.position(player_guid)
+        if player_position is None:
+            player_position = self._position(world.GameObject[player_guid.low])
+
+        out_of_range_guids = list(out_of_range_guids)
+        blocks = []
+        for update in updates:
+            if not self._is_visible(player_cache, player_position, update):
+                if update.id in player_cache.known_objects:
+                    out_of_range_guids.append(update.guid)
+
+                    # The client will destroy the object, so it has to be created again if it comes back.
+                    player_cache.forget(update.id)
+                continue
+
+            update_type = self._update_type(player_cache, update)
+            if update_type is not None:
+                blocks.append(update.encoded(update_type, update.guid == player_guid))
+
+        # Keep the cache within its memory budget. Only objects which are out
+        # of view can be removed from the player's view.
+        def out_of_view(guid: world.GUID) -> bool:
+            position = self._index.position(guid)
+            return position is not None and not spatial_index.InRange(player_position, position,
+                                                                      config.MAX_UPDATE_DISTANCE)
+
+        out_of_range_guids.extend(player_cache.evict(keep=player_guid.low, out_of_view=out_of_view))
+        metrics.distribution('updater.player_cache_bytes').record(player_cache.size())
 
         # Make an update block for OUT_OF_RANGE updates.
         if out_of_range_guids:
-            update_blocks.append(
-                dict(
-                    update_type=enums.UpdateType.OUT_OF_RANGE_OBJECTS,
-                    update_block=dict(
-                        n_guids=len(out_of_range_guids),
-                        guids=out_of_range_guids,
-                    ),
-                ))
-
-        if not update_blocks:
-            return (None, None)
-
-        update_data = dict(
-            n_blocks=len(update_blocks),
-            is_transport=0,  # TODO
-            blocks=update_blocks,
-        )
+            blocks.append(
+                update_encoder.EncodeUpdateBlock(
+                    dict(
+                        update_type=enums.UpdateType.OUT_OF_RANGE_OBJECTS,
+                        update_block=dict(
+                            n_guids=len(out_of_range_guids),
+                            guids=out_of_range_guids,
+                        ),
+                    )))
+
+        if not blocks:
+            return []
+
+        return self._pack_blocks(blocks)
 
-        op = op_code.Server.UPDATE_OBJECT
-        update_object_pkt = update_object.ServerUpdateObject.build(update_data)
-        if len(update_object_pkt) > config.MAX_UPDATE_OBJECT_PACKET_SIZE:
-            op = op_code.Server.COMPRESSED_UPDATE_OBJECT
-            update_object_pkt = compressed_update_object.ServerCompressedUpdateObject.build(
-                dict(uncompressed_size=len(update_object_pkt), data=update_data))
+    def _pack_blocks(self, blocks: List[bytes]) -> List[Tuple[op_code.Server, bytes]]:
+        """Pack encoded blocks into UPDATE_OBJECT packets no larger than MAX_PACKET_SIZE.
 
-        return (op, update_object_pkt)
+        The blocks are sent in a single packet if they fit (once compressed),
+        otherwise they are split across as few packets as they fit in.
+
+        Args:
+            blocks: The encoded blocks.
+
+        Returns:
+            A list of (op code, packet) tuples.
+        """
+        packet = self._compressor.pack(update_encoder.JoinUpdateBlocks(blocks, is_transport=0))  # TODO: transports
+        if len(packet[1]) <= config.MAX_PACKET_SIZE:
+            return [packet]
+
+        packets = []
+        for batch in update_encoder.BatchUpdateBlocks(blocks, config.MAX_PACKET_SIZE):
+            op, data = self._compressor.pack(update_encoder.JoinUpdateBlocks(batch, is_transport=0))
+            if len(data) > config.MAX_PACKET_SIZE:
+                logging.error(f'Updater: dropping an update block which is too large to send ({len(data)} bytes)')
+                continue
+            packets.append((op, data))
+
+        return packets
+
+    def cache_sizes(self) -> Dict[int, int]:
+        """Get an estimate of how much memory (in bytes) each player's update cache is using."""
+        with self._lock:
+            return {player_id: cache.size() for player_id, cache in self._update_cache.items()}
 
     @orm.db_session
-    def login(self, player: world.Player, session: session.Session):
+    def login(self, player: world.Player, session: session.Session) -> List[Tuple[op_code.Server, bytes]]:
         """Mark the given player as logged in.
 
         This will cause object updates to be sent to them immediately.
@@ -209,17 +559,23 @@ class Updater(system.System):
         Args:
             player: The player to log in.
             session: The session the player can be contacted on.
+
+        Returns:
+            The UPDATE_OBJECT packets for everything the player can see, as
+            (op code, packet) tuples.
         """
         session.log.info(f'Updater: registered new player {player.name} (id = {player.id})')
-        self.players[player.id] = session
-        self._update_cache[player.id] = PlayerUpdateCache()
+        with self._lock:
+            self.players[player.id] = session
+            self._update_cache[player.id] = PlayerUpdateCache()
 
-        op, update_object_pkt = self._make_update_object(
-            player,
-            (o for o in world.GameObject.select() if o.distance_to(player) < config.MAX_UPDATE_DISTANCE),
-        )
+            self.track(player)
+            updates = []
+            for o in self._nearby_objects(player, config.MAX_UPDATE_DISTANCE):
+                self._refresh_fields(o)
+                updates.append(self._object_update(o))
 
-        return op, update_object_pkt
+            return self._make_update_object(player.guid, updates)
 
     @orm.db_session
     def logout(self, player: world.Player):
@@ -232,20 +588,146 @@ class Updater(system.System):
             session: The session the player can be contacted on.
         """
         self.players[player.id].log.info(f'Updater: player logout {player.name} (id = {player.id})')
-        del self.players[player.id]
-        del self._update_cache[player.id]
+        with self._lock:
+            del self.players[player.id]
+            del self._update_cache[player.id]
 
         # Send DESTROY_OBJECT packets for this player to all other players.
         # TODO
 
-    @orm.db_session
     def update_object(self, game_object: world.GameObject):
-        """Send updates for the given object to all parties.
+        """Mark the given object as changed.
+
+        The changes are sent to all parties on the first tick after publish()
+        is called for the transaction making them, merged with any other
+        changes made before then.
 
         Args:
             game_object: The object which is being updated.
         """
-        for player_id, session in self.players.items():
-            op, update_object_pkt = self._make_update_object(world.GameObject[player_id], [game_object])
-            if op and update_object_pkt:
-                session.send_packet(op, update_object_pkt)
+        staged = self._staged_ids()
+        if not staged:
+            self._staged.since = time.monotonic()
+        staged.add(game_object.id)
+
+    def publish(self):
+        """Queue the changes made by the current thread's transaction to be sent.
+
+        This has to be called once the transaction has committed, as until
+        then the tick can't see the changes.
+        """
+        staged = self._staged_ids()
+        if not staged:
+            return
+
+        with self._dirty_lock:
+            self._dirty |= staged
+            if self._dirty_since is None or self._staged.since < self._dirty_since:
+                self._dirty_since = self._staged.since
+        staged.clear()
+
+    def discard(self):
+        """Forget the changes made by the current thread's transaction (e.g. because it was rolled back)."""
+        self._staged_ids().clear()
+
+    def _staged_ids(self) -> Set[int]:
+        staged = getattr(self._staged, 'ids', None)
+        if staged is None:
+            staged = self._staged.ids = set()
+        return staged
+
+    def _take_dirty(self) -> Tuple[Set[int], Optional[float]]:
+        """Take the objects whose changes can be sent.
+
+        These are the objects changed by committed transactions, and by the
+        current thread's transaction (which the tick reads through).
+
+        Returns:
+            A tuple of (object IDs, when the first change was made).
+        """
+        self.publish()
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+            dirty_since, self._dirty_since = self._dirty_since, None
+
+        return dirty, dirty_since
+
+    @orm.db_session
+    def flush(self):
+        """Send the changes to every object updated since the last tick.
+
+        Each player is sent (at most) one UPDATE_OBJECT packet, containing all
+        of the changes they can see.
+        """
+        dirty, dirty_since = self._take_dirty()
+        if not dirty:
+            return
+
+        start = time.monotonic()
+        with self._lock:
+            ids = list(dirty)
+            game_objects = sorted(world.GameObject.select(lambda o: o.id in ids), key=lambda o: o.id)
+
+            # Each update is only worked out (and each block only encoded) once,
+            # however many players see it.
+            updates: Dict[int, ObjectUpdate] = {}
+            for o in game_objects:
+                self.track(o)
+                self._refresh_fields(o)
+                updates[o.id] = self._object_update(o)
+            dirty_updates = list(updates.values())
+
+            for player_id, session in list(self.players.items()):
+                player_guid = world.GUID((enums.HighGUID.PLAYER << 32) | player_id)
+                player_updates = dirty_updates
+                out_of_range_guids: List[int] = []
+                if player_id in dirty:
+                    # The player may have moved, so check what they can see now.
+                    entering, out_of_range_guids = self._visibility_changes(world.GameObject[player_id])
+                    player_updates = list(dirty_updates)
+                    for o in entering:
+                        if o.id not in dirty:
+                            if o.id not in updates:
+                                self._refresh_fields(o)
+                                updates[o.id] = self._object_update(o)
+                            player_updates.append(updates[o.id])
+
+                packets = self._make_update_object(player_guid, player_updates, out_of_range_guids)
+                for op, update_object_pkt in packets:
+                    session.send_packet(op, update_object_pkt)
+                if packets:
+                    session.flush()
+
+            # Every player has now been sent the changes.
+            for update in updates.values():
+                update.fields.clear_dirty()
+
+        end = time.monotonic()
+        metrics.distribution('updater.objects_per_tick').record(len(game_objects))
+        metrics.distribution('updater.tick_time').record(end - start)
+        metrics.distribution('updater.update_latency').record(end - dirty_since)
+
+    def run(self):
+        """Run the updater. This will take control of the current thread (until stop() is called)."""
+        logging.debug('Starting updater')
+        interval = 1.0 / config.UPDATE_TICK_RATE
+        next_tick = time.monotonic()
+        while not self._stopped.is_set():
+            metrics.distribution('updater.tick_lag').record(max(0.0, time.monotonic() - next_tick))
+            try:
+                self.flush()
+            except Exception:
+                logging.exception('Updater: failed to send updates')
+
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # The tick overran, so start again rather than trying to catch up.
+                next_tick = time.monotonic()
+                delay = 0
+
+            self._stopped.wait(delay)
+
+    def stop(self):
+        """Stop the updater (if it is running)."""
+        self._stopped.set()
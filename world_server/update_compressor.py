@@ -0,0 +1,124 @@
+"""Decides whether each UPDATE_OBJECT packet is worth compressing.
+
+Compressing a packet costs CPU time, and small or already dense packets don't
+shrink much. The compressor keeps a running average of how well recent
+packets compressed (both the size ratio and the bytes saved per second of
+compression). When compression stops paying off it sends packets as they are,
+compressing one every so often to check whether things have changed.
+
+The following metrics are recorded:
+    update_compressor.packets_compressed: Packets sent as COMPRESSED_UPDATE_OBJECT.
+    update_compressor.packets_plain: Packets sent as UPDATE_OBJECT.
+    update_compressor.bytes_saved: Bytes saved by compression.
+    update_compressor.bytes_wasted: Bytes compressed which then weren't sent compressed.
+    update_compressor.compress_time: How long (in seconds) each compression took.
+"""
+import threading
+import time
+import zlib
+from typing import Tuple
+
+from common import metrics
+from world_server import config, op_code, update_encoder
+
+# How much weight each new measurement has in the running averages.
+SMOOTHING = 0.1
+
+
+class UpdateCompressor(object):
+    """Turns encoded UPDATE_OBJECT payloads into the packet to send."""
+
+    def __init__(
+        self,
+        level: int = config.UPDATE_OBJECT_COMPRESSION_LEVEL,
+        min_size: int = config.MAX_UPDATE_OBJECT_PACKET_SIZE,
+        max_ratio: float = config.UPDATE_OBJECT_MAX_COMPRESSION_RATIO,
+        min_savings_rate: float = config.UPDATE_OBJECT_MIN_COMPRESSION_SAVINGS_RATE,
+        probe_interval: int = config.UPDATE_OBJECT_COMPRESSION_PROBE_INTERVAL,
+    ):
+        """Create a new compressor.
+
+        Args:
+            level: The zlib compression level.
+            min_size: Packets no larger than this are never compressed.
+            max_ratio: Compression is only worthwhile if it makes packets
+                       smaller than this fraction of their original size.
+            min_savings_rate: Compression is only worthwhile if it saves at
+                              least this many bytes per second of CPU time.
+            probe_interval: While compression isn't worthwhile, only try
+                            compressing one in this many packets.
+        """
+        self.level = level
+        self.min_size = min_size
+        self.max_ratio = max_ratio
+        self.min_savings_rate = min_savings_rate
+        self.probe_interval = probe_interval
+
+        # Running averages of recent compressions.
+        self.ratio = 0.0
+        self.savings_rate = float('inf')
+
+        # Copying a fresh compressor is cheaper than setting up a new one.
+        self._template = zlib.compressobj(level)
+        self._lock = threading.Lock()
+        self._skipped = 0
+
+    def worthwhile(self) -> bool:
+        """Whether recent packets have been worth compressing."""
+        return self.ratio <= self.max_ratio and self.savings_rate >= self.min_savings_rate
+
+    def pack(self, payload: bytes) -> Tuple[op_code.Server, bytes]:
+        """Get the packet to send for an encoded UPDATE_OBJECT.
+
+        Args:
+            payload: The encoded UPDATE_OBJECT.
+
+        Payloads larger than MAX_PACKET_SIZE can't be sent as they are, so
+        they are always compressed, however well recent packets compressed.
+        If the packet is still too large, the caller has to split it up.
+
+        Returns:
+            A tuple of (op_code, packet). The packet will either be the payload
+            itself, or a COMPRESSED_UPDATE_OBJECT wrapping it.
+        """
+        too_large = len(payload) > config.MAX_PACKET_SIZE
+        if not too_large and (len(payload) <= self.min_size or not self._should_try()):
+            metrics.counter('update_compressor.packets_plain').inc()
+            return op_code.Server.UPDATE_OBJECT, payload
+
+        start = time.perf_counter()
+        compressor = self._template.copy()
+        compressed = compressor.compress(payload) + compressor.flush()
+        elapsed = time.perf_counter() - start
+
+        packet = update_encoder.PackCompressedUpdateObject(len(payload), compressed)
+        saved = len(payload) - len(packet)
+        self._record(len(packet) / len(payload), saved / max(elapsed, 1e-9))
+        metrics.distribution('update_compressor.compress_time').record(elapsed)
+
+        if not too_large and (saved <= 0 or len(packet) > self.max_ratio * len(payload)):
+            metrics.counter('update_compressor.bytes_wasted').inc(len(payload))
+            metrics.counter('update_compressor.packets_plain').inc()
+            return op_code.Server.UPDATE_OBJECT, payload
+
+        metrics.counter('update_compressor.bytes_saved').inc(max(saved, 0))
+        metrics.counter('update_compressor.packets_compressed').inc()
+        return op_code.Server.COMPRESSED_UPDATE_OBJECT, packet
+
+    def _should_try(self) -> bool:
+        with self._lock:
+            if self.worthwhile() or self._skipped >= self.probe_interval:
+                self._skipped = 0
+                return True
+
+            self._skipped += 1
+            return False
+
+    def _record(self, ratio: float, savings_rate: float):
+        with self._lock:
+            if self.savings_rate == float('inf'):
+                # This is the first measurement.
+                self.ratio, self.savings_rate = ratio, savings_rate
+            else:
+                self.ratio += SMOOTHING * (ratio - self.ratio)
+                self.savings_rate += SMOOTHING * (savings_rate - self.savings_rate)
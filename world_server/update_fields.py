@@ -0,0 +1,134 @@
+"""Flat, array-backed storage for an object's update fields.
+
+Each object has a lot of update fields (over 1000 for a player), and most
+updates only change a handful of them. Rather than rebuilding and comparing
+dictionaries, each live object keeps its fields in an UpdateFieldArray: one
+32-bit slot per field, plus bitmasks recording which fields have a value and
+which have changed since they were last sent.
+"""
+import array
+import enum
+import struct
+import sys
+from typing import Any, Dict, NamedTuple
+
+from database import world
+
+_FLOAT = struct.Struct('<f')
+_SLOT = struct.Struct('<I')
+
+assert array.array('I').itemsize == 4, 'update fields need 32-bit slots'
+
+
+class MaskedFields(NamedTuple):
+    """Some of the fields of an UpdateFieldArray, ready to be encoded.
+
+    This can be used in place of the `dict(num_fields=..., fields=...)` passed
+    to the update encoder.
+    """
+    num_fields: int
+    mask: int
+    values: array.array
+
+
+def ToSlot(value: Any) -> int:
+    """Convert a (non-GUID) update field value into the 32-bit slot which represents it on the wire."""
+    if isinstance(value, int):
+        if not -0x80000000 <= value <= 0xFFFFFFFF:
+            raise OverflowError(f'update field value {value} does not fit in 32 bits')
+        return value & 0xFFFFFFFF
+    if isinstance(value, float):
+        return _SLOT.unpack(_FLOAT.pack(value))[0]
+    if isinstance(value, bytes):
+        assert len(value) == 4
+        return _SLOT.unpack(value)[0]
+    if isinstance(value, enum.Enum):
+        return value.value
+
+    raise ValueError(f'unknown update field type {type(value)}')
+
+
+class UpdateFieldArray(object):
+    """The update fields of a single object.
+
+    Attributes:
+        values: One slot per field.
+        present: A bitmask of the fields which have a value.
+        dirty: A bitmask of the fields which have changed since `clear_dirty`
+               was last called.
+    """
+
+    __slots__ = ('num_fields', 'values', 'present', 'dirty')
+
+    def __init__(self, num_fields: int):
+        self.num_fields = num_fields
+        self.values = array.array('I', bytes(4 * num_fields))
+        self.present = 0
+        self.dirty = 0
+
+    def set(self, field: int, value: Any) -> int:
+        """Set the value of a single field, marking it dirty if it changed.
+
+        Args:
+            field: The field to set.
+            value: The new value. A GUID will fill this field and the next one,
+                   and None will remove the field's value.
+
+        Returns:
+            A bitmask of the fields which now hold this value.
+        """
+        if value is None:
+            self.present &= ~(1 << field)
+            return 0
+
+        if isinstance(value, world.GUID):
+            return self._store(field, value.low) | self._store(field + 1, value.high)
+
+        return self._store(field, ToSlot(value))
+
+    def update(self, fields: Dict[Any, Any]) -> int:
+        """Replace the value of every field.
+
+        Args:
+            fields: A mapping of field --> value, as returned by `GameObject.update_fields`.
+                    Any field not in the mapping is removed.
+
+        Returns:
+            The dirty bitmask.
+        """
+        present = 0
+        for field, value in fields.items():
+            present |= self.set(field, value)
+
+        self.present &= present
+        return self.dirty
+
+    def changed(self) -> MaskedFields:
+        """Get the fields which have changed since `clear_dirty` was last called."""
+        return MaskedFields(self.num_fields, self.dirty & self.present, self.values)
+
+    def all(self) -> MaskedFields:
+        """Get every field which has a value."""
+        return MaskedFields(self.num_fields, self.present, self.values)
+
+    def clear_dirty(self):
+        """Mark every field as sent."""
+        self.dirty = 0
+
+    def _store(self, field: int, slot: int) -> int:
+        bit = 1 << field
+        if not self.present & bit or self.values[field] != slot:
+            self.values[field] = slot
+            self.present |= bit
+            self.dirty |= bit
+
+        return bit
+
+
+def SlotsToBytes(values: array.array) -> bytes:
+    """Encode an array of slots as little-endian bytes."""
+    if sys.byteorder != 'little':
+        values = array.array('I', values)
+        values.byteswap()
+
+    return values.tobytes()
@@ -1,5 +1,6 @@
 import argparse
 import datetime
+import multiprocessing
 import os
 import sys
 import threading
@@ -13,7 +14,7 @@ import login_server.packets  # register packet formats
 import world_server.handlers  # register handlers
 import world_server.packets  # register packet formats
 import world_server.systems  # register systems
-from common import server
+from common import packet_compiler, server, supervisor
 from database import constants, db, enums, game, world
 from login_server import router as login_router
 from login_server import session as login_session
@@ -140,6 +141,7 @@ def setup_db(args: argparse.Namespace):
                 race=constants.ChrRaces[1],
                 class_=constants.ChrClasses[base_unit.UnitClass],
                 gender=enums.Gender.MALE,
+                map=jeshua.map,
                 x=jeshua.x + 2,
                 y=jeshua.y - 2,
                 z=jeshua.z,
@@ -152,46 +154,102 @@ def setup_db(args: argparse.Namespace):
             )
 
 
+def load_query_store(args: argparse.Namespace):
+    system.Register.Get(system.System.ID.QUERY_STORE).load(args.query_store_file)
+
+
+def _auth_server_kwargs(args: argparse.Namespace) -> dict:
+    return dict(
+        name='AUTH',
+        host=args.host,
+        port=args.auth_port,
+        session_type=login_session.Session,
+        packet_formats=packet_compiler.CompileAll(login_router.ClientPacket.ROUTES, args.packet_cache_dir),
+        handlers=login_router.Handler.ROUTES,
+        engine=args.engine,
+        workers=args.workers,
+    )
+
+
+def _world_server_kwargs(args: argparse.Namespace) -> dict:
+    return dict(
+        name='WORLD',
+        host=args.host,
+        port=args.world_port,
+        session_type=world_session.Session,
+        packet_formats=packet_compiler.CompileAll(world_router.ClientPacket.ROUTES, args.packet_cache_dir),
+        handlers=world_router.Handler.ROUTES,
+        engine=args.engine,
+        workers=args.workers,
+    )
+
+
+def run_auth_server(args: argparse.Namespace):
+    """Entry point for the AUTH server process."""
+    coloredlogs.install(level='DEBUG')
+    db.SetupDatabase(args.db_file)
+    server.run(**_auth_server_kwargs(args))
+
+
+def run_world_server(args: argparse.Namespace):
+    """Entry point for the WORLD server process.
+
+    The aura manager and updater send packets directly to the WORLD sessions,
+    so they have to run inside the same process.
+    """
+    coloredlogs.install(level='DEBUG')
+    db.SetupDatabase(args.db_file)
+    load_query_store(args)
+    threading.Thread(target=system.Register.Get(system.System.ID.AURA_MANAGER).run, daemon=True).start()
+    threading.Thread(target=system.Register.Get(system.System.ID.UPDATER).run, daemon=True).start()
+    server.run(**_world_server_kwargs(args))
+
+
 def main(args: argparse.Namespace):
     # Load the database.
     print(args.db_file)
     setup_db(args)
 
+    # Run each server in its own process. Each process opens its own
+    # connection to the database, which is also how the session key is
+    # passed from the AUTH server to the WORLD server.
+    if args.processes:
+        supervisor.Supervisor(
+            [
+                supervisor.Child('AUTH', run_auth_server, (args,)),
+                supervisor.Child('WORLD', run_world_server, (args,)),
+            ],
+            report_interval=args.cpu_report_interval,
+        ).run()
+        return
+
+    load_query_store(args)
+
     # Create the packet handling threads.
-    auth_thread = threading.Thread(target=server.run,
-                                   kwargs=dict(
-                                       name='AUTH',
-                                       host=args.host,
-                                       port=args.auth_port,
-                                       session_type=login_session.Session,
-                                       packet_formats=login_router.ClientPacket.ROUTES,
-                                       handlers=login_router.Handler.ROUTES,
-                                   ))
-
-    world_thread = threading.Thread(target=server.run,
-                                    kwargs=dict(
-                                        name='WORLD',
-                                        host=args.host,
-                                        port=args.world_port,
-                                        session_type=world_session.Session,
-                                        packet_formats=world_router.ClientPacket.ROUTES,
-                                        handlers=world_router.Handler.ROUTES,
-                                    ))
+    auth_thread = threading.Thread(target=server.run, kwargs=_auth_server_kwargs(args))
+    world_thread = threading.Thread(target=server.run, kwargs=_world_server_kwargs(args))
 
     # Start the aura manager.
     aura_manager_thread = threading.Thread(target=system.Register.Get(system.System.ID.AURA_MANAGER).run)
     aura_manager_thread.start()
 
+    # Start the updater, which sends object updates every tick.
+    updater_thread = threading.Thread(target=system.Register.Get(system.System.ID.UPDATER).run)
+    updater_thread.start()
+
     auth_thread.start()
     world_thread.start()
 
     aura_manager_thread.join()
+    updater_thread.join()
     auth_thread.join()
     world_thread.join()
 
 
 def wow_server():
     if __name__ == '__main__':
+        multiprocessing.freeze_support()
+
         argument_parser = argparse.ArgumentParser(description='Server to handle the initial login connection.')
         argument_parser.add_argument('--auth_port',
                                      type=int,
@@ -209,6 +267,30 @@ def wow_server():
                                      type=str,
                                      default=os.path.join(os.path.dirname(sys.executable), 'wow_server.db'),
                                      help='The file to store the World database in.')
+        argument_parser.add_argument('--packet_cache_dir',
+                                     type=str,
+                                     default=os.path.join(os.path.dirname(sys.executable), 'packet_cache'),
+                                     help='The directory to cache compiled packet formats in.')
+        argument_parser.add_argument('--query_store_file',
+                                     type=str,
+                                     default=os.path.join(os.path.dirname(sys.executable), 'query_store.bin'),
+                                     help='The file to keep prebuilt item/creature query responses in.')
+        argument_parser.add_argument('--engine',
+                                     type=str,
+                                     default='asyncio',
+                                     choices=sorted(server.ENGINES),
+                                     help='The server engine used to handle connections.')
+        argument_parser.add_argument('--workers',
+                                     type=int,
+                                     default=4,
+                                     help='The number of threads each server runs handlers on (0 to run them inline).')
+        argument_parser.add_argument('--processes',
+                                     action='store_true',
+                                     help='If True, run the AUTH and WORLD servers in separate, supervised processes.')
+        argument_parser.add_argument('--cpu_report_interval',
+                                     type=float,
+                                     default=60.0,
+                                     help='How often (in seconds) to report the CPU usage of each process.')
         argument_parser.add_argument('--reset_database',
                                      action='store_true',
                                      help='If True, the DBC database will be reloaded.')